@@ -78,6 +78,10 @@ class DatabaseSettings:
     user: str
     password: str
     name: str
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: int = 30
+    pool_recycle: int = 1800
 
     def sync_dsn(self) -> str:
         """Формирует DSN для синхронного движка SQLAlchemy."""
@@ -99,6 +103,9 @@ class SMTPChannelSettings:
     sender_name: str | None
     use_tls: bool
     use_ssl: bool
+    max_msgs_per_conn: int = 100
+    max_concurrent_conns: int = 4
+    max_idle_seconds: float = 60.0
 
     def from_header(self) -> str:
         """Готовый заголовок From для канала."""
@@ -223,8 +230,16 @@ def get_settings() -> Settings:
         user=_env("POSTGRES_USER", "leadgen"),
         password=_env("POSTGRES_PASSWORD", "leadgen_password"),
         name=_env("POSTGRES_DB", "leadgen"),
+        pool_size=max(int(_env("POSTGRES_POOL_SIZE", "10")), 1),
+        max_overflow=max(int(_env("POSTGRES_MAX_OVERFLOW", "20")), 0),
+        pool_timeout=max(int(_env("POSTGRES_POOL_TIMEOUT", "30")), 1),
+        pool_recycle=int(_env("POSTGRES_POOL_RECYCLE", "1800")),
     )
 
+    smtp_max_msgs_per_conn = max(int(_env("SMTP_MAX_MSGS_PER_CONN", "100")), 1)
+    smtp_max_concurrent_conns = max(int(_env("SMTP_MAX_CONCURRENT_CONNS", "4")), 1)
+    smtp_max_idle_seconds = max(float(_env("SMTP_MAX_IDLE_SECONDS", "60")), 0.0)
+
     gmail_sender_email = _env("GMAIL_FROM_EMAIL") or _env("SMTP_FROM_EMAIL", "")
     gmail_sender_name = _env("GMAIL_FROM_NAME") or _env("SMTP_FROM_NAME") or None
     gmail_sender_email, gmail_sender_name = _sender_from_combined(
@@ -241,6 +256,9 @@ def get_settings() -> Settings:
         sender_name=gmail_sender_name,
         use_tls=_env_bool("GMAIL_SMTP_TLS", True),
         use_ssl=_env_bool("GMAIL_SMTP_SSL", False),
+        max_msgs_per_conn=smtp_max_msgs_per_conn,
+        max_concurrent_conns=smtp_max_concurrent_conns,
+        max_idle_seconds=smtp_max_idle_seconds,
     )
 
     yandex_sender_email = _env("YANDEX_FROM_EMAIL") or _env("YANDEX_USER", "")
@@ -259,6 +277,9 @@ def get_settings() -> Settings:
         sender_name=yandex_sender_name,
         use_tls=_env_bool("YANDEX_SMTP_TLS", False),
         use_ssl=_env_bool("YANDEX_SMTP_SSL", True),
+        max_msgs_per_conn=smtp_max_msgs_per_conn,
+        max_concurrent_conns=smtp_max_concurrent_conns,
+        max_idle_seconds=smtp_max_idle_seconds,
     )
 
     routing = RoutingSettings(
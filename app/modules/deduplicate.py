@@ -5,7 +5,7 @@ from __future__ import annotations
 import logging
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session, sessionmaker
@@ -15,6 +15,72 @@ from app.modules.utils.normalize import build_company_dedupe_key, normalize_doma
 
 LOGGER = logging.getLogger("app.deduplicate")
 
+# Длина hex-ключа SHA-1, которым dedupe_hash строился до перехода на BLAKE2b-128
+LEGACY_DEDUPE_HASH_LENGTH = 40
+
+SELECT_LEGACY_DEDUPE_HASHES_SQL = """
+SELECT id, name, canonical_domain, website_url
+FROM companies
+WHERE length(dedupe_hash) = :legacy_length;
+"""
+
+REKEY_DEDUPE_HASHES_SQL = """
+UPDATE companies AS c
+SET dedupe_hash = data.dedupe_hash,
+    updated_at = NOW()
+FROM unnest(
+    CAST(:ids AS UUID[]),
+    CAST(:dedupe_hashes AS TEXT[])
+) AS data(id, dedupe_hash)
+WHERE c.id = data.id
+  AND NOT EXISTS (
+      SELECT 1 FROM companies other WHERE other.dedupe_hash = data.dedupe_hash
+  );
+"""
+
+SELECT_COMPANY_KEYS_SQL = """
+SELECT id, name, canonical_domain, website_url, dedupe_hash
+FROM companies;
+"""
+
+UPDATE_DEDUPE_HASH_SQL = """
+UPDATE companies
+SET dedupe_hash = :dedupe_hash,
+    canonical_domain = :canonical_domain,
+    updated_at = NOW()
+WHERE id = :id;
+"""
+
+SELECT_DEDUPE_GROUPS_SQL = """
+SELECT id, dedupe_hash, status, opt_out, created_at
+FROM companies
+WHERE dedupe_hash IS NOT NULL AND dedupe_hash <> '';
+"""
+
+MARK_DUPLICATE_SQL = """
+UPDATE companies
+SET status = 'duplicate',
+    opt_out = TRUE,
+    updated_at = NOW()
+WHERE id = :id AND status <> 'duplicate';
+"""
+
+RESTORE_PRIMARY_SQL = """
+UPDATE companies
+SET status = CASE WHEN status = 'duplicate' THEN 'new' ELSE status END,
+    opt_out = FALSE,
+    updated_at = NOW()
+WHERE id = :id;
+"""
+
+_SELECT_LEGACY_DEDUPE_HASHES_STMT = text(SELECT_LEGACY_DEDUPE_HASHES_SQL)
+_REKEY_DEDUPE_HASHES_STMT = text(REKEY_DEDUPE_HASHES_SQL)
+_SELECT_COMPANY_KEYS_STMT = text(SELECT_COMPANY_KEYS_SQL)
+_UPDATE_DEDUPE_HASH_STMT = text(UPDATE_DEDUPE_HASH_SQL)
+_SELECT_DEDUPE_GROUPS_STMT = text(SELECT_DEDUPE_GROUPS_SQL)
+_MARK_DUPLICATE_STMT = text(MARK_DUPLICATE_SQL)
+_RESTORE_PRIMARY_STMT = text(RESTORE_PRIMARY_SQL)
+
 
 @dataclass
 class DeduplicationStats:
@@ -41,6 +107,40 @@ class DeduplicationService:
             stats = self._run_with_session(scoped_session)
         return stats
 
+    def rekey_legacy_hashes(self, session: Optional[Session] = None) -> int:
+        """Переводит оставшиеся SHA-1 ключи dedupe_hash на текущий формат и возвращает число строк."""
+        if session is not None:
+            return self._rekey_legacy_hashes_with_session(session)
+
+        with session_scope(self.session_factory) as scoped_session:
+            return self._rekey_legacy_hashes_with_session(scoped_session)
+
+    def _rekey_legacy_hashes_with_session(self, session: Session) -> int:
+        rows = session.execute(
+            _SELECT_LEGACY_DEDUPE_HASHES_STMT,
+            {"legacy_length": LEGACY_DEDUPE_HASH_LENGTH},
+        ).mappings()
+        # Если два старых ключа сходятся в один новый, переводим только первую строку —
+        # остальные склеит обычный прогон дедупликации
+        rekeyed: Dict[str, str] = {}
+        for row in rows:
+            dedupe_hash = build_company_dedupe_key(row["name"], self._domain_source(row))
+            rekeyed.setdefault(dedupe_hash, str(row["id"]))
+        if not rekeyed:
+            return 0
+
+        result = session.execute(
+            _REKEY_DEDUPE_HASHES_STMT,
+            {"ids": list(rekeyed.values()), "dedupe_hashes": list(rekeyed)},
+        )
+        if result.rowcount:
+            LOGGER.info("Переведено на новый формат %s dedupe_hash значений.", result.rowcount)
+        return result.rowcount
+
+    @staticmethod
+    def _domain_source(row: Mapping[str, Any]) -> str:
+        return row["canonical_domain"] or row["website_url"] or row["name"]
+
     def _run_with_session(self, session: Session) -> DeduplicationStats:
         stats = DeduplicationStats()
         stats.hash_updates = self._refresh_dedupe_hashes(session)
@@ -52,32 +152,15 @@ class DeduplicationService:
 
     def _refresh_dedupe_hashes(self, session: Session) -> int:
         """Пересчитывает dedupe_hash на основе нормализованных доменов."""
-        rows = list(
-            session.execute(
-                text(
-                    """
-                    SELECT id, name, canonical_domain, website_url, dedupe_hash
-                    FROM companies
-                    """
-                )
-            ).mappings()
-        )
+        rows = list(session.execute(_SELECT_COMPANY_KEYS_STMT).mappings())
 
         updates = 0
         for row in rows:
-            domain_source = row["canonical_domain"] or row["website_url"] or row["name"]
+            domain_source = self._domain_source(row)
             dedupe_hash = build_company_dedupe_key(row["name"], domain_source)
             if dedupe_hash != (row["dedupe_hash"] or ""):
                 session.execute(
-                    text(
-                        """
-                        UPDATE companies
-                        SET dedupe_hash = :dedupe_hash,
-                            canonical_domain = :canonical_domain,
-                            updated_at = NOW()
-                        WHERE id = :id
-                        """
-                    ),
+                    _UPDATE_DEDUPE_HASH_STMT,
                     {
                         "id": row["id"],
                         "dedupe_hash": dedupe_hash,
@@ -91,17 +174,7 @@ class DeduplicationService:
 
     def _group_duplicates(self, session: Session) -> Tuple[Dict[str, str], Dict[str, str]]:
         """Формирует словари primary/duplicate id по dedupe_hash."""
-        rows = list(
-            session.execute(
-                text(
-                    """
-                    SELECT id, dedupe_hash, status, opt_out, created_at
-                    FROM companies
-                    WHERE dedupe_hash IS NOT NULL AND dedupe_hash <> ''
-                    """
-                )
-            ).mappings()
-        )
+        rows = list(session.execute(_SELECT_DEDUPE_GROUPS_STMT).mappings())
 
         groups: Dict[str, List[Dict[str, object]]] = defaultdict(list)
         for row in rows:
@@ -147,30 +220,14 @@ class DeduplicationService:
 
         for duplicate_id in duplicate_ids:
             result = session.execute(
-                text(
-                    """
-                    UPDATE companies
-                    SET status = 'duplicate',
-                        opt_out = TRUE,
-                        updated_at = NOW()
-                    WHERE id = :id AND status <> 'duplicate'
-                    """
-                ),
+                _MARK_DUPLICATE_STMT,
                 {"id": duplicate_id},
             )
             updated += result.rowcount or 0
 
         for primary_id in primary_ids:
             session.execute(
-                text(
-                    """
-                    UPDATE companies
-                    SET status = CASE WHEN status = 'duplicate' THEN 'new' ELSE status END,
-                        opt_out = FALSE,
-                        updated_at = NOW()
-                    WHERE id = :id
-                    """
-                ),
+                _RESTORE_PRIMARY_STMT,
                 {"id": primary_id},
             )
 
@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import json
 import logging
 import re
 import time
@@ -21,8 +20,8 @@ from sqlalchemy.orm import Session, sessionmaker
 
 from app.modules.constants import HOMEPAGE_EXCERPT_LIMIT
 from app.config import get_settings
-from app.modules.utils.db import get_session_factory, session_scope
-from app.modules.utils.email import clean_email, is_valid_email
+from app.modules.utils.db import dumps_jsonb, get_session_factory, session_scope
+from app.modules.utils.email import clean_email, is_normalized_email
 from app.modules.utils.normalize import normalize_url
 
 LOGGER = logging.getLogger("app.enrich_contacts")
@@ -62,6 +61,14 @@ DO UPDATE SET
 RETURNING id;
 """
 
+UPDATE_COMPANY_STATUS_SQL = "UPDATE companies SET status = :status, updated_at = NOW() WHERE id = :id"
+
+UPDATE_HOMEPAGE_EXCERPT_SQL = "UPDATE companies SET attributes = attributes || CAST(:patch AS JSONB) WHERE id = :company_id"
+
+_INSERT_CONTACT_STMT = text(INSERT_CONTACT_SQL)
+_UPDATE_COMPANY_STATUS_STMT = text(UPDATE_COMPANY_STATUS_SQL)
+_UPDATE_HOMEPAGE_EXCERPT_STMT = text(UPDATE_HOMEPAGE_EXCERPT_SQL)
+
 
 class ContactEnricher:
     """Извлекает контакты из веб-страниц и сохраняет их в БД."""
@@ -154,10 +161,10 @@ class ContactEnricher:
         inserted_ids: List[str] = []
         record = collected_email
         cleaned_value = clean_email(record.value)
-        if cleaned_value and is_valid_email(cleaned_value):
-            metadata = json.dumps({"label": record.label, "source_type": record.contact_type})
+        if cleaned_value and is_normalized_email(cleaned_value):
+            metadata = dumps_jsonb({"label": record.label, "source_type": record.contact_type})
             result = session.execute(
-                text(INSERT_CONTACT_SQL),
+                _INSERT_CONTACT_STMT,
                 {
                     "company_id": company_id,
                     "contact_type": record.contact_type,
@@ -361,7 +368,7 @@ class ContactEnricher:
             if href.lower().startswith("mailto:"):
                 email = href.split(":", 1)[1]
                 cleaned = clean_email(email)
-                if not is_valid_email(cleaned):
+                if not is_normalized_email(cleaned):
                     LOGGER.debug("Пропускаем mailto без валидного e-mail: %s", email)
                     continue
                 key = f"email:{cleaned}"
@@ -407,7 +414,7 @@ class ContactEnricher:
         seen: Set[str] = set()
         for match in EMAIL_TEXT_REGEX.findall(value):
             cleaned = clean_email(match)
-            if not is_valid_email(cleaned) or cleaned in seen:
+            if not is_normalized_email(cleaned) or cleaned in seen:
                 continue
             seen.add(cleaned)
             emails.append(cleaned)
@@ -416,7 +423,7 @@ class ContactEnricher:
     @staticmethod
     def _mark_company_status(session: Session, company_id: str, status: str) -> None:
         session.execute(
-            text("UPDATE companies SET status = :status, updated_at = NOW() WHERE id = :id"),
+            _UPDATE_COMPANY_STATUS_STMT,
             {"status": status, "id": company_id},
         )
 
@@ -432,11 +439,9 @@ class ContactEnricher:
         excerpt = self._sanitize_excerpt(text_content)[:HOMEPAGE_EXCERPT_LIMIT]
         if not excerpt:
             return
-        patch = json.dumps({"homepage_excerpt": excerpt})
+        patch = dumps_jsonb({"homepage_excerpt": excerpt})
         session.execute(
-            text(
-                "UPDATE companies SET attributes = attributes || CAST(:patch AS JSONB) WHERE id = :company_id"
-            ),
+            _UPDATE_HOMEPAGE_EXCERPT_STMT,
             {"company_id": company_id, "patch": patch},
         )
 
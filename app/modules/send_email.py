@@ -2,16 +2,27 @@
 
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
 import logging
+import os
 import random
+import re
 import smtplib
-import ssl
+import socket
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime, time, timedelta, timezone
+from datetime import date, datetime, time, timedelta, timezone
+from email import message_from_bytes, policy as email_policy
 from email.message import EmailMessage
-from email.utils import formataddr, make_msgid, parseaddr
-from typing import Dict, Optional
+from email.utils import formataddr, parseaddr
+from functools import lru_cache
+from time import monotonic, time as unix_time, time_ns
+from uuid import uuid4
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session, sessionmaker
@@ -21,8 +32,9 @@ from zoneinfo import ZoneInfo
 from app.config import SMTPChannelSettings, get_settings
 from app.modules.generate_email_gpt import EmailTemplate
 from app.modules.mx_router import MXResult, MXRouter
-from app.modules.utils.db import get_session_factory, session_scope
-from app.modules.utils.email import clean_email, is_valid_email
+from app.modules.smtp_pool import SMTPConnectionPool
+from app.modules.utils.db import dumps_jsonb, get_session_factory, session_scope
+from app.modules.utils.email import clean_email, is_normalized_email
 
 LOGGER = logging.getLogger("app.send_email")
 
@@ -55,6 +67,99 @@ VALUES (
 RETURNING id;
 """
 
+INSERT_OUTREACH_BATCH_SQL = """
+INSERT INTO outreach_messages (
+    id,
+    company_id,
+    contact_id,
+    channel,
+    subject,
+    body,
+    status,
+    scheduled_for,
+    sent_at,
+    last_error,
+    metadata
+)
+VALUES (
+    :id,
+    :company_id,
+    :contact_id,
+    'email',
+    :subject,
+    :body,
+    :status,
+    :scheduled_for,
+    :sent_at,
+    :last_error,
+    CAST(:metadata AS JSONB)
+);
+"""
+
+COPY_OUTREACH_SQL = """
+COPY outreach_messages (
+    id,
+    company_id,
+    contact_id,
+    channel,
+    subject,
+    body,
+    status,
+    scheduled_for,
+    sent_at,
+    last_error,
+    metadata
+) FROM STDIN
+"""
+
+COPY_OUTREACH_COLUMNS = (
+    "id",
+    "company_id",
+    "contact_id",
+    "channel",
+    "subject",
+    "body",
+    "status",
+    "scheduled_for",
+    "sent_at",
+    "last_error",
+    "metadata",
+)
+
+INSERT_SCHEDULED_OUTREACH_SQL = """
+WITH last AS (
+    SELECT MAX(scheduled_for) AS scheduled_for
+    FROM outreach_messages
+    WHERE channel = 'email'
+      AND scheduled_for IS NOT NULL
+)
+INSERT INTO outreach_messages (
+    company_id,
+    contact_id,
+    channel,
+    subject,
+    body,
+    status,
+    scheduled_for,
+    sent_at,
+    last_error,
+    metadata
+)
+SELECT
+    :company_id,
+    :contact_id,
+    'email',
+    :subject,
+    :body,
+    :status,
+    GREATEST(CAST(:now AS TIMESTAMPTZ), last.scheduled_for) + make_interval(secs => :delay),
+    NULL,
+    NULL,
+    CAST(:metadata AS JSONB)
+FROM last
+RETURNING id, scheduled_for;
+"""
+
 INSERT_FAILED_OUTREACH_SQL = """
 INSERT INTO outreach_messages (
     company_id,
@@ -83,20 +188,56 @@ VALUES (
 RETURNING id;
 """
 
-CHECK_OPT_OUT_SQL = """
-SELECT 1 FROM opt_out_registry
-WHERE LOWER(contact_value) = LOWER(:contact_value)
-LIMIT 1;
+INSERT_SENDING_OUTREACH_SQL = """
+WITH opted_out AS (
+    SELECT EXISTS (
+        SELECT 1 FROM opt_out_registry
+        WHERE LOWER(contact_value) = LOWER(:contact_value)
+    ) AS flag
+)
+INSERT INTO outreach_messages (
+    company_id,
+    contact_id,
+    channel,
+    subject,
+    body,
+    status,
+    scheduled_for,
+    sent_at,
+    last_error,
+    metadata
+)
+SELECT
+    :company_id,
+    :contact_id,
+    'email',
+    :subject,
+    :body,
+    CASE WHEN opted_out.flag THEN 'skipped' ELSE 'sending' END,
+    NULL,
+    NULL,
+    CASE WHEN opted_out.flag THEN 'opt_out' END,
+    CAST(:metadata AS JSONB) || CASE
+        WHEN opted_out.flag THEN jsonb_build_object('reason', 'opt_out')
+        ELSE '{}'::JSONB
+    END
+FROM opted_out
+RETURNING id, status;
+"""
+
+SELECT_OPT_OUT_VALUES_SQL = """
+SELECT LOWER(contact_value) FROM opt_out_registry;
 """
 
 SELECT_LAST_SCHEDULED_SQL = """
-SELECT scheduled_for
+SELECT MAX(scheduled_for)
 FROM outreach_messages
 WHERE channel = 'email'
-  AND scheduled_for IS NOT NULL
-ORDER BY scheduled_for DESC
-LIMIT 1
-FOR UPDATE SKIP LOCKED;
+  AND scheduled_for IS NOT NULL;
+"""
+
+LOCK_SCHEDULE_SQL = """
+SELECT pg_advisory_xact_lock(:lock_id);
 """
 
 
@@ -107,8 +248,70 @@ SET status = :status,
     last_error = :last_error,
     metadata = metadata || CAST(:metadata AS JSONB),
     updated_at = NOW()
-WHERE id = :id
-RETURNING id;
+WHERE id = :id;
+"""
+
+RESCHEDULE_OUTREACH_SQL = """
+UPDATE outreach_messages
+SET scheduled_for = :scheduled_for,
+    updated_at = NOW()
+WHERE id = :id;
+"""
+
+UPDATE_OUTREACH_FAILED_SQL = """
+UPDATE outreach_messages
+SET status = :status,
+    sent_at = NULL,
+    last_error = :last_error,
+    metadata = jsonb_set(
+        metadata || CAST(:metadata AS JSONB),
+        '{route,error}',
+        to_jsonb(CAST(:last_error AS TEXT)),
+        true
+    ),
+    updated_at = NOW()
+WHERE id = :id;
+"""
+
+UPDATE_OUTREACH_BATCH_SQL = """
+UPDATE outreach_messages AS om
+SET status = data.status,
+    sent_at = data.sent_at,
+    last_error = data.last_error,
+    metadata = om.metadata || data.metadata,
+    updated_at = NOW()
+FROM unnest(
+    CAST(:ids AS UUID[]),
+    CAST(:statuses AS TEXT[]),
+    CAST(:sent_at AS TIMESTAMPTZ[]),
+    CAST(:last_errors AS TEXT[]),
+    CAST(:metadata AS JSONB[])
+) AS data(id, status, sent_at, last_error, metadata)
+WHERE om.id = data.id;
+"""
+
+SELECT_DUE_OUTREACH_SQL = """
+WITH locked AS (
+    SELECT om.id
+    FROM outreach_messages om
+    WHERE om.status = 'scheduled'
+      AND (om.scheduled_for IS NULL OR om.scheduled_for <= NOW())
+    ORDER BY COALESCE(om.scheduled_for, om.created_at)
+    FOR UPDATE SKIP LOCKED
+    LIMIT :limit
+)
+SELECT
+    om.id,
+    om.company_id,
+    om.contact_id,
+    om.subject,
+    om.body,
+    om.metadata,
+    ct.value AS contact_value
+FROM outreach_messages om
+JOIN locked l ON l.id = om.id
+LEFT JOIN contacts ct ON ct.id = om.contact_id
+ORDER BY COALESCE(om.scheduled_for, om.created_at);
 """
 
 CLAIM_OUTREACH_SQL = """
@@ -120,10 +323,138 @@ WHERE id = :id
 RETURNING id;
 """
 
+# TextClause собираем один раз при импорте, а не на каждый запрос
+_INSERT_OUTREACH_STMT = text(INSERT_OUTREACH_SQL)
+_INSERT_OUTREACH_BATCH_STMT = text(INSERT_OUTREACH_BATCH_SQL)
+_INSERT_SCHEDULED_OUTREACH_STMT = text(INSERT_SCHEDULED_OUTREACH_SQL)
+_INSERT_FAILED_OUTREACH_STMT = text(INSERT_FAILED_OUTREACH_SQL)
+_INSERT_SENDING_OUTREACH_STMT = text(INSERT_SENDING_OUTREACH_SQL)
+_SELECT_OPT_OUT_VALUES_STMT = text(SELECT_OPT_OUT_VALUES_SQL)
+_SELECT_LAST_SCHEDULED_STMT = text(SELECT_LAST_SCHEDULED_SQL)
+_LOCK_SCHEDULE_STMT = text(LOCK_SCHEDULE_SQL)
+_UPDATE_OUTREACH_STMT = text(UPDATE_OUTREACH_SQL)
+_RESCHEDULE_OUTREACH_STMT = text(RESCHEDULE_OUTREACH_SQL)
+_UPDATE_OUTREACH_FAILED_STMT = text(UPDATE_OUTREACH_FAILED_SQL)
+_UPDATE_OUTREACH_BATCH_STMT = text(UPDATE_OUTREACH_BATCH_SQL)
+_SELECT_DUE_OUTREACH_STMT = text(SELECT_DUE_OUTREACH_SQL)
+_CLAIM_OUTREACH_STMT = text(CLAIM_OUTREACH_SQL)
+
 SEND_WINDOW_START = time(7, 7)
 SEND_WINDOW_END = time(19, 45)
+SEND_WINDOW_START_SECONDS = SEND_WINDOW_START.hour * 3600 + SEND_WINDOW_START.minute * 60
+SEND_WINDOW_END_SECONDS = SEND_WINDOW_END.hour * 3600 + SEND_WINDOW_END.minute * 60
+# Переходы на летнее/зимнее время происходят на границах четверти часа
+TZ_OFFSET_REFRESH_SECONDS = 15 * 60
 MIN_SEND_DELAY_SECONDS = 11 * 60
 MAX_SEND_DELAY_SECONDS = 13 * 60
+SEND_DELAY_SPAN_SECONDS = MAX_SEND_DELAY_SECONDS - MIN_SEND_DELAY_SECONDS + 1
+_SEND_DELAY_CHOICES = range(MIN_SEND_DELAY_SECONDS, MAX_SEND_DELAY_SECONDS + 1)
+WINDOW_CACHE_SIZE = 8
+OPT_OUT_CACHE_TTL_SECONDS = 5 * 60
+# Домены получателей повторяются, поэтому ответ MXRouter держим локально и обновляем раз в 10 минут
+MX_MEMO_TTL_SECONDS = 10 * 60
+MX_MEMO_MAX_DOMAINS = 4096
+SCHEDULE_ADVISORY_LOCK_ID = 485902143272
+# Больше 1000 строк за вызов на PostgreSQL заметного выигрыша не даёт
+QUEUE_BATCH_PAGE_SIZE = 1000
+# Начиная с такого размера пачки строки идут через COPY: он минует парсер и планировщик
+QUEUE_BATCH_COPY_THRESHOLD = 5000
+# SMTP почти всё время ждёт сеть, поэтому пачку отправляем в несколько потоков
+DELIVER_BATCH_MAX_WORKERS = 8
+# Признаки отказа Яндекса «как спам», после которых письмо повторяется через Gmail
+_SPAM_REJECTION_RE = re.compile(
+    r"5\.7\.[01]|suspected spam|suspicion of spam|message rejected",
+    re.IGNORECASE,
+)
+
+_rng_local = threading.local()
+
+
+_MESSAGE_ID_COUNTER = itertools.count()
+
+
+@lru_cache(maxsize=1)
+def _local_fqdn() -> str:
+    """Имя хоста для Message-ID канала без SMTP-хоста; getfqdn может сходить в DNS, поэтому один раз."""
+    return socket.getfqdn()
+
+
+def _thread_rng() -> random.Random:
+    """Генератор случайных чисел свой у каждого потока, без общей блокировки."""
+    rng = getattr(_rng_local, "rng", None)
+    if rng is None:
+        rng = _rng_local.rng = random.Random()
+    return rng
+
+
+def _random_delay_seconds() -> int:
+    """Случайная задержка между письмами."""
+    return MIN_SEND_DELAY_SECONDS + int(_thread_rng().random() * SEND_DELAY_SPAN_SECONDS)
+
+
+def _random_delays(count: int) -> List[int]:
+    """Задержки для count слотов подряд одним вызовом choices."""
+    return _thread_rng().choices(_SEND_DELAY_CHOICES, k=count)
+
+
+@dataclass
+class QueueRequest:
+    """Письмо для пакетной постановки в очередь."""
+
+    company_id: str
+    contact_id: Optional[str]
+    to_email: str
+    template: EmailTemplate
+    request_payload: Optional[Dict[str, object]] = None
+    scheduled_for: Optional[datetime] = None
+
+
+@dataclass
+class DeliverJob:
+    """Письмо из очереди для пакетной доставки."""
+
+    outreach_id: str
+    company_id: str
+    contact_id: Optional[str]
+    to_email: str
+    subject: str
+    body: str
+
+
+@dataclass(frozen=True)
+class NormalizedRecipient:
+    """Адрес получателя, нормализованный и проверенный один раз на весь путь отправки."""
+
+    raw: str
+    email: str
+    domain: Optional[str]
+    valid: bool
+
+    @classmethod
+    def from_raw(cls, to_email: str) -> "NormalizedRecipient":
+        email = clean_email(to_email)
+        valid = is_normalized_email(email)
+        domain = email.rpartition("@")[2] if valid else None
+        return cls(raw=to_email, email=email, domain=domain, valid=valid)
+
+
+class PreparedEmailTemplate:
+    """Тема и тело письма, закодированные в MIME один раз для всех получателей."""
+
+    def __init__(self, subject: str, body: str) -> None:
+        prototype = EmailMessage()
+        prototype["Subject"] = subject
+        prototype.set_content(body)
+        self._prototype = prototype
+        # Письмо сериализуется один раз; разбор этих байтов не кодирует тело заново
+        self._prototype_bytes = prototype.as_bytes(policy=email_policy.default)
+
+    def build(self, to_email: str) -> EmailMessage:
+        """Возвращает письмо получателю без повторного кодирования тела."""
+        # У каждого письма свои заголовки: дальше в него добавляются To, From и Message-ID
+        message = message_from_bytes(self._prototype_bytes, policy=email_policy.default)
+        message["To"] = to_email
+        return message
 
 
 @dataclass
@@ -137,16 +468,17 @@ class RouteContext:
     fallback: bool = False
 
 
+@lru_cache(maxsize=4096)
 def _mask_email(value: str) -> str:
-    """Маскирует контакт для логов."""
-    if "@" not in value:
+    """Маскирует контакт для логов (адреса повторяются, поэтому результат кэшируется)."""
+    local, at, domain = value.partition("@")
+    if not at:
         return value
-    local, domain = value.split("@", 1)
     if len(local) <= 2:
-        masked = local[0] + "*" * max(len(local) - 1, 0)
+        masked = local[:1] + "*" * max(len(local) - 1, 0)
     else:
-        masked = f"{local[:2]}***"
-    return f"{masked}@{domain}"
+        masked = local[:2] + "***"
+    return masked + "@" + domain
 
 
 class EmailSender:
@@ -168,12 +500,32 @@ class EmailSender:
         self.default_channel = smtp_settings or self.gmail_settings
         self.mx_router = mx_router or MXRouter(self.routing_settings)
         self.gmail_from_header = self._build_from_header(self.gmail_settings)
+        self.yandex_from_header = self._build_from_header(self.yandex_settings)
+        # Заголовки From зависят только от неизменяемых настроек, поэтому собираем их один раз
+        self._from_headers: Dict[SMTPChannelSettings, str] = {
+            self.gmail_settings: self.gmail_from_header,
+            self.yandex_settings: self.yandex_from_header,
+        }
+        self.default_from_header = self._from_headers.setdefault(
+            self.default_channel,
+            self._build_from_header(self.default_channel),
+        )
+        # Домен для Message-ID тоже зависит только от хоста канала
+        self._message_id_domains: Dict[SMTPChannelSettings, str] = {}
         self.session_factory = session_factory or get_session_factory()
         self.use_starttls = use_starttls
         self.timeout = timeout
+        # Сессии SMTP переиспользуются между письмами: TLS и AUTH выполняются раз на соединение
+        self._smtp_pool = SMTPConnectionPool(timeout=timeout, use_starttls=use_starttls)
         self.timezone_name = settings.timezone
         self._tz = ZoneInfo(self.timezone_name)
+        self._window_cache: Dict[date, Tuple[datetime, datetime]] = {}
+        self._window_ts_cache: Dict[date, Tuple[int, int]] = {}
+        self._tz_offset_seconds = 0
+        self._tz_offset_bucket: Optional[int] = None
         self.sending_enabled = getattr(settings, "email_sending_enabled", True)
+        self._opt_out_cache: Tuple[frozenset[str], Optional[float]] = (frozenset(), None)
+        self._mx_memo: Dict[str, Tuple[float, MXResult]] = {}
 
     def _build_from_header(self, channel: SMTPChannelSettings) -> str:
         """Формирует заголовок From с учётом имени отправителя."""
@@ -229,6 +581,92 @@ class EmailSender:
                 scheduled_for,
             )
 
+    def queue_batch(
+        self,
+        items: Sequence[QueueRequest],
+        *,
+        session: Optional[Session] = None,
+    ) -> List[str]:
+        """Ставит пачку писем в очередь одним executemany и возвращает их id в порядке items."""
+        if not items:
+            return []
+        if session is not None:
+            return self._queue_batch_with_session(session, items)
+
+        with session_scope(self.session_factory) as scoped_session:
+            return self._queue_batch_with_session(scoped_session, items)
+
+    def send_now(
+        self,
+        *,
+        company_id: str,
+        contact_id: Optional[str],
+        to_email: str,
+        template: EmailTemplate,
+        request_payload: Optional[Dict[str, object]] = None,
+        session: Optional[Session] = None,
+    ) -> str:
+        """Сохраняет и сразу отправляет письмо, минуя очередь scheduled.
+
+        Вне окна отправки или при выключенной отправке письмо ставится в обычную очередь
+        и возвращается статус "scheduled" или "disabled".
+        """
+        if session is not None:
+            return self._send_now_with_session(session, company_id, contact_id, to_email, template, request_payload)
+
+        with session_scope(self.session_factory) as scoped_session:
+            return self._send_now_with_session(
+                scoped_session,
+                company_id,
+                contact_id,
+                to_email,
+                template,
+                request_payload,
+            )
+
+    def _send_now_with_session(
+        self,
+        session: Session,
+        company_id: str,
+        contact_id: Optional[str],
+        to_email: str,
+        template: EmailTemplate,
+        request_payload: Optional[Dict[str, object]],
+    ) -> str:
+        if not self.sending_enabled or not self.is_within_send_window():
+            self._queue_with_session(session, company_id, contact_id, to_email, template, request_payload, None)
+            return "disabled" if not self.sending_enabled else "scheduled"
+
+        recipient = NormalizedRecipient.from_raw(to_email)
+        normalized_email = recipient.email
+        if not recipient.valid:
+            # Невалидный адрес фиксируется так же, как при обычной постановке в очередь
+            self._queue_with_session(session, company_id, contact_id, to_email, template, request_payload, None)
+            return "skipped"
+
+        metadata: Dict[str, object] = {
+            "to_email": normalized_email,
+            "to_email_raw": to_email,
+        }
+        if request_payload is not None:
+            metadata["llm_request"] = request_payload
+        # Проверка opt-out и вставка со статусом sending выполняются одним запросом
+        outreach_id, status = session.execute(
+            _INSERT_SENDING_OUTREACH_STMT,
+            {
+                "company_id": company_id,
+                "contact_id": contact_id,
+                "contact_value": normalized_email,
+                "subject": template.subject,
+                "body": template.body,
+                "metadata": dumps_jsonb(metadata),
+            },
+        ).one()
+        if status != "sending":
+            LOGGER.info("Контакт %s в opt-out, письмо не отправляется.", _mask_email(normalized_email))
+            return "skipped"
+        return self._send_and_record(session, str(outreach_id), recipient, template.subject, template.body)
+
     def record_generation_failed(
         self,
         *,
@@ -270,44 +708,122 @@ class EmailSender:
         request_payload: Optional[Dict[str, object]],
         scheduled_for: Optional[datetime],
     ) -> str:
-        normalized_email = clean_email(to_email)
+        payload = self._build_queue_payload(company_id, contact_id, to_email, template, request_payload)
+        if payload["status"] != "scheduled":
+            return self._persist_status(session, payload)
+        if scheduled_for is not None:
+            payload["scheduled_for"] = scheduled_for
+            return self._persist_status(session, payload)
+        return self._persist_scheduled(session, payload)
+
+    def _persist_scheduled(self, session: Session, payload: Dict[str, object]) -> str:
+        """Вставляет письмо, вычисляя якорь и задержку в том же INSERT."""
+        now_utc = datetime.now(timezone.utc)
+        delay_seconds = _random_delay_seconds()
+        # Advisory-блокировка — отдельным запросом: снимок READ COMMITTED берётся в начале оператора,
+        # и MAX внутри того же INSERT не увидел бы строку, закоммиченную пока мы ждали блокировку
+        session.execute(_LOCK_SCHEDULE_STMT, {"lock_id": SCHEDULE_ADVISORY_LOCK_ID})
+        outreach_id, candidate = session.execute(
+            _INSERT_SCHEDULED_OUTREACH_STMT,
+            {
+                "company_id": payload["company_id"],
+                "contact_id": payload["contact_id"],
+                "subject": payload["subject"],
+                "body": payload["body"],
+                "status": payload["status"],
+                "metadata": dumps_jsonb(payload["metadata"]),
+                "now": now_utc,
+                "delay": delay_seconds,
+            },
+        ).one()
+        # БД посчитала max(якорь, сейчас) + задержка; окно отправки проверяем здесь и правим слот
+        # только если он выпал за его границы (обычно раз в сутки)
+        anchor_local = (candidate - timedelta(seconds=delay_seconds)).astimezone(self._tz)
+        slot = self._pick_time_within_window(anchor_local, delay_seconds).astimezone(timezone.utc)
+        if slot != candidate:
+            session.execute(_RESCHEDULE_OUTREACH_STMT, {"id": outreach_id, "scheduled_for": slot})
+        return str(outreach_id)
+
+    def _queue_batch_with_session(self, session: Session, items: Sequence[QueueRequest]) -> List[str]:
+        payloads = [
+            self._build_queue_payload(
+                item.company_id,
+                item.contact_id,
+                item.to_email,
+                item.template,
+                item.request_payload,
+            )
+            for item in items
+        ]
+        pending = [
+            payload
+            for item, payload in zip(items, payloads)
+            if payload["status"] == "scheduled" and item.scheduled_for is None
+        ]
+        for item, payload in zip(items, payloads):
+            if payload["status"] == "scheduled" and item.scheduled_for is not None:
+                payload["scheduled_for"] = item.scheduled_for
+        if pending:
+            for payload, slot in zip(pending, self._reserve_slots(session, len(pending))):
+                payload["scheduled_for"] = slot
+
+        # id генерируем на клиенте: executemany не возвращает RETURNING по строкам
+        for payload in payloads:
+            payload["id"] = str(uuid4())
+            payload["metadata"] = dumps_jsonb(payload["metadata"])
+        if len(payloads) > QUEUE_BATCH_COPY_THRESHOLD:
+            self._copy_outreach_rows(session, payloads)
+        else:
+            for offset in range(0, len(payloads), QUEUE_BATCH_PAGE_SIZE):
+                session.execute(_INSERT_OUTREACH_BATCH_STMT, payloads[offset : offset + QUEUE_BATCH_PAGE_SIZE])
+        return [str(payload["id"]) for payload in payloads]
+
+    @staticmethod
+    def _copy_outreach_rows(session: Session, payloads: Sequence[Dict[str, object]]) -> None:
+        """Загружает строки очереди через COPY FROM STDIN в текущей транзакции сессии."""
+        driver_connection = session.connection().connection.driver_connection
+        with driver_connection.cursor() as cursor:
+            with cursor.copy(COPY_OUTREACH_SQL) as copy_stream:
+                for payload in payloads:
+                    row = dict(payload, channel="email")
+                    copy_stream.write_row(tuple(row[column] for column in COPY_OUTREACH_COLUMNS))
+
+    @staticmethod
+    def _build_queue_payload(
+        company_id: str,
+        contact_id: Optional[str],
+        to_email: str,
+        template: EmailTemplate,
+        request_payload: Optional[Dict[str, object]],
+    ) -> Dict[str, object]:
+        recipient = NormalizedRecipient.from_raw(to_email)
         metadata: Dict[str, object] = {
-            "to_email": normalized_email or to_email,
+            "to_email": recipient.email or to_email,
             "to_email_raw": to_email,
         }
         if request_payload is not None:
             metadata["llm_request"] = request_payload
+        payload: Dict[str, object] = {
+            "company_id": company_id,
+            "contact_id": contact_id,
+            "subject": template.subject,
+            "body": template.body,
+            "status": "scheduled",
+            "scheduled_for": None,
+            "sent_at": None,
+            "last_error": None,
+            "metadata": metadata,
+        }
 
-        if not is_valid_email(normalized_email):
+        if not recipient.valid:
             metadata["reason"] = "invalid_email"
             LOGGER.warning(
                 "Email %s не прошёл валидацию, запись будет помечена как skipped.",
                 to_email,
             )
-            return self._persist_status(
-                session,
-                company_id,
-                contact_id,
-                template,
-                status="skipped",
-                scheduled_for=None,
-                sent_at=None,
-                last_error="invalid_email",
-                metadata=metadata,
-            )
-
-        scheduled_dt = scheduled_for or self._compute_scheduled_for(session=session)
-        return self._persist_status(
-            session,
-            company_id,
-            contact_id,
-            template,
-            status="scheduled",
-            scheduled_for=scheduled_dt,
-            sent_at=None,
-            last_error=None,
-            metadata=metadata,
-        )
+            payload["status"] = "skipped"
+            payload["last_error"] = "invalid_email"
+        return payload
 
     def _record_generation_failed_with_session(
         self,
@@ -327,14 +843,14 @@ class EmailSender:
         if request_payload is not None:
             metadata["llm_request"] = request_payload
         result = session.execute(
-            text(INSERT_FAILED_OUTREACH_SQL),
+            _INSERT_FAILED_OUTREACH_STMT,
             {
                 "company_id": company_id,
                 "contact_id": contact_id,
                 "subject": "Генерация письма не удалась",
                 "body": "Генерация письма не удалась после повторных попыток.",
                 "last_error": error,
-                "metadata": json.dumps(metadata),
+                "metadata": dumps_jsonb(metadata),
             },
         )
         return str(result.scalar_one())
@@ -357,7 +873,7 @@ class EmailSender:
                 outreach_id,
             )
             return "disabled"
-        if not self._is_within_send_window(datetime.now(timezone.utc).astimezone(self._tz)):
+        if not self._is_within_send_window():
             LOGGER.debug("Вне окна отправки, письмо %s оставлено в статусе scheduled.", outreach_id)
             return "scheduled"
         if session is not None:
@@ -366,6 +882,180 @@ class EmailSender:
         with session_scope(self.session_factory) as scoped_session:
             return self._deliver_with_session(scoped_session, outreach_id, company_id, contact_id, to_email, subject, body)
 
+    def deliver_batch(
+        self,
+        jobs: Sequence[DeliverJob],
+        *,
+        max_workers: int = DELIVER_BATCH_MAX_WORKERS,
+        session: Optional[Session] = None,
+    ) -> List[str]:
+        """Отправляет пачку писем параллельно и записывает статусы одним UPDATE.
+
+        Возвращает статусы в порядке jobs.
+        """
+        if not jobs:
+            return []
+        if not self.sending_enabled:
+            LOGGER.debug("Отправка писем отключена настройкой EMAIL_SENDING_ENABLED, пачка оставлена в очереди.")
+            return ["disabled"] * len(jobs)
+        if not self._is_within_send_window():
+            LOGGER.debug("Вне окна отправки, пачка из %s писем оставлена в статусе scheduled.", len(jobs))
+            return ["scheduled"] * len(jobs)
+        if session is not None:
+            return self._deliver_batch_with_session(session, jobs, max_workers)
+
+        with session_scope(self.session_factory) as scoped_session:
+            return self._deliver_batch_with_session(scoped_session, jobs, max_workers)
+
+    def deliver_due(
+        self,
+        *,
+        batch_size: int = 50,
+        max_workers: int = DELIVER_BATCH_MAX_WORKERS,
+        session: Optional[Session] = None,
+    ) -> List[str]:
+        """Выбирает до batch_size писем, чьё время наступило, и доставляет их пачкой.
+
+        Строки берутся через FOR UPDATE SKIP LOCKED, поэтому несколько воркеров не пересекаются.
+        Возвращает статусы доставленных писем.
+        """
+        if not self.sending_enabled:
+            LOGGER.debug("Отправка писем отключена, доставка пропущена.")
+            return []
+        if not self._is_within_send_window():
+            LOGGER.debug("Вне окна отправки, доставка писем пропущена.")
+            return []
+        if session is not None:
+            return self._deliver_due_with_session(session, batch_size, max_workers)
+
+        with session_scope(self.session_factory) as scoped_session:
+            return self._deliver_due_with_session(scoped_session, batch_size, max_workers)
+
+    def _deliver_due_with_session(self, session: Session, batch_size: int, max_workers: int) -> List[str]:
+        rows = session.execute(_SELECT_DUE_OUTREACH_STMT, {"limit": batch_size}).mappings().all()
+        jobs: List[DeliverJob] = []
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except json.JSONDecodeError:
+                    metadata = {}
+            to_email = metadata.get("to_email") if isinstance(metadata, dict) else None
+            if not to_email:
+                to_email = row.get("contact_value")
+            if not to_email:
+                LOGGER.error("Не удалось определить email для outreach %s, помечаем как failed.", row["id"])
+                self._update_status(
+                    session,
+                    str(row["id"]),
+                    status="failed",
+                    sent_at=None,
+                    last_error="missing_email",
+                    metadata={"reason": "missing_email"},
+                )
+                continue
+            jobs.append(
+                DeliverJob(
+                    outreach_id=str(row["id"]),
+                    company_id=str(row["company_id"]),
+                    contact_id=row.get("contact_id"),
+                    to_email=to_email,
+                    subject=row["subject"],
+                    body=row["body"],
+                )
+            )
+        if not jobs:
+            return []
+        # Пачка уходит параллельно через общий пул SMTP, статусы пишутся одним UPDATE
+        return self._deliver_batch_with_session(session, jobs, max_workers)
+
+    async def deliver_async(
+        self,
+        *,
+        outreach_id: str,
+        company_id: str,
+        contact_id: Optional[str],
+        to_email: str,
+        subject: str,
+        body: str,
+    ) -> str:
+        """Асинхронная обёртка над deliver: SMTP и БД выполняются в рабочем потоке со своей сессией."""
+        return await asyncio.to_thread(
+            self.deliver,
+            outreach_id=outreach_id,
+            company_id=company_id,
+            contact_id=contact_id,
+            to_email=to_email,
+            subject=subject,
+            body=body,
+        )
+
+    async def deliver_batch_async(
+        self,
+        jobs: Sequence[DeliverJob],
+        *,
+        max_workers: int = DELIVER_BATCH_MAX_WORKERS,
+    ) -> List[str]:
+        """Асинхронная обёртка над deliver_batch для кода на asyncio.
+
+        Пачка уходит в рабочий поток целиком: захват строк и запись статусов остаются
+        одним запросом, а число сессий на провайдера ограничивает пул SMTP.
+        """
+        if not jobs:
+            return []
+        return await asyncio.to_thread(self.deliver_batch, jobs, max_workers=max_workers)
+
+    def _deliver_batch_with_session(
+        self,
+        session: Session,
+        jobs: Sequence[DeliverJob],
+        max_workers: int,
+    ) -> List[str]:
+        results = ["skipped"] * len(jobs)
+        updates: List[Dict[str, object]] = []
+        pending: List[Tuple[int, DeliverJob, NormalizedRecipient]] = []
+        recipients = [NormalizedRecipient.from_raw(job.to_email) for job in jobs]
+        # Реестр отказов берём один раз на всю пачку и сразу сужаем до адресов этой пачки
+        opt_out_emails = self._opt_out_set(session).intersection(recipient.email for recipient in recipients)
+        for index, (job, recipient) in enumerate(zip(jobs, recipients)):
+            if not self._claim_outreach(session, job.outreach_id):
+                LOGGER.warning(
+                    "Outreach %s не был захвачен для отправки, пропускаем повтор.",
+                    job.outreach_id,
+                )
+                continue
+            skip = self._screen_recipient(job.outreach_id, recipient, opt_out_emails)
+            if skip is not None:
+                updates.append({"id": job.outreach_id, **skip})
+                continue
+            pending.append((index, job, recipient))
+
+        # Одинаковые тема и тело кодируются в MIME один раз на пачку
+        templates: Dict[Tuple[str, str], PreparedEmailTemplate] = {}
+        for _, job, _ in pending:
+            key = (job.subject, job.body)
+            if key not in templates:
+                templates[key] = PreparedEmailTemplate(job.subject, job.body)
+
+        if pending:
+            # Потоки заняты только SMTP: сессия БД остаётся в вызывающем потоке, а число соединений
+            # на провайдера ограничивает пул SMTP
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+                outcomes = executor.map(
+                    lambda item: self._transmit(item[2], templates[(item[1].subject, item[1].body)]),
+                    pending,
+                )
+                for (index, job, _), outcome in zip(pending, outcomes):
+                    results[index] = str(outcome["status"])
+                    if outcome["status"] == "failed":
+                        outcome["metadata"]["route"]["error"] = outcome["last_error"]  # type: ignore[index]
+                    updates.append({"id": job.outreach_id, **outcome})
+
+        if updates:
+            self._update_status_batch(session, updates)
+        return results
+
     def _deliver_with_session(
         self,
         session: Session,
@@ -376,51 +1066,81 @@ class EmailSender:
         subject: str,
         body: str,
     ) -> str:
-        normalized_email = clean_email(to_email)
+        recipient = NormalizedRecipient.from_raw(to_email)
         if not self._claim_outreach(session, outreach_id):
             LOGGER.warning(
                 "Outreach %s не был захвачен для отправки, пропускаем повтор.",
                 outreach_id,
             )
             return "skipped"
-        if not is_valid_email(normalized_email):
+        skip = self._screen_recipient(outreach_id, recipient, self._opt_out_set(session))
+        if skip is not None:
+            self._update_status(session, outreach_id, **skip)
+            return "skipped"
+
+        return self._send_and_record(session, outreach_id, recipient, subject, body)
+
+    def _screen_recipient(
+        self,
+        outreach_id: str,
+        recipient: NormalizedRecipient,
+        opt_out_emails: frozenset[str],
+    ) -> Optional[Dict[str, object]]:
+        """Возвращает поля статуса skipped, если письмо отправлять нельзя, иначе None."""
+        to_email = recipient.raw
+        normalized_email = recipient.email
+        if not recipient.valid:
             LOGGER.warning(
                 "Outreach %s пропущен — email '%s' не проходит валидацию.",
                 outreach_id,
                 to_email,
             )
-            self._update_status(
-                session,
-                outreach_id,
-                status="skipped",
-                sent_at=None,
-                last_error="invalid_email",
-                metadata={
+            return {
+                "status": "skipped",
+                "sent_at": None,
+                "last_error": "invalid_email",
+                "metadata": {
                     "reason": "invalid_email",
                     "to_email": normalized_email or to_email,
                     "to_email_raw": to_email,
                 },
-            )
-            return "skipped"
-
-        if self._is_opt_out(session, normalized_email):
+            }
+        if normalized_email in opt_out_emails:
             LOGGER.info("Контакт %s в opt-out, письмо не отправляется.", _mask_email(normalized_email))
-            self._update_status(
+            return {
+                "status": "skipped",
+                "sent_at": None,
+                "last_error": "opt_out",
+                "metadata": {"reason": "opt_out"},
+            }
+        return None
+
+    def _send_and_record(
+        self,
+        session: Session,
+        outreach_id: str,
+        recipient: NormalizedRecipient,
+        subject: str,
+        body: str,
+    ) -> str:
+        outcome = self._transmit(recipient, PreparedEmailTemplate(subject, body))
+        if outcome["status"] == "sent":
+            self._update_status(session, outreach_id, **outcome)
+        else:
+            self._record_failure(
                 session,
                 outreach_id,
-                status="skipped",
-                sent_at=None,
-                last_error="opt_out",
-                metadata={"reason": "opt_out"},
+                error=str(outcome["last_error"]),
+                metadata=outcome["metadata"],  # type: ignore[arg-type]
             )
-            return "skipped"
+        return str(outcome["status"])
 
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["To"] = normalized_email
-        msg.set_content(body)
+    def _transmit(self, recipient: NormalizedRecipient, template: PreparedEmailTemplate) -> Dict[str, object]:
+        """Собирает и отправляет письмо без обращений к БД; возвращает поля для обновления статуса."""
+        normalized_email = recipient.email
+        msg = template.build(normalized_email)
 
-        route = self._prepare_route(normalized_email)
+        route = self._prepare_route(recipient)
         message_id = self._make_message_id(route.channel)
         msg["Message-ID"] = message_id
         self._apply_headers(msg, route.channel, reply_to=route.reply_to)
@@ -442,65 +1162,37 @@ class EmailSender:
 
         try:
             route = self._deliver_with_fallback(normalized_email, msg, route, metadata)
-            self._update_status(
-                session,
-                outreach_id,
-                status="sent",
-                sent_at=datetime.now(timezone.utc),
-                last_error=None,
-                metadata=metadata,
-            )
-            LOGGER.info(
-                "Письмо %s отправлено через %s (mx=%s).",
-                _mask_email(normalized_email),
-                metadata["route"]["provider"],
-                route.mx_result.classification,
-            )
-            return "sent"
         except smtplib.SMTPAuthenticationError as exc:
             LOGGER.error("Ошибка авторизации SMTP (%s): %s", _mask_email(normalized_email), exc)
-            metadata["route"]["error"] = str(exc)
-            self._update_status(
-                session,
-                outreach_id,
-                status="failed",
-                sent_at=None,
-                last_error=str(exc),
-                metadata=metadata,
-            )
-            return "failed"
+            return {"status": "failed", "sent_at": None, "last_error": str(exc), "metadata": metadata}
         except OSError as exc:
-            metadata["route"]["error"] = str(exc)
-            self._update_status(
-                session,
-                outreach_id,
-                status="failed",
-                sent_at=None,
-                last_error=str(exc),
-                metadata=metadata,
-            )
             LOGGER.error("Сетевая ошибка отправки письма (%s): %s", _mask_email(normalized_email), exc)
-            return "failed"
+            return {"status": "failed", "sent_at": None, "last_error": str(exc), "metadata": metadata}
         except smtplib.SMTPException as exc:  # noqa: PERF203
-            metadata["route"]["error"] = str(exc)
-            self._update_status(
-                session,
-                outreach_id,
-                status="failed",
-                sent_at=None,
-                last_error=str(exc),
-                metadata=metadata,
-            )
             LOGGER.error("Ошибка отправки письма (%s): %s", _mask_email(normalized_email), exc)
-            return "failed"
+            return {"status": "failed", "sent_at": None, "last_error": str(exc), "metadata": metadata}
+
+        LOGGER.info(
+            "Письмо %s отправлено через %s (mx=%s).",
+            _mask_email(normalized_email),
+            metadata["route"]["provider"],
+            route.mx_result.classification,
+        )
+        return {
+            "status": "sent",
+            "sent_at": datetime.now(timezone.utc),
+            "last_error": None,
+            "metadata": metadata,
+        }
 
     def _claim_outreach(self, session: Session, outreach_id: str) -> bool:
-        result = session.execute(text(CLAIM_OUTREACH_SQL), {"id": outreach_id})
+        result = session.execute(_CLAIM_OUTREACH_STMT, {"id": outreach_id})
         return result.first() is not None
 
-    def _prepare_route(self, to_email: str) -> RouteContext:
-        domain = self._extract_domain(to_email)
-        mx_result = self.mx_router.classify(domain) if domain else MXResult("UNKNOWN", [], False)
+    def _prepare_route(self, recipient: NormalizedRecipient) -> RouteContext:
+        to_email = recipient.email
+        domain = recipient.domain
+        mx_result = self._classify_domain(domain) if domain else MXResult("UNKNOWN", [], False)
         provider = "yandex" if mx_result.classification == "RU" else "gmail"
         channel = self.yandex_settings if provider == "yandex" else self.gmail_settings
         reply_to: Optional[str] = None
@@ -532,10 +1224,17 @@ class EmailSender:
             del message["From"]
         if "Reply-To" in message:
             del message["Reply-To"]
-        message["From"] = self._build_from_header(channel)
+        message["From"] = self._from_header_for(channel)
         if reply_to:
             message["Reply-To"] = reply_to
 
+    def _from_header_for(self, channel: SMTPChannelSettings) -> str:
+        header = self._from_headers.get(channel)
+        if header is None:
+            header = self._build_from_header(channel)
+            self._from_headers[channel] = header
+        return header
+
     def _deliver_with_fallback(
         self,
         to_email: str,
@@ -558,7 +1257,11 @@ class EmailSender:
                     _mask_email(to_email),
                     error_text,
                 )
+                # Письмо уже собрано: для фолбэка меняем только заголовки отправителя и Message-ID
                 self._apply_headers(message, fallback_route.channel, reply_to=fallback_route.reply_to)
+                fallback_message_id = self._make_message_id(fallback_route.channel)
+                message.replace_header("Message-ID", fallback_message_id)
+                metadata["message_id"] = fallback_message_id
                 try:
                     self._send_via_channel(to_email, message, fallback_route.channel)
                 except smtplib.SMTPException as fallback_exc:
@@ -577,18 +1280,7 @@ class EmailSender:
             return False
         if not self._channel_configured(self.gmail_settings):
             return False
-        error_text = self._extract_smtp_error_text(error).lower()
-        if not error_text:
-            return False
-        spam_tokens = (
-            "5.7.1",
-            "5.7.0",
-            "suspected spam",
-            "suspicion of spam",
-            "message rejected",
-            "under suspicion of spam",
-        )
-        return any(token in error_text for token in spam_tokens)
+        return bool(_SPAM_REJECTION_RE.search(self._extract_smtp_error_text(error)))
 
     @staticmethod
     def _extract_smtp_error_text(error: Exception) -> str:
@@ -608,100 +1300,113 @@ class EmailSender:
             fallback=True,
         )
 
+    def _classify_domain(self, domain: str) -> MXResult:
+        """Классифицирует домен через MXRouter, запоминая ответ на MX_MEMO_TTL_SECONDS."""
+        now = monotonic()
+        cached = self._mx_memo.get(domain)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        result = self.mx_router.classify(domain)
+        if len(self._mx_memo) >= MX_MEMO_MAX_DOMAINS:
+            self._mx_memo.clear()
+        self._mx_memo[domain] = (now + MX_MEMO_TTL_SECONDS, result)
+        return result
+
     @staticmethod
     def _channel_configured(channel: SMTPChannelSettings) -> bool:
         return bool(channel.host and channel.port)
 
-    @staticmethod
-    def _extract_domain(email: str) -> Optional[str]:
-        _, parsed = parseaddr(email)
-        if "@" not in parsed:
-            return None
-        return parsed.split("@", 1)[1].lower()
-
     def _send_via_channel(self, to_email: str, message: EmailMessage, channel: SMTPChannelSettings) -> None:
         if not channel.host:
             raise smtplib.SMTPException("SMTP host is not configured.")
 
-        LOGGER.debug(
-            "Отправка письма %s -> %s через %s",
-            message["Message-ID"],
-            _mask_email(to_email),
-            channel.host,
-        )
-        if channel.use_ssl:
-            context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(channel.host, channel.port, timeout=self.timeout, context=context) as smtp:
-                self._login_if_needed(smtp, channel)
-                smtp.send_message(message)
-        else:
-            with smtplib.SMTP(channel.host, channel.port, timeout=self.timeout) as smtp:
-                if channel.use_tls and self.use_starttls:
-                    smtp.starttls()
-                self._login_if_needed(smtp, channel)
-                smtp.send_message(message)
-
-    @staticmethod
-    def _login_if_needed(smtp: smtplib.SMTP, channel: SMTPChannelSettings) -> None:
-        if channel.username and channel.password:
-            smtp.login(channel.username, channel.password)
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            # Аргументы считаются до вызова логгера, поэтому без DEBUG не тратим время на маскирование
+            LOGGER.debug(
+                "Отправка письма %s -> %s через %s",
+                message["Message-ID"],
+                _mask_email(to_email),
+                channel.host,
+            )
+        self._smtp_pool.send(channel, message)
 
     def _make_message_id(self, channel: SMTPChannelSettings) -> str:
-        domain = channel.host.split(":")[0] if channel.host else None
-        return make_msgid(domain=domain)
-
-    def _is_opt_out(self, session: Session, to_email: str) -> bool:
-        normalized = clean_email(to_email)
-        result = session.execute(text(CHECK_OPT_OUT_SQL), {"contact_value": normalized})
-        return result.first() is not None
+        try:
+            domain = self._message_id_domains[channel]
+        except KeyError:
+            domain = channel.host.split(":")[0] if channel.host else _local_fqdn()
+            self._message_id_domains[channel] = domain
+        # Уникальность даёт связка наносекунд, счётчика процесса и случайных байт
+        return f"<{time_ns():x}.{next(_MESSAGE_ID_COUNTER):x}.{os.urandom(4).hex()}@{domain}>"
+
+    def _opt_out_set(self, session: Session) -> frozenset[str]:
+        emails, loaded_at = self._opt_out_cache
+        now = monotonic()
+        if loaded_at is None or now - loaded_at >= OPT_OUT_CACHE_TTL_SECONDS:
+            rows = session.execute(_SELECT_OPT_OUT_VALUES_STMT).scalars().all()
+            emails = frozenset(value for value in rows if value)
+            # Набор и время загрузки меняем одним присваиванием, чтобы параллельные потоки не видели половину
+            self._opt_out_cache = (emails, now)
+        return emails
+
+    def _persist_status(self, session: Session, payload: Dict[str, object]) -> str:
+        params = dict(payload)
+        params["metadata"] = dumps_jsonb(payload["metadata"])
+        result = session.execute(_INSERT_OUTREACH_STMT, params)
+        return str(result.scalar_one())
 
-    def _persist_status(
+    def _update_status(
         self,
         session: Session,
-        company_id: str,
-        contact_id: Optional[str],
-        template: EmailTemplate,
+        outreach_id: str,
         *,
         status: str,
-        scheduled_for: Optional[datetime],
         sent_at: Optional[datetime],
         last_error: Optional[str],
         metadata: Dict[str, object],
-    ) -> str:
+    ) -> None:
+        # id записи вызывающему уже известен, поэтому UPDATE без RETURNING
         payload = {
-            "company_id": company_id,
-            "contact_id": contact_id,
-            "subject": template.subject,
-            "body": template.body,
+            "id": outreach_id,
             "status": status,
-            "scheduled_for": scheduled_for,
             "sent_at": sent_at,
             "last_error": last_error,
-            "metadata": json.dumps(metadata),
+            "metadata": dumps_jsonb(metadata),
         }
+        session.execute(_UPDATE_OUTREACH_STMT, payload)
+
+    def _update_status_batch(self, session: Session, rows: Sequence[Dict[str, object]]) -> None:
+        """Обновляет статусы пачки писем одним UPDATE по unnest-массивам вместо N запросов."""
+        for start in range(0, len(rows), QUEUE_BATCH_PAGE_SIZE):
+            page = rows[start : start + QUEUE_BATCH_PAGE_SIZE]
+            session.execute(
+                _UPDATE_OUTREACH_BATCH_STMT,
+                {
+                    "ids": [str(row["id"]) for row in page],
+                    "statuses": [row["status"] for row in page],
+                    "sent_at": [row.get("sent_at") for row in page],
+                    "last_errors": [row.get("last_error") for row in page],
+                    "metadata": [dumps_jsonb(row.get("metadata") or {}) for row in page],
+                },
+            )
 
-        result = session.execute(text(INSERT_OUTREACH_SQL), payload)
-        return str(result.scalar_one())
-
-    def _update_status(
+    def _record_failure(
         self,
         session: Session,
         outreach_id: str,
         *,
-        status: str,
-        sent_at: Optional[datetime],
-        last_error: Optional[str],
+        error: str,
         metadata: Dict[str, object],
-    ) -> str:
+    ) -> None:
+        # Текст ошибки уходит один раз в last_error, а metadata.route.error проставляет jsonb_set на стороне БД
+        route = {key: value for key, value in metadata["route"].items() if key != "error"}
         payload = {
             "id": outreach_id,
-            "status": status,
-            "sent_at": sent_at,
-            "last_error": last_error,
-            "metadata": json.dumps(metadata),
+            "status": "failed",
+            "last_error": error,
+            "metadata": dumps_jsonb({**metadata, "route": route}),
         }
-        result = session.execute(text(UPDATE_OUTREACH_SQL), payload)
-        return str(result.scalar_one())
+        session.execute(_UPDATE_OUTREACH_FAILED_STMT, payload)
 
     def mark_status(
         self,
@@ -716,7 +1421,7 @@ class EmailSender:
         """Проставляет произвольный статус для записи рассылки."""
         metadata_payload = metadata or {}
         if session is not None:
-            return self._update_status(
+            self._update_status(
                 session,
                 outreach_id,
                 status=status,
@@ -724,9 +1429,10 @@ class EmailSender:
                 last_error=last_error,
                 metadata=metadata_payload,
             )
+            return outreach_id
 
         with session_scope(self.session_factory) as scoped_session:
-            return self._update_status(
+            self._update_status(
                 scoped_session,
                 outreach_id,
                 status=status,
@@ -734,55 +1440,118 @@ class EmailSender:
                 last_error=last_error,
                 metadata=metadata_payload,
             )
+        return outreach_id
 
-    def _compute_scheduled_for(
+    def _reserve_slots(
         self,
-        *,
         session: Session,
+        count: int,
+        *,
         reference: Optional[datetime] = None,
-    ) -> datetime:
-        now_utc = reference or datetime.now(timezone.utc)
-        local_now = now_utc.astimezone(self._tz)
-
-        last_scheduled = session.execute(text(SELECT_LAST_SCHEDULED_SQL)).scalar_one_or_none()
+    ) -> List[datetime]:
+        """Резервирует count последовательных слотов отправки за одно чтение якоря."""
+        # Локальное «сейчас» берём сразу в поясе окна, без промежуточного UTC-объекта
+        local_now = reference.astimezone(self._tz) if reference else datetime.now(self._tz)
+
+        # Транзакционная advisory-блокировка сериализует выбор слота до коммита вставки,
+        # а сам якорь читается без блокировок строк через MAX по частичному индексу
+        session.execute(_LOCK_SCHEDULE_STMT, {"lock_id": SCHEDULE_ADVISORY_LOCK_ID})
+        last_scheduled = session.execute(_SELECT_LAST_SCHEDULED_STMT).scalar_one_or_none()
         if last_scheduled:
             last_local = last_scheduled.astimezone(self._tz)
             anchor = last_local if last_local > local_now else local_now
         else:
             anchor = local_now
 
-        delay_seconds = random.randint(MIN_SEND_DELAY_SECONDS, MAX_SEND_DELAY_SECONDS)
-        scheduled_local = self._pick_time_within_window(anchor, delay_seconds)
-        return scheduled_local.astimezone(timezone.utc)
-
-    def _pick_time_within_window(self, anchor_local: datetime, delay_seconds: int) -> datetime:
-        window_start = datetime.combine(anchor_local.date(), SEND_WINDOW_START, tzinfo=self._tz)
-        window_end = datetime.combine(anchor_local.date(), SEND_WINDOW_END, tzinfo=self._tz)
-
-        if anchor_local < window_start:
-            base = window_start
-        elif anchor_local > window_end:
-            next_day = anchor_local.date() + timedelta(days=1)
-            base = datetime.combine(next_day, SEND_WINDOW_START, tzinfo=self._tz)
-            window_end = datetime.combine(next_day, SEND_WINDOW_END, tzinfo=self._tz)
+        # Дальше считаем в секундах эпохи: день окна несём с собой, datetime собираем только на выходе
+        day = anchor.date()
+        anchor_ts = anchor.timestamp()
+        delays = _random_delays(count)
+        slots_ts: List[float] = []
+        index = 0
+        while index < count:
+            # Первый слот дня — через общий помощник: он переносит якорь в окно и через его границу
+            day, anchor_ts = self._pick_ts_within_window(day, anchor_ts, delays[index])
+            slots_ts.append(anchor_ts)
+            index += 1
+            # Следующие слоты того же окна — накопленные суммы задержек; граница окна ищется бинарным
+            # поиском по возрастающему ряду, без вызова помощника на каждое письмо
+            _, window_end = self._window_bounds_ts(day)
+            limit = int((window_end - anchor_ts) // MIN_SEND_DELAY_SECONDS) + 1
+            run = list(itertools.accumulate(delays[index : index + limit], initial=anchor_ts))[1:]
+            fits = bisect_right(run, window_end)
+            if fits:
+                slots_ts.extend(run[:fits])
+                anchor_ts = run[fits - 1]
+                index += fits
+        return [datetime.fromtimestamp(ts, tz=timezone.utc) for ts in slots_ts]
+
+    def _window_bounds(self, day: date) -> Tuple[datetime, datetime]:
+        """Возвращает границы окна отправки для локальной даты (с кэшем по дате)."""
+        bounds = self._window_cache.get(day)
+        if bounds is None:
+            if len(self._window_cache) >= WINDOW_CACHE_SIZE:
+                self._window_cache.clear()
+            bounds = (
+                datetime.combine(day, SEND_WINDOW_START, tzinfo=self._tz),
+                datetime.combine(day, SEND_WINDOW_END, tzinfo=self._tz),
+            )
+            self._window_cache[day] = bounds
+        return bounds
+
+    def _window_bounds_ts(self, day: date) -> Tuple[int, int]:
+        """Границы окна отправки локальной даты в секундах эпохи (с кэшем по дате)."""
+        bounds = self._window_ts_cache.get(day)
+        if bounds is None:
+            if len(self._window_ts_cache) >= WINDOW_CACHE_SIZE:
+                self._window_ts_cache.clear()
+            start, end = self._window_bounds(day)
+            bounds = (int(start.timestamp()), int(end.timestamp()))
+            self._window_ts_cache[day] = bounds
+        return bounds
+
+    def _pick_ts_within_window(self, day: date, anchor_ts: float, delay_seconds: int) -> Tuple[date, float]:
+        """Сдвигает anchor_ts (локальная дата day) на задержку внутри окна; возвращает новую дату и время."""
+        window_start, window_end = self._window_bounds_ts(day)
+
+        if anchor_ts < window_start:
+            base: float = window_start
+        elif anchor_ts > window_end:
+            day += timedelta(days=1)
+            base, window_end = self._window_bounds_ts(day)
         else:
-            base = anchor_local
+            base = anchor_ts
 
-        candidate = base + timedelta(seconds=delay_seconds)
+        candidate = base + delay_seconds
         if candidate > window_end:
-            next_day = base.date() + timedelta(days=1)
-            base = datetime.combine(next_day, SEND_WINDOW_START, tzinfo=self._tz)
-            window_end = datetime.combine(next_day, SEND_WINDOW_END, tzinfo=self._tz)
-            candidate = base + timedelta(seconds=random.randint(MIN_SEND_DELAY_SECONDS, MAX_SEND_DELAY_SECONDS))
+            day += timedelta(days=1)
+            base, window_end = self._window_bounds_ts(day)
+            candidate = base + _random_delay_seconds()
 
-        return candidate
+        return day, candidate
 
-    def _is_within_send_window(self, local_dt: datetime) -> bool:
-        start = datetime.combine(local_dt.date(), SEND_WINDOW_START, tzinfo=self._tz)
-        end = datetime.combine(local_dt.date(), SEND_WINDOW_END, tzinfo=self._tz)
-        return start <= local_dt <= end
+    def _pick_time_within_window(self, anchor_local: datetime, delay_seconds: int) -> datetime:
+        _, candidate = self._pick_ts_within_window(anchor_local.date(), anchor_local.timestamp(), delay_seconds)
+        return datetime.fromtimestamp(candidate, tz=self._tz)
+
+    def _is_within_send_window(self, local_dt: Optional[datetime] = None) -> bool:
+        if local_dt is None:
+            return self._now_within_send_window()
+        # Для локального времени достаточно сравнить time(): без сборки границ окна с ZoneInfo
+        return SEND_WINDOW_START <= local_dt.time() <= SEND_WINDOW_END
+
+    def _now_within_send_window(self) -> bool:
+        """Проверяет текущее время по секундам от локальной полуночи без tz-aware datetime."""
+        now = int(unix_time())
+        bucket = now // TZ_OFFSET_REFRESH_SECONDS
+        if bucket != self._tz_offset_bucket:
+            offset = datetime.fromtimestamp(now, self._tz).utcoffset()
+            self._tz_offset_seconds = int(offset.total_seconds()) if offset else 0
+            self._tz_offset_bucket = bucket
+        local_seconds = (now + self._tz_offset_seconds) % 86400
+        return SEND_WINDOW_START_SECONDS <= local_seconds <= SEND_WINDOW_END_SECONDS
 
     def is_within_send_window(self, *, reference: Optional[datetime] = None) -> bool:
-        base = reference or datetime.now(timezone.utc)
-        local_dt = base.astimezone(self._tz)
-        return self._is_within_send_window(local_dt)
+        if reference is None:
+            return self._is_within_send_window()
+        return self._is_within_send_window(reference.astimezone(self._tz))
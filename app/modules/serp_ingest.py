@@ -2,17 +2,17 @@
 
 from __future__ import annotations
 
-import json
+import hashlib
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Union
 from xml.etree import ElementTree as ET
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.modules.constants import EXCLUDED_DOMAINS
-from app.modules.utils.db import get_session_factory, session_scope
+from app.modules.utils.db import dumps_jsonb, get_session_factory, session_scope
 from app.modules.utils.normalize import (
     build_company_dedupe_key,
     clean_snippet,
@@ -24,6 +24,9 @@ LOGGER = logging.getLogger("app.serp_ingest")
 
 EXCLUDED_DOMAIN_SUFFIXES = tuple(sorted(EXCLUDED_DOMAINS))
 
+_PASSAGES_PATH = ".//passages/passage"
+_LANG_PROPERTY_PATH = ".//properties/property[@name='lang']"
+
 
 def _is_excluded_domain(domain: str) -> bool:
     domain_lower = (domain or "").lower()
@@ -33,6 +36,14 @@ def _is_excluded_domain(domain: str) -> bool:
     )
 
 
+def _content_hash(document: SerpDocument) -> bytes:
+    """Отпечаток полей документа, которые переписывает upsert."""
+    content = "\x1f".join(
+        (document.url, document.title, document.snippet, str(document.position), document.language or "")
+    )
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
 class SerpParseError(RuntimeError):
     """Ошибка парсинга XML-ответа."""
 
@@ -49,66 +60,121 @@ class SerpDocument:
     language: Optional[str]
 
 
-def parse_serp_xml(xml_payload: bytes) -> List[SerpDocument]:
-    """Извлекает документы из XML-ответа Yandex Search."""
-    if not xml_payload:
-        return []
+def parse_serp_xml(xml_payload: Union[bytes, Iterable[bytes]]) -> List[SerpDocument]:
+    """Извлекает документы из XML-ответа Yandex Search.
 
+    Принимает весь XML целиком или итератор его фрагментов (например, декодируемых из Base64 по частям).
+    """
+    chunks = (xml_payload,) if isinstance(xml_payload, (bytes, bytearray)) else xml_payload
+    documents: List[SerpDocument] = []
+    position = 0
+
+    def collect(parser: ET.XMLPullParser) -> None:
+        nonlocal position
+        for _, doc in parser.read_events():
+            if doc.tag != "doc":
+                continue
+            position += 1
+            document = _parse_doc(doc, position)
+            doc.clear()
+            if document is not None:
+                documents.append(document)
+
+    # Потоковый разбор: каждый <doc> обрабатывается по закрывающему тегу и сразу очищается,
+    # поэтому дерево всего ответа в памяти не строится
+    parser = ET.XMLPullParser(events=("end",))
+    received = False
     try:
-        root = ET.fromstring(xml_payload)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            received = True
+            parser.feed(chunk)
+            collect(parser)
+        if received:
+            parser.close()
+            collect(parser)
     except ET.ParseError as exc:
         raise SerpParseError("Некорректный XML выдачи.") from exc
 
-    documents: List[SerpDocument] = []
-    for position, doc in enumerate(root.findall(".//doc"), start=1):
-        url_text = (doc.findtext("url") or doc.findtext("lurl") or "").strip()
-        normalized_url = normalize_url(url_text)
-        if not normalized_url:
-            LOGGER.debug("Пропущен документ без корректного URL: %s", url_text)
-            continue
-
-        domain_text = doc.findtext("domain") or ""
-        normalized_domain = normalize_domain(domain_text or normalized_url)
-        title = (doc.findtext("title") or doc.findtext("name") or normalized_domain).strip()
-
-        passages = [clean_snippet(node.text) for node in doc.findall(".//passages/passage")]
-        snippet = clean_snippet(" ".join(filter(None, passages)))
-
-        language = None
-        for prop in doc.findall(".//properties/property"):
-            if prop.get("name") == "lang" and prop.text:
-                language = prop.text.strip()
-                break
-
-        documents.append(
-            SerpDocument(
-                url=normalized_url,
-                domain=normalized_domain,
-                title=title,
-                snippet=snippet,
-                position=position,
-                language=language,
-            )
-        )
-
     return documents
 
 
-INSERT_SERP_RESULT_SQL = """
-INSERT INTO serp_results (operation_id, url, domain, title, snippet, position, language, metadata)
-VALUES (:operation_id, :url, :domain, :title, :snippet, :position, :language, CAST(:metadata AS JSONB))
-ON CONFLICT (operation_id, url)
-DO UPDATE SET
-    title = EXCLUDED.title,
-    snippet = EXCLUDED.snippet,
-    position = EXCLUDED.position,
-    language = EXCLUDED.language,
-    metadata = serp_results.metadata || EXCLUDED.metadata
-RETURNING id;
+def _parse_doc(doc: ET.Element, position: int) -> Optional[SerpDocument]:
+    url_text = (doc.findtext("url") or doc.findtext("lurl") or "").strip()
+    normalized_url = normalize_url(url_text)
+    if not normalized_url:
+        LOGGER.debug("Пропущен документ без корректного URL: %s", url_text)
+        return None
+
+    domain_text = doc.findtext("domain") or ""
+    normalized_domain = normalize_domain(domain_text or normalized_url)
+    title = (doc.findtext("title") or doc.findtext("name") or normalized_domain).strip()
+
+    passages = [clean_snippet(node.text) for node in doc.iterfind(_PASSAGES_PATH)]
+    snippet = clean_snippet(" ".join(filter(None, passages)))
+
+    language = None
+    for prop in doc.iterfind(_LANG_PROPERTY_PATH):
+        if prop.text:
+            language = prop.text.strip()
+            break
+
+    return SerpDocument(
+        url=normalized_url,
+        domain=normalized_domain,
+        title=title,
+        snippet=snippet,
+        position=position,
+        language=language,
+    )
+
+
+INSERT_SERP_RESULTS_SQL = """
+WITH upserted AS (
+    INSERT INTO serp_results (operation_id, url, domain, title, snippet, position, language, metadata, content_hash)
+    SELECT
+        CAST(:operation_id AS UUID),
+        data.url,
+        data.domain,
+        data.title,
+        data.snippet,
+        data.position,
+        data.language,
+        data.metadata,
+        data.content_hash
+    FROM unnest(
+        CAST(:urls AS TEXT[]),
+        CAST(:domains AS TEXT[]),
+        CAST(:titles AS TEXT[]),
+        CAST(:snippets AS TEXT[]),
+        CAST(:positions AS INTEGER[]),
+        CAST(:languages AS TEXT[]),
+        CAST(:metadata AS JSONB[]),
+        CAST(:content_hashes AS BYTEA[])
+    ) AS data(url, domain, title, snippet, position, language, metadata, content_hash)
+    ON CONFLICT (operation_id, url)
+    DO UPDATE SET
+        title = EXCLUDED.title,
+        snippet = EXCLUDED.snippet,
+        position = EXCLUDED.position,
+        language = EXCLUDED.language,
+        metadata = serp_results.metadata || EXCLUDED.metadata,
+        content_hash = EXCLUDED.content_hash
+    WHERE serp_results.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+    RETURNING id, url
+)
+SELECT id, url FROM upserted
+UNION ALL
+SELECT sr.id, sr.url
+FROM serp_results sr
+WHERE sr.operation_id = CAST(:operation_id AS UUID)
+  AND sr.url = ANY(CAST(:urls AS TEXT[]))
+  AND sr.url NOT IN (SELECT url FROM upserted);
 """
 
 
-UPSERT_COMPANY_SQL = """
+UPSERT_COMPANIES_SQL = """
 INSERT INTO companies (
     name,
     canonical_domain,
@@ -120,26 +186,34 @@ INSERT INTO companies (
     first_seen_at,
     last_seen_at
 )
-VALUES (
-    :name,
-    :domain,
-    :website_url,
+SELECT
+    data.name,
+    data.domain,
+    data.website_url,
     'new',
-    :dedupe_hash,
-    CAST(:attributes AS JSONB),
+    data.dedupe_hash,
+    data.attributes,
     'yandex_search_api',
     NOW(),
     NOW()
-)
+FROM unnest(
+    CAST(:names AS TEXT[]),
+    CAST(:domains AS TEXT[]),
+    CAST(:website_urls AS TEXT[]),
+    CAST(:dedupe_hashes AS TEXT[]),
+    CAST(:attributes AS JSONB[])
+) AS data(name, domain, website_url, dedupe_hash, attributes)
 ON CONFLICT (dedupe_hash)
 DO UPDATE SET
     website_url = COALESCE(companies.website_url, EXCLUDED.website_url),
     attributes = companies.attributes || EXCLUDED.attributes,
     last_seen_at = NOW(),
-    updated_at = NOW()
-RETURNING id;
+    updated_at = NOW();
 """
 
+_INSERT_SERP_RESULTS_STMT = text(INSERT_SERP_RESULTS_SQL)
+_UPSERT_COMPANIES_STMT = text(UPSERT_COMPANIES_SQL)
+
 
 class SerpIngestService:
     """Сохраняет документы выдачи в БД."""
@@ -150,82 +224,111 @@ class SerpIngestService:
     def ingest(
         self,
         operation_db_id: str,
-        xml_payload: bytes,
+        xml_payload: Union[bytes, Iterable[bytes]],
         *,
         yandex_operation_id: str | None = None,
     ) -> List[str]:
-        """Парсит и сохраняет результаты выдачи для операции."""
+        """Парсит и сохраняет результаты выдачи для операции.
+
+        Результаты и компании пишутся двумя запросами на весь XML вместо пары запросов на документ.
+        """
         documents = parse_serp_xml(xml_payload)
         if not documents:
             LOGGER.info("Операция %s не содержит документов для сохранения.", operation_db_id)
             return []
 
-        inserted: List[str] = []
-        with session_scope(self.session_factory) as session:
-            for document in documents:
-                if _is_excluded_domain(document.domain):
-                    LOGGER.debug(
-                        "Документ %s пропущен из-за исключённого домена %s",
-                        document.url,
-                        document.domain,
-                    )
-                    continue
-                result_id = self._upsert_result(
-                    session,
-                    operation_db_id,
-                    document,
-                    yandex_operation_id=yandex_operation_id,
+        kept: List[SerpDocument] = []
+        for document in documents:
+            if _is_excluded_domain(document.domain):
+                LOGGER.debug(
+                    "Документ %s пропущен из-за исключённого домена %s",
+                    document.url,
+                    document.domain,
                 )
-                inserted.append(result_id)
-                self._ensure_company(session, document)
+                continue
+            kept.append(document)
+        if not kept:
+            return []
+
+        with session_scope(self.session_factory) as session:
+            result_ids = self._upsert_results(
+                session,
+                operation_db_id,
+                kept,
+                yandex_operation_id=yandex_operation_id,
+            )
+            self._upsert_companies(session, kept)
 
-        return inserted
+        return [result_ids[document.url] for document in kept]
 
-    def _upsert_result(
+    def _upsert_results(
         self,
         session: Session,
         operation_db_id: str,
-        document: SerpDocument,
+        documents: List[SerpDocument],
         *,
         yandex_operation_id: str | None = None,
-    ) -> str:
-        metadata_payload = {
-            "language": document.language,
-            "source": "yandex",
-        }
-        if yandex_operation_id:
-            metadata_payload["yandex_operation_id"] = yandex_operation_id
+    ) -> Dict[str, str]:
+        """Возвращает id строк serp_results по URL документа."""
+        # ON CONFLICT не обновляет одну строку дважды за запрос: повтор URL в выдаче оставляем последним,
+        # как это делал бы повторный upsert
+        by_url: Dict[str, SerpDocument] = {document.url: document for document in documents}
+        rows = list(by_url.values())
+        metadata: List[str] = []
+        content_hashes: List[bytes] = []
+        for document in rows:
+            metadata_payload: Dict[str, Any] = {
+                "language": document.language,
+                "source": "yandex",
+            }
+            if yandex_operation_id:
+                metadata_payload["yandex_operation_id"] = yandex_operation_id
+            metadata.append(dumps_jsonb(metadata_payload))
+            content_hashes.append(_content_hash(document))
 
         result = session.execute(
-            text(INSERT_SERP_RESULT_SQL),
+            _INSERT_SERP_RESULTS_STMT,
             {
                 "operation_id": operation_db_id,
-                "url": document.url,
-                "domain": document.domain,
-                "title": document.title,
-                "snippet": document.snippet,
-                "position": document.position,
-                "language": document.language,
-                "metadata": json.dumps(metadata_payload),
+                "urls": [document.url for document in rows],
+                "domains": [document.domain for document in rows],
+                "titles": [document.title for document in rows],
+                "snippets": [document.snippet for document in rows],
+                "positions": [document.position for document in rows],
+                "languages": [document.language for document in rows],
+                "metadata": metadata,
+                "content_hashes": content_hashes,
             },
         )
-        return str(result.scalar_one())
-
-    def _ensure_company(self, session: Session, document: SerpDocument) -> None:
-        if _is_excluded_domain(document.domain):
-            return
-        dedupe_hash = build_company_dedupe_key(document.title, document.domain)
-        attributes = json.dumps({
-            "source": "yandex_serp",
-            "last_snippet": document.snippet,
-        })
-        session.execute(
-            text(UPSERT_COMPANY_SQL),
-            {
+        return {url: str(result_id) for result_id, url in result.all()}
+
+    def _upsert_companies(self, session: Session, documents: List[SerpDocument]) -> None:
+        # Повтор компании в той же выдаче: имя и URL берём из первого документа, сниппет — из последнего
+        companies: Dict[str, Dict[str, Any]] = {}
+        for document in documents:
+            dedupe_hash = build_company_dedupe_key(document.title, document.domain)
+            attributes = dumps_jsonb({
+                "source": "yandex_serp",
+                "last_snippet": document.snippet,
+            })
+            existing = companies.get(dedupe_hash)
+            if existing is not None:
+                existing["attributes"] = attributes
+                continue
+            companies[dedupe_hash] = {
                 "name": document.title or document.domain,
                 "domain": document.domain or None,
                 "website_url": document.url,
-                "dedupe_hash": dedupe_hash,
                 "attributes": attributes,
+            }
+
+        session.execute(
+            _UPSERT_COMPANIES_STMT,
+            {
+                "names": [company["name"] for company in companies.values()],
+                "domains": [company["domain"] for company in companies.values()],
+                "website_urls": [company["website_url"] for company in companies.values()],
+                "dedupe_hashes": list(companies),
+                "attributes": [company["attributes"] for company in companies.values()],
             },
         )
@@ -6,14 +6,17 @@ import json
 import logging
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Protocol
+from functools import lru_cache
+from itertools import islice
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
 
 import gspread
 from google.oauth2.service_account import Credentials
 from sqlalchemy import text
+from sqlalchemy.orm import Session
 
 from app.modules.query_generator import GeneratedQuery, NicheRow, QueryGenerator
-from app.modules.utils.db import get_session_factory, session_scope
+from app.modules.utils.db import dumps_jsonb, get_session_factory, session_scope
 
 LOGGER = logging.getLogger("app.sheet_sync")
 
@@ -27,19 +30,92 @@ STATUS_COLUMNS = [
     "last_error",
 ]
 
-
-@dataclass
+# Сколько строк листа обрабатывается в одной транзакции перед записью статусов в лист
+SYNC_CHUNK_SIZE = 200
+
+# Сколько запросов уходит в один INSERT: ограничивает размер массивов-параметров
+QUERY_INSERT_BATCH_SIZE = 1000
+
+# С какого размера вставки сначала отсеиваем уже известные хэши одним индексным SELECT:
+# при повторной генерации большинство запросов — дубликаты, и спекулятивная вставка дороже чтения
+QUERY_PRECHECK_THRESHOLD = 100
+
+SELECT_EXISTING_QUERY_HASHES_SQL = """
+SELECT query_hash FROM serp_queries WHERE query_hash = ANY(CAST(:hashes AS TEXT[]))
+"""
+
+INSERT_QUERIES_SQL = """
+WITH data AS (
+    SELECT *
+    FROM unnest(
+        CAST(:query_texts AS TEXT[]),
+        CAST(:query_hashes AS TEXT[]),
+        CAST(:region_codes AS INTEGER[]),
+        CAST(:scheduled_fors AS TIMESTAMPTZ[]),
+        CAST(:metadata AS JSONB[]),
+        CAST(:group_ids AS INTEGER[])
+    ) WITH ORDINALITY AS data(query_text, query_hash, region_code, scheduled_for, metadata, group_id, ord)
+),
+inserted AS (
+    INSERT INTO serp_queries (query_text, query_hash, region_code, is_night_window, status, scheduled_for, metadata)
+    SELECT query_text, query_hash, region_code, TRUE, 'pending', scheduled_for, metadata
+    FROM data
+    ORDER BY ord
+    ON CONFLICT (query_hash) DO NOTHING
+    RETURNING query_hash, scheduled_for
+),
+owners AS (
+    SELECT DISTINCT ON (query_hash) query_hash, group_id
+    FROM data
+    ORDER BY query_hash, ord
+)
+SELECT owners.group_id, COUNT(*), MIN(inserted.scheduled_for), MAX(inserted.scheduled_for)
+FROM inserted
+JOIN owners ON owners.query_hash = inserted.query_hash
+GROUP BY owners.group_id
+"""
+
+INSERT_BATCH_LOGS_SQL = """
+INSERT INTO search_batch_logs (
+    niche, city, country, batch_tag,
+    attempted_queries, inserted_queries, duplicate_queries,
+    scheduled_start, scheduled_end,
+    status, error
+)
+SELECT *
+FROM unnest(
+    CAST(:niches AS TEXT[]),
+    CAST(:cities AS TEXT[]),
+    CAST(:countries AS TEXT[]),
+    CAST(:batch_tags AS TEXT[]),
+    CAST(:attempted AS INTEGER[]),
+    CAST(:inserted AS INTEGER[]),
+    CAST(:duplicates AS INTEGER[]),
+    CAST(:first_scheduled AS TIMESTAMPTZ[]),
+    CAST(:last_scheduled AS TIMESTAMPTZ[]),
+    CAST(:statuses AS TEXT[]),
+    CAST(:errors AS TEXT[])
+)
+"""
+
+_SELECT_EXISTING_QUERY_HASHES_STMT = text(SELECT_EXISTING_QUERY_HASHES_SQL)
+_INSERT_QUERIES_STMT = text(INSERT_QUERIES_SQL)
+_INSERT_BATCH_LOGS_STMT = text(INSERT_BATCH_LOGS_SQL)
+
+
+@dataclass(slots=True)
 class SheetRowData:
     """Данные строки листа."""
 
     row_index: int
+    # Ключи — нормализованные заголовки, значения уже очищены от пробелов в fetch_rows
     values: dict[str, str]
 
     def get(self, key: str) -> str:
-        return self.values.get(key.lower(), "").strip()
+        return self.values.get(key, "")
 
 
-@dataclass
+@dataclass(slots=True)
 class SheetStatusUpdate:
     row_index: int
     status: str
@@ -51,7 +127,7 @@ class SheetStatusUpdate:
     last_error: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryInsertResult:
     attempted: int
     inserted: int
@@ -60,7 +136,17 @@ class QueryInsertResult:
     last_scheduled: Optional[datetime]
 
 
-@dataclass
+@dataclass(slots=True)
+class BatchLogEntry:
+    """Строка журнала партий search_batch_logs."""
+
+    row: NicheRow
+    result: QueryInsertResult
+    status: str
+    error: Optional[str]
+
+
+@dataclass(slots=True)
 class SyncSummary:
     total_rows: int = 0
     processed_rows: int = 0
@@ -72,7 +158,7 @@ class SyncSummary:
 class SheetAdapter(Protocol):
     """Интерфейс доступа к листу."""
 
-    def fetch_rows(self) -> List[SheetRowData]:
+    def fetch_rows(self) -> Iterable[SheetRowData]:
         ...
 
     def update_rows(self, updates: List[SheetStatusUpdate]) -> None:
@@ -114,6 +200,7 @@ class GoogleSheetAdapter:
         return header.strip().lower()
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _column_letter(index: int) -> str:
         result = ""
         while index > 0:
@@ -121,21 +208,20 @@ class GoogleSheetAdapter:
             result = chr(65 + remainder) + result
         return result
 
-    def fetch_rows(self) -> List[SheetRowData]:
+    def fetch_rows(self) -> Iterator[SheetRowData]:
         raw = self._worksheet.get_all_values()
         if not raw:
-            return []
-        headers = raw[0]
-        header_map = {self._normalize_header(h): idx + 1 for idx, h in enumerate(headers)}
-        self._header_map = header_map
-        rows: List[SheetRowData] = []
+            return
+        # Заголовки нормализуем один раз и склеиваем с каждой строкой через zip
+        headers = tuple(self._normalize_header(header) for header in raw[0])
+        self._header_map = {header: idx + 1 for idx, header in enumerate(headers)}
+        width = len(headers)
+        # Строки отдаются по одной: копия всего листа в виде SheetRowData не собирается
         for row_idx, values in enumerate(raw[1:], start=2):
-            row_dict = {
-                self._normalize_header(headers[col_idx]): (values[col_idx].strip() if col_idx < len(values) else "")
-                for col_idx in range(len(headers))
-            }
-            rows.append(SheetRowData(row_index=row_idx, values=row_dict))
-        return rows
+            cells = [value.strip() for value in values[:width]]
+            if len(cells) < width:
+                cells.extend([""] * (width - len(cells)))
+            yield SheetRowData(row_index=row_idx, values=dict(zip(headers, cells)))
 
     def update_rows(self, updates: List[SheetStatusUpdate]) -> None:
         if not updates:
@@ -146,26 +232,28 @@ class GoogleSheetAdapter:
         if missing:
             raise RuntimeError(f"В листе отсутствуют необходимые столбцы: {', '.join(missing)}")
 
-        requests = []
-        for update in updates:
-            values = [
-                update.status,
-                str(update.generated_count),
-                str(update.inserted_count),
-                str(update.duplicate_count),
-                update.first_scheduled.isoformat() if update.first_scheduled else "",
-                update.last_scheduled.isoformat() if update.last_scheduled else "",
-                (update.last_error or ""),
-            ]
-            start_col = self._header_map[STATUS_COLUMNS[0]]
-            end_col = self._header_map[STATUS_COLUMNS[-1]]
-            range_a1 = (
-                f"{self._column_letter(start_col)}{update.row_index}:"
-                f"{self._column_letter(end_col)}{update.row_index}"
-            )
-            requests.append({"range": range_a1, "values": [values]})
-        if requests:
-            self._worksheet.batch_update(requests)
+        # Границы диапазона статусов одинаковы для всех строк — считаем буквы столбцов один раз
+        start_letter = self._column_letter(self._header_map[STATUS_COLUMNS[0]])
+        end_letter = self._column_letter(self._header_map[STATUS_COLUMNS[-1]])
+        requests = [
+            {
+                "range": f"{start_letter}{update.row_index}:{end_letter}{update.row_index}",
+                "values": [
+                    [
+                        update.status,
+                        str(update.generated_count),
+                        str(update.inserted_count),
+                        str(update.duplicate_count),
+                        update.first_scheduled.isoformat() if update.first_scheduled else "",
+                        update.last_scheduled.isoformat() if update.last_scheduled else "",
+                        (update.last_error or ""),
+                    ]
+                ],
+            }
+            for update in updates
+        ]
+        # Один values:batchUpdate на все строки; RAW — без серверного разбора значений
+        self._worksheet.batch_update(requests, value_input_option="RAW")
 
 
 class QueryRepository:
@@ -174,43 +262,81 @@ class QueryRepository:
     def __init__(self, session_factory=None) -> None:
         self._session_factory = session_factory or get_session_factory()
 
-    def insert_queries(self, queries: List[GeneratedQuery]) -> QueryInsertResult:
-        attempted = len(queries)
-        inserted = 0
-        duplicates = 0
-        first_scheduled: Optional[datetime] = None
-        last_scheduled: Optional[datetime] = None
-        if not attempted:
-            return QueryInsertResult(attempted, 0, 0, None, None)
-
-        with session_scope(self._session_factory) as session:
-            for query in queries:
-                stmt = text(
-                    """
-                    INSERT INTO serp_queries (query_text, query_hash, region_code, is_night_window, status, scheduled_for, metadata)
-                    VALUES (:query_text, :query_hash, :region_code, TRUE, 'pending', :scheduled_for, CAST(:metadata AS JSONB))
-                    ON CONFLICT (query_hash) DO NOTHING
-                    RETURNING id
-                    """
-                )
-                params = {
-                    "query_text": query.query_text,
-                    "query_hash": query.query_hash,
-                    "region_code": query.region_code,
-                    "scheduled_for": query.scheduled_for,
-                    "metadata": json.dumps(query.metadata, ensure_ascii=False),
-                }
-                result = session.execute(stmt, params)
-                inserted_id = result.scalar_one_or_none()
-                if inserted_id is not None:
-                    inserted += 1
-                    if first_scheduled is None or query.scheduled_for < first_scheduled:
-                        first_scheduled = query.scheduled_for
-                    if last_scheduled is None or query.scheduled_for > last_scheduled:
-                        last_scheduled = query.scheduled_for
-                else:
-                    duplicates += 1
-        return QueryInsertResult(attempted, inserted, duplicates, first_scheduled, last_scheduled)
+    def transaction(self) -> ContextManager[Session]:
+        """Открывает общую транзакцию, в которой можно выполнить несколько операций репозитория."""
+        return session_scope(self._session_factory)
+
+    def insert_queries(
+        self,
+        queries: List[GeneratedQuery],
+        *,
+        session: Optional[Session] = None,
+    ) -> QueryInsertResult:
+        """Вставляет запросы пачками по одному INSERT; дубликаты по query_hash пропускаются."""
+        return self.insert_query_groups([queries], session=session)[0]
+
+    def insert_query_groups(
+        self,
+        groups: List[List[GeneratedQuery]],
+        *,
+        session: Optional[Session] = None,
+    ) -> List[QueryInsertResult]:
+        """Вставляет запросы нескольких строк листа общими INSERT и возвращает итог по каждой строке."""
+        if not any(groups):
+            return [QueryInsertResult(0, 0, 0, None, None) for _ in groups]
+
+        if session is not None:
+            totals = self._insert_queries_with_session(session, groups)
+        else:
+            with session_scope(self._session_factory) as scoped_session:
+                totals = self._insert_queries_with_session(scoped_session, groups)
+
+        results: List[QueryInsertResult] = []
+        for group_id, group in enumerate(groups):
+            inserted, first_scheduled, last_scheduled = totals.get(group_id, (0, None, None))
+            results.append(
+                QueryInsertResult(len(group), inserted, len(group) - inserted, first_scheduled, last_scheduled)
+            )
+        return results
+
+    @staticmethod
+    def _insert_queries_with_session(
+        session: Session,
+        groups: List[List[GeneratedQuery]],
+    ) -> Dict[int, Tuple[int, datetime, datetime]]:
+        queries = [(group_id, query) for group_id, group in enumerate(groups) for query in group]
+        if len(queries) > QUERY_PRECHECK_THRESHOLD:
+            existing = set(
+                session.execute(
+                    _SELECT_EXISTING_QUERY_HASHES_STMT,
+                    {"hashes": list({query.query_hash for _, query in queries})},
+                ).scalars()
+            )
+            # Известные хэши в INSERT не отправляем; ON CONFLICT остаётся страховкой от гонок
+            queries = [(group_id, query) for group_id, query in queries if query.query_hash not in existing]
+        # Число вставленных и границы расписания по каждой строке листа считает сама БД;
+        # повторившийся хэш засчитывается первой строке, где он встретился
+        totals: Dict[int, Tuple[int, datetime, datetime]] = {}
+        for start in range(0, len(queries), QUERY_INSERT_BATCH_SIZE):
+            chunk = queries[start : start + QUERY_INSERT_BATCH_SIZE]
+            params = {
+                "query_texts": [query.query_text for _, query in chunk],
+                "query_hashes": [query.query_hash for _, query in chunk],
+                "region_codes": [query.region_code for _, query in chunk],
+                "scheduled_fors": [query.scheduled_for for _, query in chunk],
+                "metadata": [dumps_jsonb(query.metadata) for _, query in chunk],
+                "group_ids": [group_id for group_id, _ in chunk],
+            }
+            rows = session.execute(_INSERT_QUERIES_STMT, params).all()
+            for group_id, inserted, first_scheduled, last_scheduled in rows:
+                previous = totals.get(group_id)
+                if previous is not None:
+                    # Строка листа попала на границу двух пачек — складываем их итоги
+                    inserted += previous[0]
+                    first_scheduled = min(first_scheduled, previous[1])
+                    last_scheduled = max(last_scheduled, previous[2])
+                totals[group_id] = (inserted, first_scheduled, last_scheduled)
+        return totals
 
     def log_batch(
         self,
@@ -218,38 +344,37 @@ class QueryRepository:
         result: QueryInsertResult,
         status: str,
         error: Optional[str],
+        *,
+        session: Optional[Session] = None,
     ) -> None:
-        with session_scope(self._session_factory) as session:
-            stmt = text(
-                """
-                INSERT INTO search_batch_logs (
-                    niche, city, country, batch_tag,
-                    attempted_queries, inserted_queries, duplicate_queries,
-                    scheduled_start, scheduled_end,
-                    status, error
-                )
-                VALUES (
-                    :niche, :city, :country, :batch_tag,
-                    :attempted, :inserted, :duplicates,
-                    :first_scheduled, :last_scheduled,
-                    :status, :error
-                )
-                """
-            )
-            params = {
-                "niche": row.niche.strip(),
-                "city": row.city.strip() if row.city else None,
-                "country": row.country.strip() if row.country else None,
-                "batch_tag": row.batch_tag.strip() if row.batch_tag else None,
-                "attempted": result.attempted,
-                "inserted": result.inserted,
-                "duplicates": result.duplicates,
-                "first_scheduled": result.first_scheduled,
-                "last_scheduled": result.last_scheduled,
-                "status": status,
-                "error": (error[:500] if error else None),
-            }
-            session.execute(stmt, params)
+        self.log_batches([BatchLogEntry(row, result, status, error)], session=session)
+
+    def log_batches(self, entries: List[BatchLogEntry], *, session: Optional[Session] = None) -> None:
+        """Записывает журнал нескольких партий одним INSERT."""
+        if not entries:
+            return
+        if session is not None:
+            self._log_batches_with_session(session, entries)
+            return
+        with session_scope(self._session_factory) as scoped_session:
+            self._log_batches_with_session(scoped_session, entries)
+
+    @staticmethod
+    def _log_batches_with_session(session: Session, entries: List[BatchLogEntry]) -> None:
+        params = {
+            "niches": [entry.row.niche.strip() for entry in entries],
+            "cities": [entry.row.city.strip() if entry.row.city else None for entry in entries],
+            "countries": [entry.row.country.strip() if entry.row.country else None for entry in entries],
+            "batch_tags": [entry.row.batch_tag.strip() if entry.row.batch_tag else None for entry in entries],
+            "attempted": [entry.result.attempted for entry in entries],
+            "inserted": [entry.result.inserted for entry in entries],
+            "duplicates": [entry.result.duplicates for entry in entries],
+            "first_scheduled": [entry.result.first_scheduled for entry in entries],
+            "last_scheduled": [entry.result.last_scheduled for entry in entries],
+            "statuses": [entry.status for entry in entries],
+            "errors": [entry.error[:500] if entry.error else None for entry in entries],
+        }
+        session.execute(_INSERT_BATCH_LOGS_STMT, params)
 
 
 class SheetSyncService:
@@ -266,71 +391,119 @@ class SheetSyncService:
         self.generator = generator
 
     def sync(self, *, batch_tag: Optional[str] = None) -> SyncSummary:
-        rows = self.sheet_adapter.fetch_rows()
-        updates: List[SheetStatusUpdate] = []
-        summary = SyncSummary(total_rows=len(rows))
-
-        for row_data in rows:
-            niche = row_data.get("niche")
-            if not niche:
-                continue
-            if batch_tag and row_data.get("batch_tag") != batch_tag:
-                continue
-
-            current_status = row_data.get("status").lower()
-            if current_status == "done":
-                continue
-
-            summary.processed_rows += 1
-            row = NicheRow(
-                row_index=row_data.row_index,
-                niche=niche,
-                city=row_data.get("city") or None,
-                country=row_data.get("country") or None,
-                batch_tag=row_data.get("batch_tag") or None,
-            )
+        summary = SyncSummary()
+        rows = iter(self.sheet_adapter.fetch_rows())
+        while True:
+            chunk = list(islice(rows, SYNC_CHUNK_SIZE))
+            if not chunk:
+                break
+            summary.total_rows += len(chunk)
+            self._sync_chunk(chunk, batch_tag, summary)
+        return summary
+
+    def _sync_chunk(self, rows: List[SheetRowData], batch_tag: Optional[str], summary: SyncSummary) -> None:
+        pending = [row for row in (self._to_niche_row(row_data, batch_tag) for row_data in rows) if row]
+        if not pending:
+            return
+        summary.processed_rows += len(pending)
 
-            queries: List[GeneratedQuery] = []
-            error_message: Optional[str] = None
-            status_value = "done"
+        # Генерация — чистые вычисления; ошибка строки фиксируется до обращения к БД
+        generated: Dict[int, List[GeneratedQuery]] = {}
+        errors: Dict[int, str] = {}
+        for row in pending:
             try:
-                queries = self.generator.generate(row)
-                result = self.repository.insert_queries(queries)
-                summary.inserted_queries += result.inserted
-                summary.duplicate_queries += result.duplicates
-                if result.attempted == 0:
-                    status_value = "skipped"
-                self.repository.log_batch(row, result, status_value, None)
+                generated[row.row_index] = self.generator.generate(row)
             except Exception as exc:  # noqa: BLE001
-                error_message = str(exc)
-                summary.errors += 1
-                status_value = "error"
-                result = QueryInsertResult(
-                    attempted=len(queries),
-                    inserted=0,
-                    duplicates=len(queries),
-                    first_scheduled=None,
-                    last_scheduled=None,
+                errors[row.row_index] = str(exc)
+                LOGGER.exception("Ошибка обработки строки %s: %s", row.row_index, exc)
+
+        updates: List[SheetStatusUpdate] = []
+        logs: List[BatchLogEntry] = []
+        # Транзакция на порцию строк: запросы всех строк уходят общими INSERT, журнал партий —
+        # одним INSERT в конце порции
+        with self.repository.transaction() as session:
+            results = self._insert_generated(session, generated, errors)
+            for row in pending:
+                queries = generated.get(row.row_index, [])
+                error_message = errors.get(row.row_index)
+                if error_message is None:
+                    result = results[row.row_index]
+                    status_value = "skipped" if result.attempted == 0 else "done"
+                    summary.inserted_queries += result.inserted
+                    summary.duplicate_queries += result.duplicates
+                else:
+                    status_value = "error"
+                    summary.errors += 1
+                    result = QueryInsertResult(
+                        attempted=len(queries),
+                        inserted=0,
+                        duplicates=len(queries),
+                        first_scheduled=None,
+                        last_scheduled=None,
+                    )
+                logs.append(BatchLogEntry(row, result, status_value, error_message))
+                updates.append(
+                    SheetStatusUpdate(
+                        row_index=row.row_index,
+                        status=status_value,
+                        generated_count=len(queries),
+                        inserted_count=result.inserted,
+                        duplicate_count=result.duplicates,
+                        first_scheduled=result.first_scheduled,
+                        last_scheduled=result.last_scheduled,
+                        last_error=error_message,
+                    )
                 )
-                LOGGER.exception("Ошибка обработки строки %s: %s", row.row_index, error_message)
-                self.repository.log_batch(row, result, status_value, error_message)
-
-            updates.append(
-                SheetStatusUpdate(
-                    row_index=row.row_index,
-                    status=status_value,
-                    generated_count=len(queries),
-                    inserted_count=result.inserted,
-                    duplicate_count=result.duplicates,
-                    first_scheduled=result.first_scheduled,
-                    last_scheduled=result.last_scheduled,
-                    last_error=error_message,
+            self.repository.log_batches(logs, session=session)
+
+        # Лист обновляем после коммита порции: при падении обработанные строки уже помечены
+        # и при следующем запуске пропускаются
+        self.sheet_adapter.update_rows(updates)
+
+    def _insert_generated(
+        self,
+        session: Session,
+        generated: Dict[int, List[GeneratedQuery]],
+        errors: Dict[int, str],
+    ) -> Dict[int, QueryInsertResult]:
+        row_indexes = list(generated)
+        try:
+            with session.begin_nested():
+                results = self.repository.insert_query_groups(
+                    [generated[row_index] for row_index in row_indexes],
+                    session=session,
                 )
-            )
+            return dict(zip(row_indexes, results))
+        except Exception:  # noqa: BLE001
+            LOGGER.warning("Общая вставка запросов порции не удалась, повторяем по строкам.", exc_info=True)
 
-        if updates:
-            self.sheet_adapter.update_rows(updates)
-        return summary
+        # Под отдельным SAVEPOINT на строку ошибка откатывает только вставки этой строки
+        results = {}
+        for row_index in row_indexes:
+            try:
+                with session.begin_nested():
+                    results[row_index] = self.repository.insert_queries(generated[row_index], session=session)
+            except Exception as exc:  # noqa: BLE001
+                errors[row_index] = str(exc)
+                LOGGER.exception("Ошибка обработки строки %s: %s", row_index, exc)
+        return results
+
+    @staticmethod
+    def _to_niche_row(row_data: SheetRowData, batch_tag: Optional[str]) -> Optional[NicheRow]:
+        niche = row_data.get("niche")
+        if not niche:
+            return None
+        if batch_tag and row_data.get("batch_tag") != batch_tag:
+            return None
+        if row_data.get("status").lower() == "done":
+            return None
+        return NicheRow(
+            row_index=row_data.row_index,
+            niche=niche,
+            city=row_data.get("city") or None,
+            country=row_data.get("country") or None,
+            batch_tag=row_data.get("batch_tag") or None,
+        )
 
 
 def build_service(settings) -> SheetSyncService:
@@ -0,0 +1,270 @@
+"""Пул переиспользуемых SMTP-соединений."""
+
+from __future__ import annotations
+
+import logging
+import re
+import smtplib
+import ssl
+import threading
+from email.message import EmailMessage
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.config import SMTPChannelSettings
+
+LOGGER = logging.getLogger("app.smtp_pool")
+
+PoolKey = Tuple[str, int, str]
+
+_CRLF = "\r\n"
+_EOL_RE = re.compile(r"\r\n|\n|\r")
+_LEADING_PERIOD_RE = re.compile(rb"(?m)^\.")
+
+
+class _PipeliningMixin:
+    """Отправляет MAIL, RCPT и DATA одним пакетом, если сервер объявил PIPELINING (RFC 2920)."""
+
+    # Тело письма ушло на сервер: после обрыва нельзя понять, принято ли оно, и повторять нельзя
+    payload_sent = False
+
+    def sendmail(
+        self,
+        from_addr: str,
+        to_addrs: Union[str, Sequence[str]],
+        msg: Union[str, bytes],
+        mail_options: Sequence[str] = (),
+        rcpt_options: Sequence[str] = (),
+    ) -> Dict[str, Tuple[int, bytes]]:
+        self.payload_sent = False
+        self.ehlo_or_helo_if_needed()
+        if not self.has_extn("pipelining"):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+
+        if isinstance(msg, str):
+            msg = _EOL_RE.sub(_CRLF, msg).encode("ascii")
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        esmtp_opts = list(mail_options)
+        if self.has_extn("size"):
+            esmtp_opts.insert(0, "size=%d" % len(msg))
+        if any(option.lower() == "smtputf8" for option in esmtp_opts):
+            if not self.has_extn("smtputf8"):
+                raise smtplib.SMTPNotSupportedError("SMTPUTF8 not supported by server")
+            self.command_encoding = "utf-8"
+
+        mail_suffix = "".join(" " + option for option in esmtp_opts)
+        rcpt_suffix = "".join(" " + option for option in rcpt_options)
+        commands = [f"MAIL FROM:{smtplib.quoteaddr(from_addr)}{mail_suffix}"]
+        commands.extend(f"RCPT TO:{smtplib.quoteaddr(addr)}{rcpt_suffix}" for addr in to_addrs)
+        commands.append("DATA")
+        if any("\r" in command or "\n" in command for command in commands):
+            raise ValueError("prohibited newline characters in SMTP command")
+        # Все команды уходят одной записью, ответы читаем следом — один RTT вместо трёх и более
+        self.send("".join(command + _CRLF for command in commands))
+
+        replies: List[Tuple[int, bytes]] = []
+        for _ in commands:
+            code, resp = self.getreply()
+            replies.append((code, resp))
+            if code == 421:
+                self.close()
+                break
+
+        mail_code, mail_resp = replies[0]
+        rcpt_replies = replies[1 : 1 + len(to_addrs)]
+        refused = {
+            addr: (code, resp)
+            for addr, (code, resp) in zip(to_addrs, rcpt_replies)
+            if code not in (250, 251)
+        }
+        data_code, data_resp = replies[-1] if len(replies) == len(commands) else (421, b"")
+
+        if data_code == 354 and (mail_code != 250 or len(refused) == len(to_addrs)):
+            # Сервер открыл DATA без отправителя или получателей — закрываем пустое тело
+            self.send("." + _CRLF)
+            self.getreply()
+        if mail_code != 250:
+            self._abort_transaction(mail_code)
+            raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+        if len(refused) == len(to_addrs) or len(rcpt_replies) < len(to_addrs):
+            self._abort_transaction(data_code)
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_code != 354:
+            self._abort_transaction(data_code)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+
+        payload = _LEADING_PERIOD_RE.sub(b"..", msg)
+        if not payload.endswith(b"\r\n"):
+            payload += b"\r\n"
+        self.payload_sent = True
+        self.send(payload + b".\r\n")
+        code, resp = self.getreply()
+        if code != 250:
+            self._abort_transaction(code)
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+    def data(self, msg: Union[str, bytes]) -> Tuple[int, bytes]:
+        # Без PIPELINING тело уходит внутри data() стандартной библиотеки; с этого момента
+        # письмо считается возможно доставленным
+        self.payload_sent = True
+        return super().data(msg)
+
+    def _abort_transaction(self, code: int) -> None:
+        if code == 421:
+            self.close()
+        else:
+            self._rset()
+
+
+class PipelinedSMTP(_PipeliningMixin, smtplib.SMTP):
+    """SMTP-клиент с поддержкой PIPELINING."""
+
+
+class PipelinedSMTP_SSL(_PipeliningMixin, smtplib.SMTP_SSL):
+    """SMTP-клиент поверх SSL с поддержкой PIPELINING."""
+
+
+class SMTPConnectionPool:
+    """Хранит открытые SMTP-сессии по (host, port, username) и отдаёт их повторно."""
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 30.0,
+        use_starttls: bool = True,
+        smtp_factory: Optional[Callable[[SMTPChannelSettings], smtplib.SMTP]] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.use_starttls = use_starttls
+        self._smtp_factory = smtp_factory or self._open
+        # Для каждого ключа — стек простаивающих сессий: (соединение, отправлено писем, время возврата)
+        self._idle: Dict[PoolKey, List[Tuple[smtplib.SMTP, int, float]]] = {}
+        # Ограничение одновременных сессий к одному серверу (max_concurrent_conns канала)
+        self._slots: Dict[PoolKey, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        # Контекст TLS с загруженными корневыми сертификатами создаётся один раз и общий для всех сессий
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    @staticmethod
+    def _key(channel: SMTPChannelSettings) -> PoolKey:
+        return (channel.host, channel.port, channel.username or "")
+
+    def acquire(self, channel: SMTPChannelSettings) -> Tuple[smtplib.SMTP, int, bool]:
+        """Возвращает (соединение, число отправленных писем, признак переиспользования)."""
+        key = self._key(channel)
+        now = monotonic()
+        stale: List[smtplib.SMTP] = []
+        found: Optional[Tuple[smtplib.SMTP, int]] = None
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                smtp, sent_count, released_at = idle.pop()
+                # Сессию, простоявшую дольше таймаута сервера, не переиспользуем — он её уже закрыл
+                if now - released_at > channel.max_idle_seconds:
+                    stale.append(smtp)
+                    continue
+                found = (smtp, sent_count)
+                break
+        for smtp in stale:
+            self._close(smtp)
+        if found is not None:
+            return found[0], found[1], True
+        return self._smtp_factory(channel), 0, False
+
+    def release(
+        self,
+        channel: SMTPChannelSettings,
+        smtp: smtplib.SMTP,
+        sent_count: int,
+        *,
+        broken: bool = False,
+    ) -> None:
+        """Возвращает соединение в пул либо закрывает его после ошибки или лимита писем."""
+        if broken or sent_count >= channel.max_msgs_per_conn:
+            self._close(smtp)
+            return
+        with self._lock:
+            self._idle.setdefault(self._key(channel), []).append((smtp, sent_count, monotonic()))
+
+    def send(self, channel: SMTPChannelSettings, message: EmailMessage) -> None:
+        """Отправляет письмо через пул; обрыв переиспользованной сессии повторяется на свежей."""
+        with self._slot(channel):
+            self._send(channel, message)
+
+    def _slot(self, channel: SMTPChannelSettings) -> threading.BoundedSemaphore:
+        key = self._key(channel)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = threading.BoundedSemaphore(channel.max_concurrent_conns)
+                self._slots[key] = slot
+        return slot
+
+    def _send(self, channel: SMTPChannelSettings, message: EmailMessage) -> None:
+        smtp, sent_count, reused = self.acquire(channel)
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.release(channel, smtp, sent_count, broken=True)
+            # Повтор безопасен, только если сервер закрыл сессию до передачи тела письма
+            if not reused or getattr(smtp, "payload_sent", False):
+                raise
+            LOGGER.debug("SMTP-сессия %s:%s закрыта сервером, переподключаемся.", channel.host, channel.port)
+            smtp, sent_count = self._smtp_factory(channel), 0
+            try:
+                smtp.send_message(message)
+            except BaseException:
+                self.release(channel, smtp, sent_count, broken=True)
+                raise
+        except BaseException:
+            # После отказа сервера состояние сессии не гарантировано — соединение не возвращаем
+            self.release(channel, smtp, sent_count, broken=True)
+            raise
+        self.release(channel, smtp, sent_count + 1)
+
+    def close_all(self) -> None:
+        """Закрывает все простаивающие соединения."""
+        with self._lock:
+            connections = [smtp for idle in self._idle.values() for smtp, _, _ in idle]
+            self._idle.clear()
+        for smtp in connections:
+            self._close(smtp)
+
+    def ssl_context(self) -> ssl.SSLContext:
+        """Возвращает общий контекст TLS, создавая его при первом обращении."""
+        context = self._ssl_context
+        if context is None:
+            with self._lock:
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                context = self._ssl_context
+        return context
+
+    def _open(self, channel: SMTPChannelSettings) -> smtplib.SMTP:
+        if channel.use_ssl:
+            smtp: smtplib.SMTP = PipelinedSMTP_SSL(
+                channel.host,
+                channel.port,
+                timeout=self.timeout,
+                context=self.ssl_context(),
+            )
+        else:
+            smtp = PipelinedSMTP(channel.host, channel.port, timeout=self.timeout)
+        try:
+            if not channel.use_ssl and channel.use_tls and self.use_starttls:
+                smtp.starttls()
+            if channel.username and channel.password:
+                smtp.login(channel.username, channel.password)
+        except BaseException:
+            self._close(smtp)
+            raise
+        return smtp
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
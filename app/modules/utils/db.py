@@ -2,20 +2,39 @@
 
 from __future__ import annotations
 
+import json
 import logging
+import time
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterator
+from typing import Callable, Iterator, Optional, Sequence
 
+import psycopg
+from psycopg import sql
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
 from app.config import DatabaseSettings, get_settings
 
 LOGGER = logging.getLogger("app.db")
 DEFAULT_MIGRATIONS_PATH = Path(__file__).resolve().parents[3] / "migrations"
 MIGRATIONS_ADVISORY_LOCK_ID = 485902143271
+# Каналы NOTIFY из миграции 0007: новые поисковые запросы и новые компании
+QUERIES_NOTIFY_CHANNEL = "leadgen_queries"
+COMPANIES_NOTIFY_CHANNEL = "leadgen_companies"
+
+
+def dumps_jsonb(value: object) -> str:
+    """Сериализует значение для параметра CAST(... AS JSONB); orjson быстрее stdlib, если установлен."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z).decode()
+    return json.dumps(value)
 
 
 def build_sync_dsn(db_settings: DatabaseSettings) -> str:
@@ -28,7 +47,17 @@ def create_engine_from_settings(db_settings: DatabaseSettings | None = None) ->
     settings = db_settings or get_settings().database
     dsn = build_sync_dsn(settings)
     LOGGER.debug("Создание движка SQLAlchemy для %s", dsn)
-    return create_engine(dsn, future=True, pool_pre_ping=True)
+    return create_engine(
+        dsn,
+        future=True,
+        pool_pre_ping=True,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        json_serializer=dumps_jsonb,
+        json_deserializer=orjson.loads if orjson is not None else json.loads,
+    )
 
 
 def get_session_factory(engine: Engine | None = None) -> sessionmaker[Session]:
@@ -129,3 +158,69 @@ def bootstrap_database(engine: Engine | None = None) -> list[str]:
                 text("SELECT pg_advisory_unlock(:lock_id)"),
                 {"lock_id": MIGRATIONS_ADVISORY_LOCK_ID},
             )
+
+
+class NotificationListener:
+    """Ожидает NOTIFY по каналам Postgres с таймаутом вместо фиксированного sleep.
+
+    Держит отдельное autocommit-соединение; при ошибке соединения ждёт таймаут обычным sleep
+    и переподключается при следующем ожидании.
+    """
+
+    def __init__(
+        self,
+        channels: Sequence[str],
+        *,
+        db_settings: DatabaseSettings | None = None,
+        connect_func: Optional[Callable[[], psycopg.Connection]] = None,
+        sleep_func: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._channels = tuple(channels)
+        self._db_settings = db_settings
+        self._connect_func = connect_func or self._connect
+        self._sleep = sleep_func
+        self._connection: Optional[psycopg.Connection] = None
+
+    def _connect(self) -> psycopg.Connection:
+        settings = self._db_settings or get_settings().database
+        return psycopg.connect(
+            host=settings.host,
+            port=settings.port,
+            user=settings.user,
+            password=settings.password,
+            dbname=settings.name,
+            autocommit=True,
+        )
+
+    def _ensure_connection(self) -> psycopg.Connection:
+        if self._connection is None or self._connection.closed:
+            connection = self._connect_func()
+            for channel in self._channels:
+                connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            self._connection = connection
+        return self._connection
+
+    def wait(self, timeout: float) -> bool:
+        """Ждёт уведомление не дольше timeout секунд; возвращает True, если оно пришло."""
+        try:
+            connection = self._ensure_connection()
+            received = any(True for _ in connection.notifies(timeout=timeout, stop_after=1))
+            if received:
+                # Пачка вставок присылает несколько уведомлений — одного пробуждения достаточно
+                for _ in connection.notifies(timeout=0):
+                    pass
+            return received
+        except psycopg.Error as exc:
+            LOGGER.warning("LISTEN недоступен, ждём по таймеру: %s", exc)
+            self.close()
+            self._sleep(timeout)
+            return False
+
+    def close(self) -> None:
+        """Закрывает соединение прослушивания."""
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except psycopg.Error:  # pragma: no cover
+                pass
@@ -6,13 +6,17 @@ import re
 from email.utils import parseaddr
 from urllib.parse import unquote
 
+# Шаблон применяется к уже приведённому к нижнему регистру адресу, поэтому IGNORECASE не нужен
 EMAIL_REGEX = re.compile(
-    r"^[A-Z0-9.!#$%&'*+/=?^_`{|}~-]+@"
-    r"[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?"
-    r"(?:\.[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?)+$",
-    re.IGNORECASE,
+    r"^[a-z0-9.!#$%&'*+/=?^_`{|}~-]+@"
+    r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?"
+    r"(?:\.[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?)+$"
 )
 STRIP_CHARS = "<>[]()\"' \t\r\n"
+# Пробелы и zero-width space удаляются из адреса целиком за один проход translate
+_DELETE_TABLE = str.maketrans("", "", " ​")
+# Без этих символов parseaddr возвращает строку без изменений — разбор можно пропустить
+_ADDRESS_SYNTAX_CHARS = frozenset("<>\"(),;:[]\\ \t\r\n")
 
 
 def clean_email(value: str) -> str:
@@ -21,24 +25,24 @@ def clean_email(value: str) -> str:
     if not raw:
         return ""
 
-    lowered = raw.lower()
-    if lowered.startswith("mailto:"):
-        raw = raw.split(":", 1)[1]
+    if raw[:7].lower() == "mailto:":
+        raw = raw[7:]
     if "?" in raw:
         raw = raw.split("?", 1)[0]
-    raw = unquote(raw)
+    if "%" in raw:
+        raw = unquote(raw)
 
-    _, parsed = parseaddr(raw)
-    candidate = parsed or raw
-    candidate = candidate.strip(STRIP_CHARS)
-    candidate = candidate.replace(" ", "")
-    candidate = candidate.replace("\u200b", "")
-    return candidate.lower()
+    candidate = raw
+    if not _ADDRESS_SYNTAX_CHARS.isdisjoint(raw):
+        candidate = parseaddr(raw)[1] or raw
+    return candidate.strip(STRIP_CHARS).translate(_DELETE_TABLE).lower()
+
+
+def is_normalized_email(candidate: str) -> bool:
+    """Проверяет адрес, уже прошедший clean_email, без повторной нормализации."""
+    return "@" in candidate and EMAIL_REGEX.match(candidate) is not None
 
 
 def is_valid_email(value: str) -> bool:
     """Проверяет строку на соответствие базовым правилам RFC 5321."""
-    candidate = clean_email(value)
-    if not candidate or "@" not in candidate:
-        return False
-    return bool(EMAIL_REGEX.match(candidate))
+    return is_normalized_email(clean_email(value))
@@ -9,7 +9,7 @@ from base64 import urlsafe_b64encode
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Protocol, Tuple
 
 import httpx
 from Crypto.Hash import SHA256
@@ -20,6 +20,13 @@ LOGGER = logging.getLogger("app.iam")
 TOKEN_ENDPOINT = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
 
 
+class Signer(Protocol):
+    """Общий интерфейс подписантов PSS и DSS из PyCryptodome."""
+
+    def sign(self, msg_hash: SHA256.SHA256Hash) -> bytes:
+        ...
+
+
 @dataclass
 class ServiceAccountKey:
     """Данные ключа сервисного аккаунта."""
@@ -45,6 +52,8 @@ class IamTokenProvider:
         self._refresh_margin = refresh_margin
         self._cached_token: Optional[str] = None
         self._expires_at: float = 0.0
+        # PEM разбирается один раз: при обновлении токена остаётся только хэш и подпись
+        self._algorithm, self._signer = self._build_signer(key)
 
     def get_token(self) -> str:
         """Возвращает актуальный IAM токен, обновляя его при необходимости."""
@@ -74,9 +83,18 @@ class IamTokenProvider:
     def _base64url(data: bytes) -> str:
         return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
 
+    @classmethod
+    def _build_signer(cls, key: ServiceAccountKey) -> Tuple[str, Signer]:
+        algorithm = "PS256" if "RSA" in key.key_algorithm.upper() else "ES256"
+        key_pem = cls._prepare_private_key(key.private_key)
+        if algorithm == "PS256":
+            return algorithm, pss.new(RSA.import_key(key_pem))
+        if algorithm == "ES256":
+            return algorithm, DSS.new(ECC.import_key(key_pem), "fips-186-3", encoding="binary")
+        raise RuntimeError(f"Неизвестный алгоритм ключа: {key.key_algorithm}")
+
     def _build_jwt(self, now: float) -> str:
-        algorithm = "PS256" if "RSA" in self._key.key_algorithm.upper() else "ES256"
-        header = {"alg": algorithm, "typ": "JWT", "kid": self._key.key_id}
+        header = {"alg": self._algorithm, "typ": "JWT", "kid": self._key.key_id}
         payload = {
             "aud": TOKEN_ENDPOINT,
             "iss": self._key.service_account_id,
@@ -87,19 +105,7 @@ class IamTokenProvider:
         payload_segment = self._base64url(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
         signing_input = f"{header_segment}.{payload_segment}".encode("ascii")
 
-        key_pem = self._prepare_private_key(self._key.private_key)
-        if algorithm == "PS256":
-            private_key = RSA.import_key(key_pem)
-            signer = pss.new(private_key)
-            signature = signer.sign(SHA256.new(signing_input))
-        elif algorithm == "ES256":
-            private_key = ECC.import_key(key_pem)
-            signer = DSS.new(private_key, "fips-186-3", encoding="binary")
-            signature = signer.sign(SHA256.new(signing_input))
-        else:
-            raise RuntimeError(f"Неизвестный алгоритм ключа: {self._key.key_algorithm}")
-
-        signature_segment = self._base64url(signature)
+        signature_segment = self._base64url(self._signer.sign(SHA256.new(signing_input)))
         return f"{header_segment}.{payload_segment}.{signature_segment}"
 
     @staticmethod
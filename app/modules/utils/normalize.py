@@ -4,18 +4,36 @@ from __future__ import annotations
 
 import hashlib
 import re
+from functools import lru_cache
 from urllib.parse import urlparse, urlunparse
 
 
 _SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://")
+_MULTISLASH_RE = re.compile(r"/{2,}")
+# Хост URL без порта, userinfo и экзотики — для него netloc берётся срезом строки, без urlparse
+_PLAIN_AUTHORITY_RE = re.compile(r"^(?:[a-zA-Z][a-zA-Z0-9+.-]*://)?([^/?#@:\[\]\\\s]+)(?:[/?#]|$)")
+# Голый хост (со схемой http/https или без, без порта, пути и query) — самый частый вход из выдачи
+_SIMPLE_HOST_RE = re.compile(r"^(?:(https?)://)?([a-z0-9][a-z0-9.-]*[a-z0-9])/?$", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+# Выдача многократно повторяет одни и те же хосты, поэтому результаты нормализации кэшируются
+_NORMALIZE_CACHE_SIZE = 65536
 
 
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def normalize_url(raw: str) -> str:
     """Приводит URL к каноническому виду (https, без фрагментов)."""
     value = (raw or "").strip()
     if not value:
         return ""
 
+    simple = _SIMPLE_HOST_RE.match(value)
+    if simple:
+        scheme, host = simple.groups()
+        host = host.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        return f"{(scheme or 'https').lower()}://{host}/"
+
     if not _SCHEME_RE.match(value):
         value = f"https://{value}"
 
@@ -36,7 +54,7 @@ def normalize_url(raw: str) -> str:
     else:
         host = host.split(":", 1)[0]
 
-    clean_path = re.sub(r"/{2,}", "/", path)
+    clean_path = _MULTISLASH_RE.sub("/", path)
     if not clean_path:
         clean_path = "/"
 
@@ -53,6 +71,7 @@ def normalize_url(raw: str) -> str:
     return normalized
 
 
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def normalize_domain(value: str) -> str:
     """Выделяет и нормализует домен (punycode, нижний регистр)."""
     candidate = (value or "").strip()
@@ -60,9 +79,14 @@ def normalize_domain(value: str) -> str:
         return ""
 
     if "/" in candidate or _SCHEME_RE.match(candidate):
-        candidate = normalize_url(candidate)
-        parsed = urlparse(candidate)
-        domain = parsed.netloc
+        authority = _PLAIN_AUTHORITY_RE.match(candidate)
+        if authority:
+            # То же, что netloc после normalize_url: нижний регистр и без первого www.
+            domain = authority.group(1).lower()
+            if domain.startswith("www."):
+                domain = domain[4:]
+        else:
+            domain = urlparse(normalize_url(candidate)).netloc
     else:
         domain = candidate
 
@@ -70,25 +94,28 @@ def normalize_domain(value: str) -> str:
     if domain.startswith("www."):
         domain = domain[4:]
 
-    try:
-        domain = domain.encode("idna").decode("ascii")
-    except UnicodeError:
-        pass
+    # ASCII-домен кодек IDNA вернул бы без изменений, поэтому кодируем только национальные имена
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
 
     return domain
 
 
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def build_company_dedupe_key(name: str, domain: str) -> str:
     """Строит детерминированный ключ дедупликации компании."""
     canonical_domain = normalize_domain(domain)
     payload = canonical_domain or (name or "").strip().lower()
-    digest = hashlib.sha1(payload.encode("utf-8"), usedforsecurity=False)
-    return digest.hexdigest()
+    # Отпечаток для дедупликации, не для безопасности: BLAKE2b-128 быстрее SHA-1 и даёт ключ на 8 символов короче
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
 
 
 def clean_snippet(text: str | None) -> str:
     """Очищает сниппет от лишних пробелов и переносов."""
     if not text:
         return ""
-    compact = re.sub(r"\s+", " ", text)
+    compact = _WHITESPACE_RE.sub(" ", text)
     return compact.strip()
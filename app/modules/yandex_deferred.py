@@ -5,20 +5,79 @@ from __future__ import annotations
 import base64
 import logging
 import binascii
+import json
+import random
+import re
+import socket
+import threading
 import time
 from collections import deque
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Callable, Deque, Dict, Iterable, Optional
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import httpx
 from zoneinfo import ZoneInfo
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import pybase64
+except ImportError:  # pragma: no cover
+    pybase64 = None  # type: ignore[assignment]
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    HTTP2_AVAILABLE = False
+
 
 LOGGER = logging.getLogger("app.yandex_deferred")
 
 SEARCH_ASYNC_URL = "https://searchapi.api.cloud.yandex.net/v2/web/searchAsync"
 OPERATIONS_URL = "https://operation.api.cloud.yandex.net/operations"
+# Пул keep-alive соединений общий для создания запросов и опроса операций
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=30.0)
+# Опросы статуса — мелкие частые запросы: без Nagle они не ждут задержанного ACK
+HTTP_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+# Создание и опрос операций почти целиком ждут сеть, поэтому пачки отправляем в несколько потоков;
+# по умолчанию потоков столько, сколько запросов в секунду разрешает API
+CREATE_MAX_WORKERS = 10
+POLL_MAX_WORKERS = 10
+# Первая пауза ожидания операции; дальше она удваивается до интервала опроса
+POLL_BACKOFF_INITIAL_SECONDS = 2.0
+POLL_JITTER = 0.2
+# rawData декодируется кусками такой длины (кратной 4), чтобы XML разбирался по мере декодирования
+RAW_DATA_CHUNK_SIZE = 64 * 1024
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+_BASE64_WHITESPACE_DELETE = str.maketrans("", "", " \t\r\n")
+
+
+def _json_dumps(value: Any) -> bytes:
+    """Кодирует тело запроса в JSON; orjson быстрее stdlib, если установлен."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(content: bytes) -> Any:
+    """Разбирает JSON ответа; на выдаче с rawData в несколько мегабайт orjson заметно быстрее stdlib."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _b64decode(value: str) -> bytes:
+    """Декодирует Base64; pybase64 (SIMD) заметно быстрее stdlib на больших выдачах, если установлен."""
+    if pybase64 is not None:
+        return pybase64.b64decode(value)
+    return base64.b64decode(value)
 
 
 class YandexAPIError(RuntimeError):
@@ -43,7 +102,12 @@ class RateLimitRule:
 
     limit: int
     window: timedelta
-    events: Deque[datetime]
+    # Отметки time.monotonic() последних запросов; больше limit событий в окне не бывает
+    events: Deque[float]
+    window_seconds: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.window_seconds = self.window.total_seconds()
 
 
 @dataclass
@@ -57,9 +121,9 @@ class RateLimitConfig:
     def build_rules(self) -> Iterable[RateLimitRule]:
         """Создаёт правила с отдельными очередями событий."""
         return (
-            RateLimitRule(self.per_second, timedelta(seconds=1), deque()),
-            RateLimitRule(self.per_minute, timedelta(minutes=1), deque()),
-            RateLimitRule(self.per_hour, timedelta(hours=1), deque()),
+            RateLimitRule(self.per_second, timedelta(seconds=1), deque(maxlen=self.per_second)),
+            RateLimitRule(self.per_minute, timedelta(minutes=1), deque(maxlen=self.per_minute)),
+            RateLimitRule(self.per_hour, timedelta(hours=1), deque(maxlen=self.per_hour)),
         )
 
 
@@ -145,10 +209,31 @@ class OperationResponse:
         if not raw_base64:
             raise InvalidResponseError("Поле response.rawData отсутствует в ответе.")
         try:
-            return base64.b64decode(raw_base64)
+            return _b64decode(raw_base64)
         except (ValueError, binascii.Error) as exc:  # type: ignore[name-defined]
             raise InvalidResponseError("Не удалось декодировать rawData.") from exc
 
+    def iter_raw_data(self, chunk_size: int = RAW_DATA_CHUNK_SIZE) -> Iterator[bytes]:
+        """Декодирует Base64 по частям, не собирая сырые данные выдачи целиком в памяти."""
+        raw_base64 = self.raw_data_base64()
+        if not raw_base64:
+            raise InvalidResponseError("Поле response.rawData отсутствует в ответе.")
+        if not _BASE64_RE.fullmatch(raw_base64):
+            # Переносы строк из транспорта сдвигают границы кусков — убираем их одним проходом translate
+            raw_base64 = raw_base64.translate(_BASE64_WHITESPACE_DELETE)
+        if len(raw_base64) % 4 or not _BASE64_RE.fullmatch(raw_base64):
+            # Прочие символы вне алфавита отбрасывает только нестрогое декодирование — декодируем целиком
+            return iter((self.decode_raw_data(),))
+        return self._decode_chunks(raw_base64, max(4, chunk_size - chunk_size % 4))
+
+    @staticmethod
+    def _decode_chunks(raw_base64: str, step: int) -> Iterator[bytes]:
+        for start in range(0, len(raw_base64), step):
+            try:
+                yield _b64decode(raw_base64[start : start + step])
+            except (ValueError, binascii.Error) as exc:
+                raise InvalidResponseError("Не удалось декодировать rawData.") from exc
+
 
 class YandexDeferredClient:
     """Высокоуровневый клиент для создания и отслеживания deferred-запросов."""
@@ -168,6 +253,7 @@ class YandexDeferredClient:
         timeout: float = 10.0,
         sleep_func: Callable[[float], None] | None = None,
         now_func: Callable[[], datetime] | None = None,
+        http_client: Optional[httpx.Client] = None,
     ) -> None:
         self._iam_token = iam_token
         self._token_resolver = token_provider
@@ -179,6 +265,16 @@ class YandexDeferredClient:
         self.timeout = timeout
         self._sleep = sleep_func or time.sleep
         self._now_func = now_func
+        # Лимиты считаются по монотонным секундам: без datetime с часовым поясом на каждый запрос.
+        # Подменённые в тестах часы используются и для лимитов, чтобы ожидания оставались согласованными
+        self._monotonic: Callable[[], float] = (lambda: now_func().timestamp()) if now_func else time.monotonic
+        # Один клиент на всё время жизни: каждый опрос не платит за новое TCP+TLS рукопожатие
+        self._http = http_client or self._build_http_client(timeout)
+        # Переданный снаружи клиент закрывает его владелец
+        self._owns_http = http_client is None
+        self._cached_headers: Tuple[Optional[str], Dict[str, str]] = (None, {})
+        # Очереди событий лимитов общие для потоков, опрашивающих операции параллельно
+        self._limits_lock = threading.Lock()
 
         self._create_limits = tuple(
             (create_limits or RateLimitConfig(10, 600, 35000)).build_rules()
@@ -187,15 +283,42 @@ class YandexDeferredClient:
             (status_limits or RateLimitConfig(10, 600, 35000)).build_rules()
         )
 
+    @staticmethod
+    def _build_http_client(timeout: float) -> httpx.Client:
+        # HTTP/2 (пакет h2 из httpx[http2]) мультиплексирует параллельные опросы в одном соединении
+        transport = httpx.HTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=HTTP_LIMITS,
+            socket_options=HTTP_SOCKET_OPTIONS,
+        )
+        return httpx.Client(timeout=timeout, transport=transport)
+
+    def close(self) -> None:
+        """Закрывает собственный HTTP-клиент и его keep-alive соединения."""
+        if self._owns_http:
+            self._http.close()
+
+    def __enter__(self) -> "YandexDeferredClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
     def _now(self) -> datetime:
         return self._now_func() if self._now_func else datetime.now(self.timezone)
 
     def _headers(self) -> Dict[str, str]:
         token = self._resolve_token()
-        return {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
+        # Заголовки меняются только вместе с токеном; токен и словарь хранятся одной парой,
+        # чтобы параллельные потоки не увидели словарь от другого токена
+        cached_token, headers = self._cached_headers
+        if token != cached_token:
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            }
+            self._cached_headers = (token, headers)
+        return headers
 
     def _resolve_token(self) -> str:
         if self._token_resolver:
@@ -207,14 +330,18 @@ class YandexDeferredClient:
         raise YandexAPIError("IAM токен не задан.")
 
     def _respect_limits(self, rules: Iterable[RateLimitRule]) -> None:
-        current_time = self._now()
+        with self._limits_lock:
+            self._consume_limits(rules)
+
+    def _consume_limits(self, rules: Iterable[RateLimitRule]) -> None:
+        current_time = self._monotonic()
         for rule in rules:
-            while rule.events and (current_time - rule.events[0]) > rule.window:
+            window = rule.window_seconds
+            while rule.events and (current_time - rule.events[0]) > window:
                 rule.events.popleft()
 
             if len(rule.events) >= rule.limit:
-                wait_for = (rule.events[0] + rule.window) - current_time
-                seconds = max(wait_for.total_seconds(), 0)
+                seconds = max(rule.events[0] + window - current_time, 0)
                 if seconds > 0:
                     LOGGER.debug(
                         "Превышен лимит %s запросов за %s. Ждём %.2f c.",
@@ -223,7 +350,7 @@ class YandexDeferredClient:
                         seconds,
                     )
                     self._sleep(seconds)
-                current_time = self._now()
+                current_time = self._monotonic()
 
             rule.events.append(current_time)
 
@@ -251,12 +378,11 @@ class YandexDeferredClient:
 
         LOGGER.debug("Создание deferred-запроса: %s", payload)
 
-        with httpx.Client(timeout=self.timeout) as client:
-            response = client.post(
-                SEARCH_ASYNC_URL,
-                json=payload,
-                headers=self._headers(),
-            )
+        response = self._http.post(
+            SEARCH_ASYNC_URL,
+            content=_json_dumps(payload),
+            headers=self._headers(),
+        )
 
         if response.status_code >= 400:
             LOGGER.error(
@@ -268,14 +394,29 @@ class YandexDeferredClient:
                 f"Ошибка создания deferred-запроса: {response.status_code}"
             )
 
-        return OperationResponse.from_dict(response.json())
+        return OperationResponse.from_dict(_json_loads(response.content))
+
+    def create_deferred_searches(
+        self,
+        params_list: Sequence[DeferredQueryParams],
+        *,
+        max_workers: int = CREATE_MAX_WORKERS,
+    ) -> List[Union[OperationResponse, Exception]]:
+        """Создаёт несколько deferred-запросов параллельно.
+
+        Результаты идут в порядке params_list; ошибка создания возвращается на месте ответа.
+        """
+        if not params_list:
+            return []
+        # Ночное окно проверяется один раз: вне него не отправляем ни одного запроса
+        self._ensure_night_window()
+        return self._map_concurrently(self.create_deferred_search, params_list, max_workers)
 
     def get_operation(self, operation_id: str) -> OperationResponse:
         """Возвращает текущее состояние операции."""
         self._respect_limits(self._status_limits)
         url = f"{OPERATIONS_URL}/{operation_id}"
-        with httpx.Client(timeout=self.timeout) as client:
-            response = client.get(url, headers=self._headers())
+        response = self._http.get(url, headers=self._headers())
 
         if response.status_code >= 400:
             LOGGER.error(
@@ -288,7 +429,38 @@ class YandexDeferredClient:
                 f"Ошибка получения операции: {response.status_code}"
             )
 
-        return OperationResponse.from_dict(response.json())
+        return OperationResponse.from_dict(_json_loads(response.content))
+
+    def get_operations(
+        self,
+        operation_ids: Sequence[str],
+        *,
+        max_workers: int = POLL_MAX_WORKERS,
+    ) -> List[Union[OperationResponse, Exception]]:
+        """Опрашивает несколько операций параллельно.
+
+        Результаты идут в порядке operation_ids; ошибка опроса возвращается на месте ответа.
+        """
+        return self._map_concurrently(self.get_operation, operation_ids, max_workers)
+
+    @staticmethod
+    def _map_concurrently(
+        func: Callable[[Any], OperationResponse],
+        items: Sequence[Any],
+        max_workers: int,
+    ) -> List[Union[OperationResponse, Exception]]:
+        if not items:
+            return []
+
+        def call(item: Any) -> Union[OperationResponse, Exception]:
+            try:
+                return func(item)
+            except Exception as exc:  # noqa: BLE001
+                return exc
+
+        # Лимиты соблюдаются под общей блокировкой, HTTP-клиент переиспользуется потоками
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+            return list(executor.map(call, items))
 
     def wait_until_ready(
         self,
@@ -297,18 +469,27 @@ class YandexDeferredClient:
         poll_interval_seconds: Optional[int] = None,
         timeout_minutes: Optional[int] = None,
     ) -> OperationResponse:
-        """Ожидает завершения операции, периодически опрашивая её статус."""
+        """Ожидает завершения операции, периодически опрашивая её статус.
+
+        Паузы между опросами растут вдвое от POLL_BACKOFF_INITIAL_SECONDS до интервала опроса,
+        со случайным разбросом, и не выходят за дедлайн.
+        """
         interval = poll_interval_seconds or self.poll_interval
         deadline = self._now() + (timedelta(minutes=timeout_minutes) if timeout_minutes else self.max_wait)
+        backoff = min(POLL_BACKOFF_INITIAL_SECONDS, interval)
 
         while True:
             operation = self.get_operation(operation_id)
             if operation.done:
                 return operation
 
-            if self._now() >= deadline:
+            now = self._now()
+            if now >= deadline:
                 raise OperationTimeout(
                     f"Операция {operation_id} не завершилась за отведённое время."
                 )
 
-            self._sleep(interval)
+            # Разброс не даёт операциям одной пачки опрашиваться синхронно
+            pause = backoff * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+            self._sleep(min(pause, (deadline - now).total_seconds()))
+            backoff = min(backoff * 2, interval)
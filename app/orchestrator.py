@@ -2,50 +2,60 @@
 
 from __future__ import annotations
 
-import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import cached_property
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
 from app.config import get_settings
 from app.modules.deduplicate import DeduplicationService
-from app.modules.enrich_contacts import ContactEnricher
-from app.modules.generate_email_gpt import (
-    CompanyBrief,
-    ContactBrief,
-    EmailGenerationError,
-    EmailGenerator,
-    OfferBrief,
-)
-from app.modules.send_email import EmailSender
 from app.modules.serp_ingest import SerpIngestService
-from app.modules.utils.db import get_session_factory, session_scope
+from app.modules.utils.db import dumps_jsonb, get_session_factory, session_scope
 from app.modules.utils.iam import (
     IamTokenProvider,
     StaticTokenProvider,
     load_service_account_key_from_file,
     load_service_account_key_from_string,
 )
-from app.modules.yandex_deferred import DeferredQueryParams, OperationResponse, YandexDeferredClient
-from app.modules.sheet_sync import build_service as build_sheet_sync_service
+from app.modules.yandex_deferred import (
+    DeferredQueryParams,
+    InvalidResponseError,
+    OperationResponse,
+    YandexDeferredClient,
+)
+
+if TYPE_CHECKING:
+    from app.modules.enrich_contacts import ContactEnricher
+    from app.modules.generate_email_gpt import EmailGenerator, OfferBrief
+    from app.modules.send_email import EmailSender
 
 LOGGER = logging.getLogger("app.orchestrator")
 
-SELECT_PENDING_QUERIES_SQL = """
-SELECT id, query_text, region_code
-FROM serp_queries
-WHERE status = 'pending'
-  AND scheduled_for <= NOW()
-ORDER BY scheduled_for ASC
-LIMIT :limit;
+CLAIM_PENDING_QUERIES_SQL = """
+WITH claimed AS (
+    SELECT id
+    FROM serp_queries
+    WHERE status = 'pending'
+      AND scheduled_for <= NOW()
+    ORDER BY scheduled_for ASC
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE serp_queries q
+SET status = 'in_progress',
+    updated_at = NOW()
+FROM claimed
+WHERE q.id = claimed.id
+RETURNING q.id, q.query_text, q.region_code;
 """
 
-INSERT_OPERATION_SQL = """
+INSERT_OPERATIONS_SQL = """
 INSERT INTO serp_operations (
     query_id,
     operation_id,
@@ -53,21 +63,20 @@ INSERT INTO serp_operations (
     requested_at,
     metadata
 )
-VALUES (
-    :query_id,
-    :operation_id,
-    'created',
-    NOW(),
-    CAST(:metadata AS JSONB)
-)
+SELECT data.query_id, data.operation_id, 'created', NOW(), data.metadata
+FROM unnest(
+    CAST(:query_ids AS UUID[]),
+    CAST(:operation_ids AS TEXT[]),
+    CAST(:metadata AS JSONB[])
+) AS data(query_id, operation_id, metadata)
 ON CONFLICT (operation_id) DO NOTHING;
 """
 
-UPDATE_QUERY_STATUS_SQL = """
+UPDATE_QUERIES_STATUS_SQL = """
 UPDATE serp_queries
 SET status = :status,
     updated_at = NOW()
-WHERE id = :query_id;
+WHERE id = ANY(CAST(:query_ids AS UUID[]));
 """
 
 SELECT_OPEN_OPERATIONS_SQL = """
@@ -75,18 +84,27 @@ SELECT id, query_id, operation_id, status
 FROM serp_operations
 WHERE status IN ('created', 'running')
 ORDER BY requested_at
-LIMIT :limit;
+LIMIT :limit
+FOR NO KEY UPDATE SKIP LOCKED;
 """
 
-UPDATE_OPERATION_STATUS_SQL = """
-UPDATE serp_operations
-SET status = :status,
-    completed_at = :completed_at,
-    retry_count = retry_count + :increment_retry,
-    error_payload = CAST(:error_payload AS JSONB),
-    metadata = metadata || CAST(:metadata AS JSONB),
+UPDATE_OPERATIONS_STATUS_SQL = """
+UPDATE serp_operations AS so
+SET status = data.status,
+    completed_at = data.completed_at,
+    retry_count = so.retry_count + data.increment_retry,
+    error_payload = data.error_payload,
+    metadata = so.metadata || data.metadata,
     modified_at = NOW()
-WHERE id = :operation_id;
+FROM unnest(
+    CAST(:ids AS UUID[]),
+    CAST(:statuses AS TEXT[]),
+    CAST(:completed_at AS TIMESTAMPTZ[]),
+    CAST(:increment_retry AS INTEGER[]),
+    CAST(:error_payloads AS JSONB[]),
+    CAST(:metadata AS JSONB[])
+) AS data(id, status, completed_at, increment_retry, error_payload, metadata)
+WHERE so.id = data.id;
 """
 
 SELECT_COMPANIES_WITHOUT_CONTACTS_SQL = """
@@ -163,30 +181,40 @@ FROM serp_queries
 WHERE id = :query_id;
 """
 
-SELECT_SCHEDULED_OUTREACH_SQL = """
-WITH locked AS (
-    SELECT om.id
-    FROM outreach_messages om
-    WHERE om.status = 'scheduled'
-      AND (om.scheduled_for IS NULL OR om.scheduled_for <= NOW())
-    ORDER BY COALESCE(om.scheduled_for, om.created_at)
-    FOR UPDATE SKIP LOCKED
-    LIMIT :limit
-)
-SELECT
-    om.id,
-    om.company_id,
-    om.contact_id,
-    om.subject,
-    om.body,
-    om.metadata,
-    ct.value AS contact_value
-FROM outreach_messages om
-JOIN locked l ON l.id = om.id
-LEFT JOIN contacts ct ON ct.id = om.contact_id
-ORDER BY COALESCE(om.scheduled_for, om.created_at);
+RECORD_BACKFILL_ATTEMPT_SQL = """
+UPDATE companies
+SET attributes = jsonb_set(
+        jsonb_set(
+            attributes,
+            '{contacts_backfill_attempts}',
+            to_jsonb(COALESCE((attributes ->> 'contacts_backfill_attempts')::int, 0) + 1),
+            true
+        ),
+        '{contacts_backfill_last_attempt_at}',
+        to_jsonb(CAST(:attempted_at AS text)),
+        true
+    ),
+    updated_at = NOW()
+WHERE id = :id;
+"""
+
+RESET_COMPANY_PROCESSING_SQL = """
+UPDATE companies
+SET status = 'new',
+    updated_at = NOW()
+WHERE id = :id AND status = 'contacts_processing';
 """
 
+_CLAIM_PENDING_QUERIES_STMT = text(CLAIM_PENDING_QUERIES_SQL)
+_INSERT_OPERATIONS_STMT = text(INSERT_OPERATIONS_SQL)
+_UPDATE_QUERIES_STATUS_STMT = text(UPDATE_QUERIES_STATUS_SQL)
+_SELECT_OPEN_OPERATIONS_STMT = text(SELECT_OPEN_OPERATIONS_SQL)
+_UPDATE_OPERATIONS_STATUS_STMT = text(UPDATE_OPERATIONS_STATUS_SQL)
+_SELECT_COMPANIES_WITHOUT_CONTACTS_STMT = text(SELECT_COMPANIES_WITHOUT_CONTACTS_SQL)
+_SELECT_CONTACTS_FOR_OUTREACH_STMT = text(SELECT_CONTACTS_FOR_OUTREACH_SQL)
+_RECORD_BACKFILL_ATTEMPT_STMT = text(RECORD_BACKFILL_ATTEMPT_SQL)
+_RESET_COMPANY_PROCESSING_STMT = text(RESET_COMPANY_PROCESSING_SQL)
+
 
 @dataclass
 class OrchestratorConfig:
@@ -211,30 +239,67 @@ class PipelineOrchestrator:
         )
         self.serp_ingest = SerpIngestService(self.session_factory)
         self.deduplicator = DeduplicationService(self.session_factory)
-        self.contact_enricher = ContactEnricher(session_factory=self.session_factory)
-        self.email_generator = EmailGenerator()
-        self.email_sender = EmailSender(session_factory=self.session_factory)
-        self.offer = OfferBrief(
-            pains=["Расширение воронки B2B", "Высокая стоимость лида"],
-            value_proposition="Автоматизируем поиск релевантных компаний и персонализируем писма в течение суток.",
-            call_to_action="Готовы обсудить 15-минутный пилот на этой неделе?",
-        )
+        # Старые SHA-1 ключи компаний переводятся на BLAKE2b один раз за процесс, до первой загрузки выдачи
+        self._legacy_dedupe_hashes_rekeyed = False
         self._token_provider = token_provider
+        self._settings = settings
         self.sheet_settings = settings.sheet_sync
+        # Сервис листа (gspread и google-auth) создаётся при первой синхронизации: планировщик и
+        # воркер её не выполняют и не платят за импорт и авторизацию
         self._sheet_service = None
+        self._sheet_service_built = not self.sheet_settings.enabled
         self._sheet_sync_interval = timedelta(minutes=max(1, self.sheet_settings.interval_minutes))
         self._last_sheet_sync: datetime | None = None
-        if self.sheet_settings.enabled:
-            try:
-                self._sheet_service = build_sheet_sync_service(settings)
-                LOGGER.info(
-                    "Автосинхронизация Google Sheets включена (каждые %s мин, batch_tag=%s)",
-                    self.sheet_settings.interval_minutes,
-                    self.sheet_settings.batch_tag,
-                )
-            except Exception as exc:  # noqa: BLE001
-                LOGGER.error("Не удалось инициализировать синхронизацию Google Sheets: %s", exc)
-                self._sheet_service = None
+
+    def close(self) -> None:
+        """Освобождает сетевые ресурсы оркестратора при остановке процесса."""
+        self.deferred_client.close()
+
+    # Модули обогащения, генерации и отправки писем импортируются при первом обращении:
+    # планировщику нужны только клиент Yandex и БД, и тяжёлые зависимости он не загружает
+
+    @cached_property
+    def contact_enricher(self) -> ContactEnricher:
+        from app.modules.enrich_contacts import ContactEnricher
+
+        return ContactEnricher(session_factory=self.session_factory)
+
+    @cached_property
+    def email_generator(self) -> EmailGenerator:
+        from app.modules.generate_email_gpt import EmailGenerator
+
+        return EmailGenerator()
+
+    @cached_property
+    def email_sender(self) -> EmailSender:
+        from app.modules.send_email import EmailSender
+
+        return EmailSender(session_factory=self.session_factory)
+
+    @cached_property
+    def offer(self) -> OfferBrief:
+        from app.modules.generate_email_gpt import OfferBrief
+
+        return OfferBrief(
+            pains=["Расширение воронки B2B", "Высокая стоимость лида"],
+            value_proposition="Автоматизируем поиск релевантных компаний и персонализируем писма в течение суток.",
+            call_to_action="Готовы обсудить 15-минутный пилот на этой неделе?",
+        )
+
+    def _build_sheet_service(self):  # noqa: ANN202
+        from app.modules.sheet_sync import build_service as build_sheet_sync_service
+
+        try:
+            service = build_sheet_sync_service(self._settings)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.error("Не удалось инициализировать синхронизацию Google Sheets: %s", exc)
+            return None
+        LOGGER.info(
+            "Автосинхронизация Google Sheets включена (каждые %s мин, batch_tag=%s)",
+            self.sheet_settings.interval_minutes,
+            self.sheet_settings.batch_tag,
+        )
+        return service
 
     @staticmethod
     def _build_iam_provider(settings) -> StaticTokenProvider | IamTokenProvider:
@@ -263,8 +328,13 @@ class PipelineOrchestrator:
         processed = self._poll_operations()
         if processed:
             self.deduplicator.run()
-        enriched = self._enrich_missing_contacts()
-        queued, sent = self._generate_and_send_emails()
+        # Генерация и отправка писем работают с уже найденными контактами и ждут в основном сеть,
+        # поэтому идут в отдельном потоке параллельно с обогащением. Обогащение остаётся в текущем
+        # потоке: синхронный Playwright привязан к потоку, в котором запущен
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            emails = executor.submit(self._generate_and_send_emails)
+            enriched = self._enrich_missing_contacts()
+            queued, sent = emails.result()
         LOGGER.info(
             "Цикл завершён: scheduled=%s, processed=%s, enriched=%s, queued=%s, sent=%s",
             scheduled,
@@ -300,7 +370,18 @@ class PipelineOrchestrator:
         _, sent = self._generate_and_send_emails()
         return sent
 
+    def queue_emails(self) -> int:
+        """Генерирует письма и ставит их в очередь без SMTP-отправки."""
+        return self._queue_emails()
+
+    def send_scheduled_emails(self) -> int:
+        """Доставляет письма, у которых наступило время отправки."""
+        return self._send_scheduled_emails()
+
     def _maybe_sync_sheet(self) -> None:
+        if not self._sheet_service_built:
+            self._sheet_service_built = True
+            self._sheet_service = self._build_sheet_service()
         if not self._sheet_service:
             return
         now = datetime.now(timezone.utc)
@@ -322,121 +403,151 @@ class PipelineOrchestrator:
 
     def _schedule_deferred_queries(self) -> int:
         with session_scope(self.session_factory) as session:
+            # Пачка захватывается одним UPDATE ... RETURNING; SKIP LOCKED отдаёт параллельным
+            # планировщикам разные строки, а до коммита захваченные строки остаются заблокированными
             rows = list(
                 session.execute(
-                    text(SELECT_PENDING_QUERIES_SQL),
+                    _CLAIM_PENDING_QUERIES_STMT,
                     {"limit": self.config.batch_size},
                 ).mappings()
             )
             if not rows:
                 return 0
 
-            scheduled = 0
-            for row in rows:
-                try:
-                    params = DeferredQueryParams(query_text=row["query_text"], region=row["region_code"])
-                    operation = self.deferred_client.create_deferred_search(params)
-                    session.execute(
-                        text(INSERT_OPERATION_SQL),
-                        {
-                            "query_id": row["id"],
-                            "operation_id": operation.id,
-                            "metadata": json.dumps({"created_at": datetime.now(timezone.utc).isoformat()}),
-                        },
-                    )
-                    session.execute(
-                        text(UPDATE_QUERY_STATUS_SQL),
-                        {"query_id": row["id"], "status": "in_progress"},
-                    )
-                    scheduled += 1
-                except Exception as exc:  # noqa: BLE001
-                    LOGGER.exception("Не удалось создать deferred-запрос: %s", exc)
-            return scheduled
+            query_ids: list[str] = []
+            operation_ids: list[str] = []
+            metadata: list[str] = []
+            failed_ids: list[str] = []
+            # Операции пачки создаются одновременно, поэтому отметка времени у них общая
+            created_metadata = dumps_jsonb({"created_at": datetime.now(timezone.utc).isoformat()})
+            # Запросы пачки создаются параллельно в пределах лимита API
+            try:
+                operations = self.deferred_client.create_deferred_searches(
+                    [DeferredQueryParams(query_text=row["query_text"], region=row["region_code"]) for row in rows]
+                )
+            except Exception as exc:  # noqa: BLE001
+                LOGGER.exception("Не удалось создать deferred-запросы: %s", exc)
+                operations = [exc] * len(rows)
+            for row, operation in zip(rows, operations):
+                if isinstance(operation, Exception):
+                    LOGGER.error("Не удалось создать deferred-запрос: %s", operation, exc_info=operation)
+                    failed_ids.append(row["id"])
+                    continue
+                query_ids.append(row["id"])
+                operation_ids.append(operation.id)
+                metadata.append(created_metadata)
+
+            if query_ids:
+                session.execute(
+                    _INSERT_OPERATIONS_STMT,
+                    {"query_ids": query_ids, "operation_ids": operation_ids, "metadata": metadata},
+                )
+            if failed_ids:
+                # Несозданные запросы возвращаются в очередь до следующего цикла
+                session.execute(
+                    _UPDATE_QUERIES_STATUS_STMT,
+                    {"query_ids": failed_ids, "status": "pending"},
+                )
+            return len(query_ids)
 
     def _poll_operations(self) -> int:
+        if not self._legacy_dedupe_hashes_rekeyed:
+            # Отдельная зафиксированная транзакция: upsert компаний в ingest не должен ждать
+            # незафиксированные новые ключи сессии опроса
+            self.deduplicator.rekey_legacy_hashes()
+            self._legacy_dedupe_hashes_rekeyed = True
+
         with session_scope(self.session_factory) as session:
             rows = list(
                 session.execute(
-                    text(SELECT_OPEN_OPERATIONS_SQL),
+                    _SELECT_OPEN_OPERATIONS_STMT,
                     {"limit": self.config.batch_size},
                 ).mappings()
             )
             if not rows:
                 return 0
 
+            # Статусы всей пачки запрашиваются параллельно, а запись в БД остаётся в этом потоке
+            operations = self.deferred_client.get_operations([row["operation_id"] for row in rows])
+            # Статусы получены одним параллельным опросом — одна отметка времени на пачку
+            checked_at = datetime.now(timezone.utc)
+            checked_metadata = dumps_jsonb({"last_checked": checked_at.isoformat()})
+            empty_metadata = dumps_jsonb({})
             processed = 0
-            for row in rows:
+            completed_query_ids: list[str] = []
+            updates: list[tuple] = []
+            for row, operation in zip(rows, operations):
                 operation_id = row["operation_id"]
                 try:
-                    operation = self.deferred_client.get_operation(operation_id)
-                    status = "running" if not operation.done else "done"
-                    metadata = {"last_checked": datetime.now(timezone.utc).isoformat()}
+                    if isinstance(operation, Exception):
+                        raise operation
 
                     if operation.done:
-                        self._handle_completed_operation(session, row["id"], row["query_id"], operation)
+                        if self._handle_completed_operation(row["id"], operation):
+                            completed_query_ids.append(row["query_id"])
                         processed += 1
-                        status = "done"
-                        completed_at = datetime.now(timezone.utc)
+                        updates.append((row["id"], "done", checked_at, 0, None, checked_metadata))
                     else:
-                        completed_at = None
-
-                    session.execute(
-                        text(UPDATE_OPERATION_STATUS_SQL),
-                        {
-                            "operation_id": row["id"],
-                            "status": status,
-                            "completed_at": completed_at,
-                            "increment_retry": 0,
-                            "error_payload": None,
-                            "metadata": json.dumps(metadata),
-                        },
-                    )
+                        updates.append((row["id"], "running", None, 0, None, checked_metadata))
                 except Exception as exc:  # noqa: BLE001
                     LOGGER.exception("Ошибка обработки операции %s: %s", operation_id, exc)
-                    session.execute(
-                        text(UPDATE_OPERATION_STATUS_SQL),
-                        {
-                            "operation_id": row["id"],
-                            "status": "failed",
-                            "completed_at": datetime.now(timezone.utc),
-                            "increment_retry": 1,
-                            "error_payload": json.dumps({"reason": str(exc)}),
-                            "metadata": json.dumps({}),
-                        },
+                    updates.append(
+                        (
+                            row["id"],
+                            "failed",
+                            checked_at,
+                            1,
+                            dumps_jsonb({"reason": str(exc)}),
+                            empty_metadata,
+                        )
                     )
+
+            # Статусы операций и завершённых запросов пишутся по одному оператору на пачку
+            ids, statuses, completed_at, increment_retry, error_payloads, metadata_values = zip(*updates)
+            session.execute(
+                _UPDATE_OPERATIONS_STATUS_STMT,
+                {
+                    "ids": list(ids),
+                    "statuses": list(statuses),
+                    "completed_at": list(completed_at),
+                    "increment_retry": list(increment_retry),
+                    "error_payloads": list(error_payloads),
+                    "metadata": list(metadata_values),
+                },
+            )
+            if completed_query_ids:
+                session.execute(
+                    _UPDATE_QUERIES_STATUS_STMT,
+                    {"query_ids": completed_query_ids, "status": "completed"},
+                )
             return processed
 
     def _handle_completed_operation(
         self,
-        session: Session,
         operation_db_id: str,
-        query_id: str,
         operation: OperationResponse,
-    ) -> None:
+    ) -> bool:
+        """Загружает выдачу операции; возвращает True, если запрос можно пометить завершённым."""
+        # Base64 декодируется по частям прямо в потоковый разбор XML; ошибка декодирования
+        # всплывает до записи в БД, потому что ingest пишет документы после разбора
         try:
-            raw_xml = operation.decode_raw_data()
-        except Exception as exc:  # noqa: BLE001
+            self.serp_ingest.ingest(
+                operation_db_id,
+                operation.iter_raw_data(),
+                yandex_operation_id=operation.id,
+            )
+        except InvalidResponseError as exc:
             LOGGER.error("Не удалось декодировать ответ операции %s: %s", operation.id, exc)
-            return
-
-        self.serp_ingest.ingest(
-            operation_db_id,
-            raw_xml,
-            yandex_operation_id=operation.id,
-        )
-        session.execute(
-            text(UPDATE_QUERY_STATUS_SQL),
-            {"query_id": query_id, "status": "completed"},
-        )
+            return False
+        return True
 
     def _enrich_missing_contacts(self) -> int:
         with session_scope(self.session_factory) as session:
-            rows = list(
-                session.execute(
-                    text(SELECT_COMPANIES_WITHOUT_CONTACTS_SQL),
-                    {"limit": self.config.batch_size},
-                ).mappings()
-            )
+            # Строки проходятся один раз, поэтому отдельный список из них не собираем
+            rows = session.execute(
+                _SELECT_COMPANIES_WITHOUT_CONTACTS_STMT,
+                {"limit": self.config.batch_size},
+            ).mappings()
             count = 0
             for row in rows:
                 canonical_domain = (row["canonical_domain"] or "").strip()
@@ -451,24 +562,7 @@ class PipelineOrchestrator:
                     )
                     if row.get("prior_status") == "contacts_not_found":
                         session.execute(
-                            text(
-                                """
-                                UPDATE companies
-                                SET attributes = jsonb_set(
-                                        jsonb_set(
-                                            attributes,
-                                            '{contacts_backfill_attempts}',
-                                            to_jsonb(COALESCE((attributes ->> 'contacts_backfill_attempts')::int, 0) + 1),
-                                            true
-                                        ),
-                                        '{contacts_backfill_last_attempt_at}',
-                                        to_jsonb(CAST(:attempted_at AS text)),
-                                        true
-                                    ),
-                                    updated_at = NOW()
-                                WHERE id = :id
-                                """
-                            ),
+                            _RECORD_BACKFILL_ATTEMPT_STMT,
                             {
                                 "id": row["id"],
                                 "attempted_at": datetime.now(timezone.utc).isoformat(),
@@ -479,14 +573,7 @@ class PipelineOrchestrator:
                 except Exception as exc:  # noqa: BLE001
                     LOGGER.exception("Ошибка enrichment компании %s: %s", row["id"], exc)
                     session.execute(
-                        text(
-                            """
-                            UPDATE companies
-                            SET status = 'new',
-                                updated_at = NOW()
-                            WHERE id = :id AND status = 'contacts_processing'
-                            """
-                        ),
+                        _RESET_COMPANY_PROCESSING_STMT,
                         {"id": row["id"]},
                     )
             return count
@@ -497,14 +584,15 @@ class PipelineOrchestrator:
         return queued, sent
 
     def _queue_emails(self) -> int:
+        from app.modules.generate_email_gpt import CompanyBrief, ContactBrief, EmailGenerationError
+        from app.modules.send_email import QueueRequest
+
         with session_scope(self.session_factory) as session:
-            rows = list(
-                session.execute(
-                    text(SELECT_CONTACTS_FOR_OUTREACH_SQL),
-                    {"limit": self.config.batch_size},
-                ).mappings()
-            )
-            queued = 0
+            rows = session.execute(
+                _SELECT_CONTACTS_FOR_OUTREACH_STMT,
+                {"limit": self.config.batch_size},
+            ).mappings()
+            requests: list[QueueRequest] = []
             for row in rows:
                 company = CompanyBrief(
                     name=row["name"],
@@ -515,15 +603,15 @@ class PipelineOrchestrator:
                 contact = ContactBrief(emails=[row["value"]])
                 try:
                     generated = self.email_generator.generate(company, self.offer, contact)
-                    self.email_sender.queue(
-                        company_id=row["company_id"],
-                        contact_id=row["contact_id"],
-                        to_email=row["value"],
-                        template=generated.template,
-                        request_payload=generated.request_payload,
-                        session=session,
+                    requests.append(
+                        QueueRequest(
+                            company_id=row["company_id"],
+                            contact_id=row["contact_id"],
+                            to_email=row["value"],
+                            template=generated.template,
+                            request_payload=generated.request_payload,
+                        )
                     )
-                    queued += 1
                 except EmailGenerationError as exc:
                     LOGGER.error(
                         "Не удалось сгенерировать письмо для company=%s contact=%s: %s",
@@ -539,58 +627,11 @@ class PipelineOrchestrator:
                         request_payload=None,
                         session=session,
                     )
-            return queued
+            # Слоты отправки резервируются один раз на всю пачку, а строки вставляются одним executemany;
+            # блокировка расписания берётся уже после генерации, а не держится на время запросов к LLM
+            self.email_sender.queue_batch(requests, session=session)
+            return len(requests)
 
     def _send_scheduled_emails(self) -> int:
-        if not getattr(self.email_sender, "sending_enabled", True):
-            LOGGER.debug("Отправка писем отключена, доставка пропущена.")
-            return 0
-        if not self.email_sender.is_within_send_window():
-            LOGGER.debug("Вне окна отправки, доставка писем пропущена.")
-            return 0
-
-        with session_scope(self.session_factory) as session:
-            rows = list(
-                session.execute(
-                    text(SELECT_SCHEDULED_OUTREACH_SQL),
-                    {"limit": self.config.batch_size},
-                ).mappings()
-            )
-            sent = 0
-            for row in rows:
-                metadata = row.get("metadata") or {}
-                if isinstance(metadata, str):
-                    try:
-                        metadata = json.loads(metadata)
-                    except json.JSONDecodeError:
-                        metadata = {}
-                to_email = None
-                if isinstance(metadata, dict):
-                    to_email = metadata.get("to_email")
-                if not to_email:
-                    to_email = row.get("contact_value")
-                if not to_email:
-                    LOGGER.error(
-                        "Не удалось определить email для outreach %s, помечаем как failed.",
-                        row["id"],
-                    )
-                    self.email_sender.mark_status(
-                        outreach_id=str(row["id"]),
-                        status="failed",
-                        last_error="missing_email",
-                        metadata={"reason": "missing_email"},
-                        session=session,
-                    )
-                    continue
-                result = self.email_sender.deliver(
-                    outreach_id=str(row["id"]),
-                    company_id=str(row["company_id"]),
-                    contact_id=row.get("contact_id"),
-                    to_email=to_email,
-                    subject=row["subject"],
-                    body=row["body"],
-                    session=session,
-                )
-                if result == "sent":
-                    sent += 1
-            return sent
+        results = self.email_sender.deliver_due(batch_size=self.config.batch_size)
+        return results.count("sent")
@@ -1,9 +1,8 @@
 """Планировщик deferred-запросов и polling операций."""
 
 import logging
-import time
 
-from app.modules.utils.db import bootstrap_database
+from app.modules.utils.db import QUERIES_NOTIFY_CHANNEL, NotificationListener, bootstrap_database
 from app.modules.yandex_deferred import NightWindowViolation
 from app.orchestrator import PipelineOrchestrator
 
@@ -17,6 +16,8 @@ def main() -> None:
     )
     bootstrap_database()
     orchestrator = PipelineOrchestrator()
+    # Новые запросы будят планировщик через NOTIFY; интервал опроса остаётся верхней границей ожидания
+    listener = NotificationListener([QUERIES_NOTIFY_CHANNEL])
     LOGGER.info("Планировщик готов к созданию deferred-запросов.")
 
     try:
@@ -27,9 +28,12 @@ def main() -> None:
             except NightWindowViolation as exc:
                 LOGGER.info("Вне ночного окна: %s", exc)
 
-            time.sleep(orchestrator.config.poll_interval_seconds)
+            listener.wait(orchestrator.config.poll_interval_seconds)
     except KeyboardInterrupt:
         LOGGER.info("Планировщик остановлен пользователем.")
+    finally:
+        listener.close()
+        orchestrator.close()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,26 @@
 """Фоновый воркер для обогащения контактов и отправки писем."""
 
 import logging
-import time
+import threading
 
-from app.modules.utils.db import bootstrap_database
+from app.modules.utils.db import COMPANIES_NOTIFY_CHANNEL, NotificationListener, bootstrap_database
 from app.orchestrator import PipelineOrchestrator
 
 LOGGER = logging.getLogger("app.worker")
 
 
+def _delivery_loop(orchestrator: PipelineOrchestrator, stop: threading.Event) -> None:
+    """Отправляет письма из очереди независимо от генерации и обогащения."""
+    while not stop.is_set():
+        try:
+            sent = orchestrator.send_scheduled_emails()
+            if sent:
+                LOGGER.info("Доставка: sent=%s", sent)
+        except Exception:  # noqa: BLE001
+            LOGGER.exception("Ошибка цикла доставки писем, повторим на следующем проходе.")
+        stop.wait(orchestrator.config.poll_interval_seconds)
+
+
 def main() -> None:
     logging.basicConfig(
         level=logging.INFO,
@@ -18,14 +30,35 @@ def main() -> None:
     orchestrator = PipelineOrchestrator()
     LOGGER.info("Воркер запущен.")
 
+    # EmailSender создаётся лениво — берём его до старта потока доставки, чтобы оба потока
+    # работали с одним экземпляром и общим пулом SMTP-соединений
+    orchestrator.email_sender  # noqa: B018
+    # SMTP-отправка идёт в отдельном потоке: медленные генерация и обогащение её не задерживают,
+    # а она — их; пул SMTP-соединений живёт вместе с общим EmailSender оркестратора
+    stop = threading.Event()
+    delivery = threading.Thread(
+        target=_delivery_loop,
+        args=(orchestrator, stop),
+        name="email-delivery",
+        daemon=True,
+    )
+    delivery.start()
+    # Новые компании будят воркер через NOTIFY; интервал опроса остаётся верхней границей ожидания
+    listener = NotificationListener([COMPANIES_NOTIFY_CHANNEL])
+
     try:
         while True:
             enriched = orchestrator.enrich_missing_contacts()
-            sent = orchestrator.generate_and_send_emails()
-            LOGGER.info("Воркер цикл: enriched=%s, sent=%s", enriched, sent)
-            time.sleep(orchestrator.config.poll_interval_seconds)
+            queued = orchestrator.queue_emails()
+            LOGGER.info("Воркер цикл: enriched=%s, queued=%s", enriched, queued)
+            listener.wait(orchestrator.config.poll_interval_seconds)
     except KeyboardInterrupt:
         LOGGER.info("Воркер остановлен пользователем.")
+    finally:
+        listener.close()
+        stop.set()
+        delivery.join(timeout=orchestrator.config.poll_interval_seconds)
+        orchestrator.close()
 
 
 if __name__ == "__main__":
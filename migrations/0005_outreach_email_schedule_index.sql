@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS idx_outreach_email_scheduled
+    ON outreach_messages (scheduled_for)
+    WHERE channel = 'email' AND scheduled_for IS NOT NULL;
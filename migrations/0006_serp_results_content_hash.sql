@@ -0,0 +1,2 @@
+ALTER TABLE serp_results
+    ADD COLUMN IF NOT EXISTS content_hash BYTEA;
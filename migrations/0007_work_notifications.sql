@@ -0,0 +1,23 @@
+-- Уведомления LISTEN/NOTIFY о новой работе: планировщик и воркер просыпаются по ним, а не только по таймеру
+CREATE OR REPLACE FUNCTION notify_leadgen_work() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM inserted_rows) THEN
+        PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_serp_queries_notify_work ON serp_queries;
+CREATE TRIGGER trg_serp_queries_notify_work
+    AFTER INSERT ON serp_queries
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_leadgen_work('leadgen_queries');
+
+DROP TRIGGER IF EXISTS trg_companies_notify_work ON companies;
+CREATE TRIGGER trg_companies_notify_work
+    AFTER INSERT ON companies
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_leadgen_work('leadgen_companies');
@@ -12,9 +12,14 @@ def test_settings_loaded_from_env(monkeypatch) -> None:
     monkeypatch.setenv("POSTGRES_USER", "tester")
     monkeypatch.setenv("POSTGRES_PASSWORD", "secret")
     monkeypatch.setenv("POSTGRES_DB", "leadgen_test")
+    monkeypatch.setenv("POSTGRES_POOL_SIZE", "4")
+    monkeypatch.setenv("POSTGRES_MAX_OVERFLOW", "8")
     monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/1")
     monkeypatch.setenv("SMTP_HOST", "smtp.test")
     monkeypatch.setenv("SMTP_PORT", "2525")
+    monkeypatch.setenv("SMTP_MAX_MSGS_PER_CONN", "50")
+    monkeypatch.setenv("SMTP_MAX_CONCURRENT_CONNS", "6")
+    monkeypatch.setenv("SMTP_MAX_IDLE_SECONDS", "45")
     monkeypatch.setenv("YANDEX_CLOUD_IAM_TOKEN", "test-token")
     monkeypatch.setenv("YANDEX_CLOUD_FOLDER_ID", "folder-test")
     monkeypatch.setenv("GMAIL_SMTP_HOST", "smtp.test")
@@ -46,9 +51,17 @@ def test_settings_loaded_from_env(monkeypatch) -> None:
     assert settings.database.user == "tester"
     assert settings.database.password == "secret"
     assert settings.database.name == "leadgen_test"
+    assert settings.database.pool_size == 4
+    assert settings.database.max_overflow == 8
+    assert settings.database.pool_timeout == 30
+    assert settings.database.pool_recycle == 1800
     assert settings.redis_url == "redis://localhost:6379/1"
     assert settings.smtp.host == "smtp.test"
     assert settings.smtp.port == 2525
+    assert settings.smtp.max_msgs_per_conn == 50
+    assert settings.smtp_yandex.max_msgs_per_conn == 50
+    assert settings.smtp_yandex.max_concurrent_conns == 6
+    assert settings.smtp_gmail.max_idle_seconds == 45.0
     assert settings.smtp.username == "mailer@test"
     assert settings.smtp.password == "gmail-pass"
     assert settings.smtp.sender == "leadgen@example.com"
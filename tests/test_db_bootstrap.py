@@ -1,5 +1,7 @@
 """Тесты bootstrap и миграций базы данных."""
 
+import json
+
 from app.modules.utils import db
 
 
@@ -59,3 +61,57 @@ def test_bootstrap_database_uses_advisory_lock(monkeypatch) -> None:
         ("lock", db.MIGRATIONS_ADVISORY_LOCK_ID),
         ("unlock", db.MIGRATIONS_ADVISORY_LOCK_ID),
     ]
+
+
+def test_dumps_jsonb_round_trips_metadata() -> None:
+    payload = {"reason": "opt_out", "snippet": "Агентство полного цикла", "attempts": 2, "extra": None}
+
+    assert json.loads(db.dumps_jsonb(payload)) == payload
+
+
+class FakeListenConnection:
+    def __init__(self, pending):
+        self.pending = list(pending)
+        self.executed = []
+        self.closed = False
+
+    def execute(self, statement):
+        self.executed.append(statement)
+
+    def notifies(self, *, timeout=None, stop_after=None):
+        while self.pending:
+            yield self.pending.pop(0)
+            if stop_after == 1:
+                return
+
+    def close(self):
+        self.closed = True
+
+
+def test_notification_listener_listens_once_and_drains(monkeypatch) -> None:
+    connection = FakeListenConnection(["n1", "n2", "n3"])
+    connects = []
+
+    def connect():
+        connects.append(connection)
+        return connection
+
+    listener = db.NotificationListener([db.QUERIES_NOTIFY_CHANNEL], connect_func=connect)
+
+    assert listener.wait(5) is True
+    assert connection.pending == []
+    assert listener.wait(5) is False
+    assert len(connects) == 1
+    assert len(connection.executed) == 1
+
+
+def test_notification_listener_falls_back_to_sleep(monkeypatch) -> None:
+    sleeps = []
+
+    def connect():
+        raise db.psycopg.OperationalError("down")
+
+    listener = db.NotificationListener(["leadgen_queries"], connect_func=connect, sleep_func=sleeps.append)
+
+    assert listener.wait(7) is False
+    assert sleeps == [7]
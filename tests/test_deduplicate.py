@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from typing import Any, Dict
 
 from app.modules.deduplicate import DeduplicationService
+from app.modules.utils.normalize import build_company_dedupe_key
 
 
 class DummyMappingResult:
@@ -61,6 +62,23 @@ class DummySession:
         params = params or {}
         self.executed.append((sql.strip(), params))
 
+        if "WHERE length(dedupe_hash)" in sql:
+            rows = [
+                {key: row[key] for key in ("id", "name", "canonical_domain", "website_url")}
+                for row in self.company_rows.values()
+                if len(row["dedupe_hash"]) == params["legacy_length"]
+            ]
+            return DummyMappingResult(rows)
+
+        if "FROM unnest" in sql and "SET dedupe_hash" in sql:
+            taken = {row["dedupe_hash"] for row in self.company_rows.values()}
+            updated = 0
+            for company_id, dedupe_hash in zip(params["ids"], params["dedupe_hashes"]):
+                if dedupe_hash not in taken:
+                    self.company_rows[company_id]["dedupe_hash"] = dedupe_hash
+                    updated += 1
+            return DummyUpdateResult(updated)
+
         if "SELECT id, name" in sql:
             rows = [
                 {
@@ -136,3 +154,20 @@ def test_deduplication_marks_duplicates() -> None:
     assert session.company_rows["2"]["status"] == "duplicate"
     assert session.company_rows["2"]["opt_out"] is True
     assert session.company_rows["3"]["status"] == "new"
+
+
+def test_rekey_legacy_hashes_moves_sha1_keys_to_blake2b() -> None:
+    session = DummySession()
+    session.company_rows["1"]["dedupe_hash"] = "a" * 40
+    session.company_rows["2"]["dedupe_hash"] = "b" * 40
+    session.company_rows["3"]["dedupe_hash"] = build_company_dedupe_key("Beta", "beta.ru")
+    service = DeduplicationService(session_factory=lambda: session)  # type: ignore[arg-type]
+
+    rekeyed = service.rekey_legacy_hashes(session=session)
+
+    # Строки 1 и 2 указывают на один домен: ключ получает только первая, вторую склеит run()
+    assert rekeyed == 1
+    assert session.company_rows["1"]["dedupe_hash"] == build_company_dedupe_key("Alpha", "alpha.ru")
+    assert len(session.company_rows["1"]["dedupe_hash"]) == 32
+    assert session.company_rows["2"]["dedupe_hash"] == "b" * 40
+    assert service.rekey_legacy_hashes(session=session) == 0
@@ -1,7 +1,11 @@
 """Тесты генерации и отправки писем."""
 
+import asyncio
 import json
+import random
+import threading
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from typing import Any, Dict, List, Optional, Tuple
 from unittest.mock import MagicMock
 
@@ -11,8 +15,18 @@ import respx
 
 from app.config import get_settings
 from app.modules.generate_email_gpt import CompanyBrief, EmailGenerationError, EmailGenerator, EmailTemplate, OfferBrief
-from app.modules.send_email import EmailSender
+from app.modules.send_email import (
+    MAX_SEND_DELAY_SECONDS,
+    MIN_SEND_DELAY_SECONDS,
+    DeliverJob,
+    EmailSender,
+    PreparedEmailTemplate,
+    QueueRequest,
+    _random_delay_seconds,
+    _random_delays,
+)
 from app.modules.mx_router import MXResult
+from app.modules.utils.email import clean_email, is_normalized_email, is_valid_email
 
 
 class DummySelectResult:
@@ -42,6 +56,25 @@ class DummyUpdateResult:
         return (self._value,)
 
 
+class DummyRowResult:
+    def __init__(self, row: Tuple[Any, ...]) -> None:
+        self._row = row
+
+    def one(self) -> Tuple[Any, ...]:
+        return self._row
+
+
+class DummyScalarsResult:
+    def __init__(self, values: List[Any]) -> None:
+        self._values = values
+
+    def scalars(self) -> "DummyScalarsResult":
+        return self
+
+    def all(self) -> List[Any]:
+        return list(self._values)
+
+
 class DummyScalarResult:
     def __init__(self, value: Any) -> None:
         self._value = value
@@ -50,25 +83,67 @@ class DummyScalarResult:
         return self._value
 
 
+class DummyMappingsResult:
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self._rows = rows
+
+    def mappings(self) -> "DummyMappingsResult":
+        return self
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self._rows)
+
+
 class DummySession:
     def __init__(self, opt_out_emails: Optional[List[str]] = None) -> None:
         self.opt_out_emails = {email.lower() for email in (opt_out_emails or [])}
         self.calls: List[Tuple[str, Dict[str, Any]]] = []
         self.claimed_outreach_ids: set[str] = set()
+        self.scheduled_slots: List[datetime] = []
+        self.due_rows: List[Dict[str, Any]] = []
 
     def execute(self, statement, params=None):  # noqa: ANN001
         sql = statement.text if hasattr(statement, "text") else str(statement)
         params = params or {}
         self.calls.append((sql.strip(), params))
 
-        if "SELECT scheduled_for" in sql and "FROM outreach_messages" in sql:
-            last = None
+        if "pg_advisory_xact_lock" in sql:
+            return DummyScalarResult(None)
+
+        if "FOR UPDATE SKIP LOCKED" in sql:
+            return DummyMappingsResult(self.due_rows)
+
+        if "make_interval" in sql and "INSERT INTO outreach_messages" in sql:
+            # эмулируем GREATEST(:now, MAX(scheduled_for)) + :delay из INSERT_SCHEDULED_OUTREACH_SQL
+            idx = len([c for c in self.calls if "INSERT INTO outreach_messages" in c[0]])
+            anchor = max([params["now"], *self.scheduled_slots])
+            slot = anchor + timedelta(seconds=params["delay"])
+            self.scheduled_slots.append(slot)
+            return DummyRowResult((f"outreach-{idx}", slot))
+
+        if "SET scheduled_for = :scheduled_for" in sql:
+            self.scheduled_slots[-1] = params["scheduled_for"]
+            return DummyUpdateResult(params["id"])
+
+        if "MAX(scheduled_for)" in sql and "FROM outreach_messages" in sql:
+            candidates = list(self.scheduled_slots)
             for recorded_sql, recorded_params in reversed(self.calls[:-1]):
                 if "INSERT INTO outreach_messages" in recorded_sql:
-                    last = recorded_params.get("scheduled_for")
-                    if last is not None:
+                    rows = recorded_params if isinstance(recorded_params, list) else [recorded_params]
+                    values = [row.get("scheduled_for") for row in rows if row.get("scheduled_for") is not None]
+                    if values:
+                        candidates.extend(values)
                         break
-            return DummyScalarResult(last)
+            return DummyScalarResult(max(candidates) if candidates else None)
+
+        if "INSERT INTO outreach_messages" in sql and "opt_out_registry" in sql:
+            idx = len([c for c in self.calls if "INSERT INTO outreach_messages" in c[0]])
+            email = params.get("contact_value", "").lower()
+            status = "skipped" if email in self.opt_out_emails else "sending"
+            return DummyRowResult((f"outreach-{idx}", status))
+
+        if "SELECT LOWER(contact_value) FROM opt_out_registry" in sql:
+            return DummyScalarsResult(sorted(self.opt_out_emails))
 
         if "FROM opt_out_registry" in sql:
             email = params.get("contact_value", "").lower()
@@ -211,11 +286,6 @@ def test_email_sender_queue_persists_email(monkeypatch: pytest.MonkeyPatch) -> N
 
     sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
     template = generator_template()
-    monkeypatch.setattr(
-        sender,
-        "_compute_scheduled_for",
-        lambda session, reference=None: datetime(2024, 1, 1, 6, 0, tzinfo=timezone.utc),
-    )
 
     outreach_id = sender.queue(
         company_id="c1",
@@ -242,6 +312,125 @@ def test_email_sender_queue_spacing(monkeypatch: pytest.MonkeyPatch) -> None:
     reset_settings_cache()
 
 
+def test_email_sender_queue_batch_uses_single_executemany(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    template = generator_template()
+    monkeypatch.setattr("app.modules.send_email._random_delays", lambda count: [660, 700, 720][:count])
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            value = datetime(2025, 10, 24, 6, 0, tzinfo=timezone.utc)
+            return value.astimezone(tz) if tz is not None else value
+
+    monkeypatch.setattr("app.modules.send_email.datetime", FixedDatetime)
+
+    ids = sender.queue_batch(
+        [
+            QueueRequest(company_id="c1", contact_id="k1", to_email="first@example.com", template=template),
+            QueueRequest(company_id="c2", contact_id="k2", to_email="+74951234567", template=template),
+            QueueRequest(company_id="c3", contact_id="k3", to_email="third@example.com", template=template),
+        ],
+        session=session,
+    )
+
+    inserts = [(sql, params) for sql, params in session.calls if "INSERT INTO outreach_messages" in sql]
+    assert len(inserts) == 1
+    rows = inserts[0][1]
+    assert [row["id"] for row in rows] == ids
+    assert [row["status"] for row in rows] == ["scheduled", "skipped", "scheduled"]
+    assert rows[1]["scheduled_for"] is None
+    assert (rows[2]["scheduled_for"] - rows[0]["scheduled_for"]).total_seconds() == 700
+    assert json.loads(rows[1]["metadata"])["reason"] == "invalid_email"
+
+    reset_settings_cache()
+
+
+def test_email_sender_queue_batch_streams_large_burst_via_copy(monkeypatch: pytest.MonkeyPatch) -> None:
+    written: List[tuple] = []
+    statements: List[str] = []
+
+    class FakeCopy:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def write_row(self, row):
+            written.append(tuple(row))
+
+    class FakeCursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def copy(self, statement):
+            statements.append(statement)
+            return FakeCopy()
+
+    class CopySession(DummySession):
+        def connection(self):
+            driver = SimpleNamespace(cursor=FakeCursor)
+            return SimpleNamespace(connection=SimpleNamespace(driver_connection=driver))
+
+    session = CopySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    template = generator_template()
+    monkeypatch.setattr("app.modules.send_email.QUEUE_BATCH_COPY_THRESHOLD", 2)
+    monkeypatch.setattr("app.modules.send_email._random_delays", lambda count: [660] * count)
+
+    ids = sender.queue_batch(
+        [
+            QueueRequest(company_id=f"c{index}", contact_id=None, to_email=f"lead{index}@example.com", template=template)
+            for index in range(3)
+        ],
+        session=session,
+    )
+
+    assert len(statements) == 1 and "FROM STDIN" in statements[0]
+    assert not [sql for sql, _ in session.calls if "INSERT INTO outreach_messages" in sql]
+    assert [row[0] for row in written] == ids
+    assert all(row[3] == "email" and row[6] == "scheduled" for row in written)
+    assert json.loads(written[0][10])["to_email"] == "lead0@example.com"
+
+    reset_settings_cache()
+
+
+def test_email_sender_update_status_batch_uses_single_statement() -> None:
+    session = DummySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    sent_at = datetime(2025, 10, 24, 9, 0, tzinfo=timezone.utc)
+    sender._update_status_batch(
+        session,
+        [
+            {"id": "o1", "status": "sent", "sent_at": sent_at, "metadata": {"message_id": "<a@x>"}},
+            {"id": "o2", "status": "sent", "sent_at": sent_at, "metadata": {"message_id": "<b@x>"}},
+            {"id": "o3", "status": "failed", "last_error": "boom", "metadata": {}},
+        ],
+    )
+
+    assert len(session.calls) == 1
+    sql, params = session.calls[0]
+    assert "unnest(" in sql
+    assert params["ids"] == ["o1", "o2", "o3"]
+    assert params["statuses"] == ["sent", "sent", "failed"]
+    assert params["sent_at"] == [sent_at, sent_at, None]
+    assert params["last_errors"] == [None, None, "boom"]
+    assert json.loads(params["metadata"][1]) == {"message_id": "<b@x>"}
+
+    reset_settings_cache()
+
+
 def test_email_sender_queue_skips_invalid_email(monkeypatch: pytest.MonkeyPatch) -> None:
     session = DummySession()
     reset_settings_cache()
@@ -273,7 +462,7 @@ def test_email_sender_queue_skips_invalid_email(monkeypatch: pytest.MonkeyPatch)
     template = generator_template()
 
     delays = iter([240, 300])
-    monkeypatch.setattr("app.modules.send_email.random.randint", lambda a, b: next(delays))
+    monkeypatch.setattr("app.modules.send_email._random_delay_seconds", lambda: next(delays))
 
     class FixedDatetime(datetime):
         _values = iter([])
@@ -310,16 +499,112 @@ def test_email_sender_queue_skips_invalid_email(monkeypatch: pytest.MonkeyPatch)
         session=session,
     )
 
-    scheduled = [
-        params["scheduled_for"]
-        for sql, params in session.calls
-        if "INSERT INTO outreach_messages" in sql
-    ]
+    scheduled = session.scheduled_slots
     assert len(scheduled) >= 2
     diff_seconds = (scheduled[-1] - scheduled[-2]).total_seconds()
     assert diff_seconds == pytest.approx(300.0, abs=1.0)
 
 
+def test_email_sender_queue_moves_slot_into_next_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    monkeypatch.setattr("app.modules.send_email._random_delay_seconds", lambda: 660)
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            value = datetime(2025, 10, 24, 17, 30, tzinfo=timezone.utc)  # 20:30 по Москве
+            return value.astimezone(tz) if tz is not None else value
+
+    monkeypatch.setattr("app.modules.send_email.datetime", FixedDatetime)
+
+    sender.queue(
+        company_id="c1",
+        contact_id="contact1",
+        to_email="late@example.com",
+        template=generator_template(),
+        session=session,
+    )
+
+    sqls = [sql for sql, _ in session.calls]
+    assert "pg_advisory_xact_lock" in sqls[0]
+    assert "make_interval" in sqls[1]
+    assert "SET scheduled_for = :scheduled_for" in sqls[2]
+    assert session.scheduled_slots[-1] == datetime(2025, 10, 25, 4, 18, tzinfo=timezone.utc)
+
+    reset_settings_cache()
+
+
+def test_random_delay_stays_within_bounds() -> None:
+    delays = {_random_delay_seconds() for _ in range(2000)}
+
+    assert min(delays) >= MIN_SEND_DELAY_SECONDS
+    assert max(delays) <= MAX_SEND_DELAY_SECONDS
+
+    batch = _random_delays(2000)
+    assert len(batch) == 2000
+    assert MIN_SEND_DELAY_SECONDS <= min(batch) <= max(batch) <= MAX_SEND_DELAY_SECONDS
+
+
+def test_email_sender_reserve_slots_matches_sequential_window_walk(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    rng = random.Random(7)
+    delays = [rng.randint(MIN_SEND_DELAY_SECONDS, MAX_SEND_DELAY_SECONDS) for _ in range(400)]
+    monkeypatch.setattr("app.modules.send_email._random_delays", lambda count: delays[:count])
+    monkeypatch.setattr("app.modules.send_email._random_delay_seconds", lambda: 700)
+    reference = datetime(2025, 10, 24, 15, 0, tzinfo=timezone.utc)
+
+    slots = sender._reserve_slots(session, len(delays), reference=reference)
+
+    anchor = reference.astimezone(sender._tz)
+    day, anchor_ts = anchor.date(), anchor.timestamp()
+    expected = []
+    for delay in delays:
+        day, anchor_ts = sender._pick_ts_within_window(day, anchor_ts, delay)
+        expected.append(datetime.fromtimestamp(anchor_ts, tz=timezone.utc))
+    assert slots == expected
+    assert len({slot.astimezone(sender._tz).date() for slot in slots}) > 2
+
+    reset_settings_cache()
+
+
+def test_email_sender_window_rolls_to_next_day(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    tz = sender._tz
+    late = datetime(2025, 10, 24, 20, 30, tzinfo=tz)
+
+    candidate = sender._pick_time_within_window(late, 600)
+
+    assert candidate == datetime(2025, 10, 25, 7, 17, tzinfo=tz)
+    assert sender._is_within_send_window(candidate)
+    assert not sender._is_within_send_window(late)
+    assert sender._is_within_send_window(datetime(2025, 10, 24, 19, 45, tzinfo=tz))
+    assert not sender._is_within_send_window(datetime(2025, 10, 24, 7, 6, 59, tzinfo=tz))
+    assert sender._window_bounds(late.date()) is sender._window_bounds(late.date())
+
+    reset_settings_cache()
+
+
+def test_email_sender_fast_window_check_matches_datetime_path(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    for hour, minute in [(4, 6), (4, 7), (12, 0), (16, 45), (16, 46), (23, 0)]:
+        moment = datetime(2025, 10, 24, hour, minute, tzinfo=timezone.utc)
+        monkeypatch.setattr("app.modules.send_email.unix_time", lambda moment=moment: moment.timestamp())
+        assert sender.is_within_send_window() == sender.is_within_send_window(reference=moment)
+
+    reset_settings_cache()
+
+
 def test_email_sender_marks_failed_on_network_error(monkeypatch: pytest.MonkeyPatch) -> None:
     session = DummySession()
     reset_settings_cache()
@@ -363,11 +648,6 @@ def test_email_sender_deliver_skips_opt_out(monkeypatch: pytest.MonkeyPatch) ->
     sender.mx_router = MagicMock()
     sender.mx_router.classify.return_value = MXResult("OTHER", [], False)
     monkeypatch.setattr(sender, "_send_via_channel", MagicMock(side_effect=AssertionError("deliver must not be called")))
-    monkeypatch.setattr(
-        sender,
-        "_compute_scheduled_for",
-        lambda session, reference=None: datetime(2024, 1, 1, 6, 0, tzinfo=timezone.utc),
-    )
     monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
 
     template = generator_template()
@@ -399,6 +679,180 @@ def test_email_sender_deliver_skips_opt_out(monkeypatch: pytest.MonkeyPatch) ->
     reset_settings_cache()
 
 
+def test_email_sender_opt_out_prefilter_avoids_per_email_query() -> None:
+    session = DummySession(opt_out_emails=["skip@example.com"])
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+
+    assert "hello@example.com" not in sender._opt_out_set(session)
+    assert "other@example.com" not in sender._opt_out_set(session)
+    assert "skip@example.com" in sender._opt_out_set(session)
+
+    opt_out_calls = [sql for sql, _ in session.calls if "opt_out_registry" in sql]
+    assert len(opt_out_calls) == 1
+    assert "SELECT LOWER(contact_value)" in opt_out_calls[0]
+
+    reset_settings_cache()
+
+
+def test_email_sender_deliver_batch_flushes_statuses_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession(opt_out_emails=["skip@example.com"])
+    reset_settings_cache()
+    monkeypatch.setenv("EMAIL_SENDING_ENABLED", "true")
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    sender.mx_router = MagicMock()
+    sender.mx_router.classify.return_value = MXResult("OTHER", [], False)
+    send_mock = MagicMock()
+    monkeypatch.setattr(sender, "_send_via_channel", send_mock)
+    monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
+
+    def job(outreach_id: str, to_email: str) -> DeliverJob:
+        return DeliverJob(
+            outreach_id=outreach_id,
+            company_id="c1",
+            contact_id=None,
+            to_email=to_email,
+            subject="Тема",
+            body="Текст",
+        )
+
+    results = sender.deliver_batch(
+        [
+            job("o1", "first@example.com"),
+            job("o2", "skip@example.com"),
+            job("o3", "not-an-email"),
+            job("o4", "fourth@example.com"),
+        ],
+        max_workers=2,
+        session=session,
+    )
+
+    assert results == ["sent", "skipped", "skipped", "sent"]
+    assert send_mock.call_count == 2
+    updates = [params for sql, params in session.calls if "UPDATE outreach_messages AS om" in sql]
+    assert len(updates) == 1
+    assert sorted(zip(updates[0]["ids"], updates[0]["statuses"], updates[0]["last_errors"])) == [
+        ("o1", "sent", None),
+        ("o2", "skipped", "opt_out"),
+        ("o3", "skipped", "invalid_email"),
+        ("o4", "sent", None),
+    ]
+
+    reset_settings_cache()
+
+
+def test_email_sender_deliver_due_claims_and_sends_locked_rows(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+
+    def due_row(outreach_id: str, metadata: Any, contact_value: Optional[str]) -> Dict[str, Any]:
+        return {
+            "id": outreach_id,
+            "company_id": "c1",
+            "contact_id": None,
+            "subject": "Тема",
+            "body": "Текст",
+            "metadata": metadata,
+            "contact_value": contact_value,
+        }
+
+    session.due_rows = [
+        due_row("o1", {"to_email": "first@example.com"}, None),
+        due_row("o2", "{}", "second@example.com"),
+        due_row("o3", {}, None),
+    ]
+    reset_settings_cache()
+    monkeypatch.setenv("EMAIL_SENDING_ENABLED", "true")
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    sender.mx_router = MagicMock()
+    sender.mx_router.classify.return_value = MXResult("OTHER", [], False)
+    send_mock = MagicMock()
+    monkeypatch.setattr(sender, "_send_via_channel", send_mock)
+    monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
+
+    results = sender.deliver_due(batch_size=10, session=session)
+
+    assert results == ["sent", "sent"]
+    assert sorted(call.args[0] for call in send_mock.call_args_list) == ["first@example.com", "second@example.com"]
+    select_params = [params for sql, params in session.calls if "FOR UPDATE SKIP LOCKED" in sql]
+    assert select_params == [{"limit": 10}]
+    missing = [params for sql, params in session.calls if "WHERE id = :id;" in sql and params.get("id") == "o3"]
+    assert missing and missing[0]["last_error"] == "missing_email"
+
+    reset_settings_cache()
+
+
+def test_email_sender_deliver_batch_async_runs_batch_off_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    monkeypatch.setenv("EMAIL_SENDING_ENABLED", "true")
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    sender.mx_router = MagicMock()
+    sender.mx_router.classify.return_value = MXResult("OTHER", [], False)
+    send_threads: List[int] = []
+    monkeypatch.setattr(sender, "_send_via_channel", lambda *_: send_threads.append(threading.get_ident()))
+    monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
+
+    jobs = [
+        DeliverJob(
+            outreach_id=f"o{index}",
+            company_id="c1",
+            contact_id=None,
+            to_email=f"lead{index}@example.com",
+            subject="Тема",
+            body="Текст",
+        )
+        for index in range(2)
+    ]
+    results = asyncio.run(sender.deliver_batch_async(jobs, max_workers=1))
+
+    assert results == ["sent", "sent"]
+    assert send_threads and threading.get_ident() not in send_threads
+    assert len([sql for sql, _ in session.calls if "UPDATE outreach_messages AS om" in sql]) == 1
+
+    reset_settings_cache()
+
+
+def test_prepared_template_builds_independent_messages() -> None:
+    template = PreparedEmailTemplate("Тема", "Здравствуйте!\nТекст письма.")
+
+    first = template.build("one@example.com")
+    second = template.build("two@example.com")
+    first["Message-ID"] = "<one@test>"
+
+    assert first["To"] == "one@example.com"
+    assert second["To"] == "two@example.com"
+    assert second["Message-ID"] is None
+    assert first.get_content() == second.get_content() == "Здравствуйте!\nТекст письма.\n"
+    assert second["Subject"] == "Тема"
+
+
+def test_prepared_template_header_changes_do_not_leak() -> None:
+    template = PreparedEmailTemplate("Тема", "Текст письма.")
+
+    first = template.build("one@example.com")
+    second = template.build("two@example.com")
+    first.replace_header("Subject", "Другая тема")
+    del first["Content-Transfer-Encoding"]
+    first["X-Campaign"] = "test"
+
+    third = template.build("three@example.com")
+    for message in (second, third):
+        assert message["Subject"] == "Тема"
+        assert message["Content-Transfer-Encoding"] is not None
+        assert message["X-Campaign"] is None
+        assert message.get_all("To") == [message["To"]]
+    assert template._prototype["To"] is None
+    assert template._prototype["Subject"] == "Тема"
+    assert third.as_bytes() == second.as_bytes().replace(b"two@", b"three@")
+
+
 def test_email_sender_deliver_skips_invalid_email(monkeypatch: pytest.MonkeyPatch) -> None:
     session = DummySession()
     reset_settings_cache()
@@ -451,11 +905,6 @@ def test_email_sender_deliver_success(monkeypatch: pytest.MonkeyPatch) -> None:
     sender.mx_router.classify.return_value = MXResult("OTHER", ["mx.test"], False)
     deliver_mock = MagicMock()
     monkeypatch.setattr(sender, "_send_via_channel", deliver_mock)
-    monkeypatch.setattr(
-        sender,
-        "_compute_scheduled_for",
-        lambda session, reference=None: datetime(2024, 1, 1, 6, 0, tzinfo=timezone.utc),
-    )
     monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
 
     template = generator_template()
@@ -489,6 +938,46 @@ def test_email_sender_deliver_success(monkeypatch: pytest.MonkeyPatch) -> None:
     reset_settings_cache()
 
 
+def test_email_sender_send_now_inserts_and_sends(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession(opt_out_emails=["skip@example.com"])
+    reset_settings_cache()
+    monkeypatch.setenv("EMAIL_SENDING_ENABLED", "true")
+    reset_settings_cache()
+
+    sender = EmailSender(session_factory=lambda: session, use_starttls=False)  # type: ignore[arg-type]
+    sender.mx_router = MagicMock()
+    sender.mx_router.classify.return_value = MXResult("OTHER", ["mx.test"], False)
+    deliver_mock = MagicMock()
+    monkeypatch.setattr(sender, "_send_via_channel", deliver_mock)
+    monkeypatch.setattr(sender, "_is_within_send_window", lambda *_: True)
+
+    template = generator_template()
+    sent = sender.send_now(
+        company_id="c1",
+        contact_id="contact1",
+        to_email="hello@example.com",
+        template=template,
+        session=session,
+    )
+    skipped = sender.send_now(
+        company_id="c2",
+        contact_id="contact2",
+        to_email="skip@example.com",
+        template=template,
+        session=session,
+    )
+
+    assert sent == "sent"
+    assert skipped == "skipped"
+    deliver_mock.assert_called_once()
+    sqls = [sql for sql, _ in session.calls]
+    assert not any("MAX(scheduled_for)" in sql for sql in sqls)
+    assert not any("SET status = 'sending'" in sql for sql in sqls)
+    assert sum("UPDATE outreach_messages" in sql for sql in sqls) == 1
+
+    reset_settings_cache()
+
+
 def test_email_sender_deliver_rejects_repeat_send(monkeypatch: pytest.MonkeyPatch) -> None:
     session = DummySession()
     reset_settings_cache()
@@ -569,3 +1058,25 @@ def test_email_sender_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
 
 def generator_template():
     return EmailTemplate(subject="Тестовая тема", body="Тестовое тело письма")
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("Info@Example.RU", "info@example.ru"),
+        ("mailto:Sales@Example.com?subject=hi", "sales@example.com"),
+        ("Отдел продаж <sales@example.com>", "sales@example.com"),
+        ("sales%40example.com", "sales@example.com"),
+        (" sales@exa​mple.com ", "sales@example.com"),
+    ],
+)
+def test_clean_email_normalizes_variants(raw: str, expected: str) -> None:
+    assert clean_email(raw) == expected
+    assert is_valid_email(raw)
+    assert is_normalized_email(expected)
+
+
+def test_email_validation_is_ascii_only() -> None:
+    # ſ (long s) при IGNORECASE совпадал бы с классом [A-Z]
+    assert not is_valid_email("ſales@example.com")
+    assert not is_normalized_email("sales@example")
@@ -1,10 +1,13 @@
 """Тесты провайдера IAM токенов."""
 
+import base64
 import json
 
 import httpx
 import respx
+from Crypto.Hash import SHA256
 from Crypto.PublicKey import RSA
+from Crypto.Signature import pss
 
 from app.modules.utils.iam import (
     IamTokenProvider,
@@ -50,3 +53,32 @@ def test_iam_provider_fetches_and_caches() -> None:
     assert len(route.calls) == 1
     payload = json.loads(route.calls[0].request.content.decode())
     assert "jwt" in payload
+
+
+@respx.mock
+def test_iam_provider_parses_key_once_and_signs_valid_jwt(monkeypatch) -> None:
+    key = load_service_account_key_from_string(_build_service_account_key_json())
+    imports = []
+    original_import = RSA.import_key
+
+    def counting_import(*args, **kwargs):
+        imports.append(args)
+        return original_import(*args, **kwargs)
+
+    monkeypatch.setattr("app.modules.utils.iam.RSA.import_key", counting_import)
+    route = respx.post(TOKEN_ENDPOINT).mock(
+        return_value=httpx.Response(200, json={"iamToken": "token", "expiresAt": "2000-01-01T00:00:00Z"})
+    )
+
+    provider = IamTokenProvider(key=key)
+    provider.get_token()
+    provider.get_token()
+
+    assert len(route.calls) == 2
+    assert len(imports) == 1
+    jwt_assertion = json.loads(route.calls[1].request.content.decode())["jwt"]
+    header_segment, payload_segment, signature_segment = jwt_assertion.split(".")
+    signature = base64.urlsafe_b64decode(signature_segment + "=" * (-len(signature_segment) % 4))
+    public_key = original_import(key.private_key).public_key()
+    digest = SHA256.new(f"{header_segment}.{payload_segment}".encode("ascii"))
+    pss.new(public_key).verify(digest, signature)
@@ -26,3 +26,28 @@ def test_build_company_dedupe_key_stable() -> None:
 
 def test_clean_snippet_compacts_whitespace() -> None:
     assert clean_snippet("  Привет\nмир  ") == "Привет мир"
+
+
+def test_normalization_results_are_cached() -> None:
+    normalize_domain.cache_clear()
+    assert normalize_domain("WWW.Example.com") == "example.com"
+    assert normalize_domain("WWW.Example.com") == "example.com"
+    info = normalize_domain.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_normalize_url_bare_host_fast_path_matches_full_parse() -> None:
+    assert normalize_url("WWW.Example.COM/") == "https://example.com/"
+    assert normalize_url("http://www.example.com") == "http://example.com/"
+    assert normalize_url("https://www.x") == "https://x/"
+    # С портом, путём или query — обычный разбор через urlparse
+    assert normalize_url("example.com:8080/") == "https://example.com:8080/"
+    assert normalize_url("example.com/a?b=1") == "https://example.com/a?b=1"
+
+
+def test_normalize_domain_extracts_host_from_url_shapes() -> None:
+    assert normalize_domain("HTTPS://WWW.Example.com/path?x=1") == "example.com"
+    assert normalize_domain("example.com/contacts#form") == "example.com"
+    assert normalize_domain("https://тест.рф/") == "xn--e1aybc.xn--p1ai"
+    # Порт и userinfo разбираются полным путём через normalize_url
+    assert normalize_domain("https://example.com:8443/") == "example.com:8443"
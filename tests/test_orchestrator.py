@@ -2,7 +2,61 @@
 
 from __future__ import annotations
 
-from app.orchestrator import SELECT_COMPANIES_WITHOUT_CONTACTS_SQL, SELECT_CONTACTS_FOR_OUTREACH_SQL
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from app.modules.yandex_deferred import OperationResponse, YandexAPIError
+from app.orchestrator import (
+    CLAIM_PENDING_QUERIES_SQL,
+    SELECT_COMPANIES_WITHOUT_CONTACTS_SQL,
+    SELECT_CONTACTS_FOR_OUTREACH_SQL,
+    SELECT_OPEN_OPERATIONS_SQL,
+    OrchestratorConfig,
+    PipelineOrchestrator,
+)
+
+
+class RecordingResult:
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self._rows = rows
+
+    def mappings(self) -> List[Dict[str, Any]]:
+        return self._rows
+
+
+class RecordingSession:
+    """Сессия-заглушка: отдаёт заготовленные строки на SELECT и запоминает остальные операторы."""
+
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.statements: List[tuple[str, Dict[str, Any]]] = []
+
+    def execute(self, statement, params=None):  # noqa: ANN001
+        sql = " ".join(str(statement).split())
+        if sql.startswith(("SELECT", "WITH")):
+            return RecordingResult(self.rows)
+        self.statements.append((sql, params))
+        return None
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def make_orchestrator(session: RecordingSession, **attrs: Any) -> PipelineOrchestrator:
+    orchestrator = PipelineOrchestrator.__new__(PipelineOrchestrator)
+    orchestrator.config = OrchestratorConfig(batch_size=10)
+    orchestrator.session_factory = lambda: session
+    orchestrator._legacy_dedupe_hashes_rekeyed = True
+    for name, value in attrs.items():
+        setattr(orchestrator, name, value)
+    return orchestrator
 
 
 def test_outreach_selection_excludes_failed_contacts() -> None:
@@ -18,3 +72,139 @@ def test_company_backfill_runs_only_once() -> None:
     assert "c.status = 'contacts_not_found'" in normalized_sql
     assert "contacts_backfill_attempts" in normalized_sql
     assert "< 3" in normalized_sql
+
+
+def test_poll_operations_writes_statuses_in_one_statement() -> None:
+    session = RecordingSession(
+        [
+            {"id": "db-1", "query_id": "q-1", "operation_id": "op-1", "status": "created"},
+            {"id": "db-2", "query_id": "q-2", "operation_id": "op-2", "status": "created"},
+            {"id": "db-3", "query_id": "q-3", "operation_id": "op-3", "status": "running"},
+        ]
+    )
+    ingested: List[str] = []
+    deferred_client = SimpleNamespace(
+        get_operations=lambda ids: [
+            OperationResponse("op-1", True, {"rawData": "PGRvYy8+"}, None),
+            OperationResponse("op-2", False, None, None),
+            YandexAPIError("boom"),
+        ]
+    )
+    serp_ingest = SimpleNamespace(ingest=lambda db_id, raw, yandex_operation_id: ingested.append(db_id))
+    orchestrator = make_orchestrator(session, deferred_client=deferred_client, serp_ingest=serp_ingest)
+
+    processed = orchestrator.poll_operations()
+
+    assert processed == 1
+    assert ingested == ["db-1"]
+    assert len(session.statements) == 2
+    operations_sql, operations_params = session.statements[0]
+    assert operations_sql.startswith("UPDATE serp_operations")
+    assert operations_params["ids"] == ["db-1", "db-2", "db-3"]
+    assert operations_params["statuses"] == ["done", "running", "failed"]
+    assert operations_params["increment_retry"] == [0, 0, 1]
+    queries_sql, queries_params = session.statements[1]
+    assert queries_sql.startswith("UPDATE serp_queries")
+    assert queries_params == {"query_ids": ["q-1"], "status": "completed"}
+
+
+def test_legacy_rekey_runs_outside_poll_session() -> None:
+    session = RecordingSession([])
+    rekey_calls: List[tuple] = []
+    deduplicator = SimpleNamespace(
+        rekey_legacy_hashes=lambda *args, **kwargs: rekey_calls.append((args, kwargs)) or 0
+    )
+    orchestrator = make_orchestrator(session, deduplicator=deduplicator)
+    orchestrator._legacy_dedupe_hashes_rekeyed = False
+
+    orchestrator.poll_operations()
+    orchestrator.poll_operations()
+
+    # Без сессии опроса перевод ключей фиксируется в собственной транзакции и выполняется один раз
+    assert rekey_calls == [((), {})]
+
+
+def test_schedule_deferred_queries_batches_inserts() -> None:
+    session = RecordingSession(
+        [
+            {"id": "q-1", "query_text": "первый", "region_code": 213},
+            {"id": "q-2", "query_text": "второй", "region_code": 213},
+        ]
+    )
+
+    def create_many(params_list):  # noqa: ANN001
+        assert [params.query_text for params in params_list] == ["первый", "второй"]
+        return [OperationResponse("op-1", False, None, None), YandexAPIError("limit")]
+
+    orchestrator = make_orchestrator(
+        session, deferred_client=SimpleNamespace(create_deferred_searches=create_many)
+    )
+
+    scheduled = orchestrator.schedule_deferred_queries()
+
+    assert scheduled == 1
+    assert [sql.split()[0] for sql, _ in session.statements] == ["INSERT", "UPDATE"]
+    assert session.statements[0][1]["query_ids"] == ["q-1"]
+    assert session.statements[0][1]["operation_ids"] == ["op-1"]
+    # Захваченный, но не созданный запрос возвращается в очередь
+    assert session.statements[1][1] == {"query_ids": ["q-2"], "status": "pending"}
+
+
+def test_pending_queries_are_claimed_with_skip_locked() -> None:
+    normalized_sql = " ".join(CLAIM_PENDING_QUERIES_SQL.split())
+    assert "FOR UPDATE SKIP LOCKED" in normalized_sql
+    assert "SET status = 'in_progress'" in normalized_sql
+    assert "RETURNING q.id, q.query_text, q.region_code" in normalized_sql
+
+
+def test_open_operations_lock_allows_result_foreign_keys() -> None:
+    normalized_sql = " ".join(SELECT_OPEN_OPERATIONS_SQL.split())
+    # FOR KEY SHARE от внешнего ключа serp_results не должен ждать блокировку опроса
+    assert "FOR NO KEY UPDATE SKIP LOCKED" in normalized_sql
+    assert "FOR UPDATE" not in normalized_sql
+
+
+def test_run_once_overlaps_email_stage_with_enrichment() -> None:
+    threads: Dict[str, str] = {}
+    email_started = threading.Event()
+
+    def enrich() -> int:
+        threads["enrich"] = threading.current_thread().name
+        # Обогащение ждёт, пока письма начнут обрабатываться в соседнем потоке
+        assert email_started.wait(timeout=5)
+        return 3
+
+    def emails() -> tuple[int, int]:
+        threads["emails"] = threading.current_thread().name
+        email_started.set()
+        return 2, 1
+
+    orchestrator = make_orchestrator(
+        RecordingSession([]),
+        _sheet_service=None,
+        _sheet_service_built=True,
+        _schedule_deferred_queries=lambda: 0,
+        _poll_operations=lambda: 0,
+        _enrich_missing_contacts=enrich,
+        _generate_and_send_emails=emails,
+    )
+
+    orchestrator.run_once()
+
+    assert threads["enrich"] == threading.current_thread().name
+    assert threads["emails"] != threads["enrich"]
+
+
+def test_email_and_enrichment_modules_are_built_lazily(monkeypatch) -> None:
+    built: List[str] = []
+
+    class FakeEnricher:
+        def __init__(self, session_factory) -> None:  # noqa: ANN001
+            built.append("enricher")
+
+    monkeypatch.setattr("app.modules.enrich_contacts.ContactEnricher", FakeEnricher)
+    orchestrator = make_orchestrator(RecordingSession([]))
+
+    assert built == []
+    assert orchestrator.contact_enricher is orchestrator.contact_enricher
+    assert built == ["enricher"]
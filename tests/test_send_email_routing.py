@@ -12,7 +12,7 @@ import pytest
 
 from app.config import get_settings
 from app.modules.mx_router import MXResult
-from app.modules.send_email import EmailSender
+from app.modules.send_email import EmailSender, NormalizedRecipient, RouteContext, _mask_email
 from tests.test_email_modules import DummySession, generator_template, reset_settings_cache
 
 
@@ -30,6 +30,9 @@ def parse_last_update(session: DummySession) -> Tuple[str, Dict[str, Any]]:
     sql, params = session.calls[-1]
     assert "UPDATE outreach_messages" in sql
     payload = json.loads(params["metadata"])
+    if "jsonb_set" in sql:
+        # эмулируем jsonb_set(metadata, '{route,error}', last_error) из UPDATE_OUTREACH_FAILED_SQL
+        payload.setdefault("route", {})["error"] = params["last_error"]
     return params["status"], payload
 
 
@@ -192,5 +195,101 @@ def test_yandex_spam_rejection_fallbacks_to_gmail(monkeypatch: pytest.MonkeyPatc
     assert metadata["route"]["provider"] == "gmail"
     assert metadata["route"]["fallback"] is True
     assert "5.7.1" in metadata["route"]["error"]
+    first_message = send_mock.call_args_list[0][0][1]
+    second_message = send_mock.call_args_list[1][0][1]
+    assert first_message is second_message
+    assert metadata["message_id"] == second_message["Message-ID"]
+    assert metadata["message_id"].endswith("@smtp.gmail.com>")
+
+    reset_settings_cache()
+
+
+def test_from_header_is_prebuilt_per_channel(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    setup_yandex_env(monkeypatch)
+
+    sender = prepare_sender(monkeypatch, session)
+    sender.mx_router.classify.return_value = MXResult("RU", ["mx.yandex.net"], False)
+    build_mock = MagicMock(side_effect=AssertionError("From must not be rebuilt per send"))
+    monkeypatch.setattr(sender, "_build_from_header", build_mock)
+
+    send_mock = MagicMock()
+    monkeypatch.setattr(sender, "_send_via_channel", send_mock)
+
+    result = deliver_email(sender, session, to_email="lead@yandex.ru")
+
+    assert result == "sent"
+    message = send_mock.call_args[0][1]
+    assert message["From"] == sender.yandex_from_header
+    assert "sender@yandex.ru" in message["From"]
+    assert message["Message-ID"].endswith("@smtp.yandex.test>")
+    assert sender._message_id_domains[sender.yandex_settings] == "smtp.yandex.test"
+
+    reset_settings_cache()
+
+
+def test_mask_email_hides_local_part() -> None:
+    assert _mask_email("lead@yandex.ru") == "le***@yandex.ru"
+    assert _mask_email("ab@example.com") == "a*@example.com"
+    assert _mask_email("@example.com") == "@example.com"
+    assert _mask_email("not-an-email") == "not-an-email"
+
+
+def test_normalized_recipient_handles_bare_and_named_addresses() -> None:
+    assert NormalizedRecipient.from_raw("Lead@Yandex.RU").domain == "yandex.ru"
+    assert NormalizedRecipient.from_raw("Lead <lead@Mail.ru>").domain == "mail.ru"
+    assert NormalizedRecipient.from_raw('"a@b" <lead@example.com>').email == "lead@example.com"
+    assert NormalizedRecipient.from_raw("no-at-sign") == NormalizedRecipient("no-at-sign", "no-at-sign", None, False)
+    assert NormalizedRecipient.from_raw("@example.com").domain is None
+
+
+def test_spam_rejection_detection_ignores_other_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    setup_yandex_env(monkeypatch)
+
+    sender = prepare_sender(monkeypatch, session)
+    route = RouteContext(
+        provider="yandex",
+        channel=sender.yandex_settings,
+        mx_result=MXResult("RU", ["mx.yandex.net"], False),
+        reply_to=None,
+    )
+
+    assert sender._should_fallback_to_gmail(route, smtplib.SMTPDataError(554, b"5.7.0 Suspected SPAM"))
+    assert sender._should_fallback_to_gmail(route, smtplib.SMTPDataError(550, b"MESSAGE REJECTED"))
+    assert not sender._should_fallback_to_gmail(route, smtplib.SMTPDataError(552, b"5.3.4 Message too big"))
+
+    reset_settings_cache()
+
+
+def test_mx_classification_is_memoized_per_domain(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    setup_yandex_env(monkeypatch)
+
+    sender = prepare_sender(monkeypatch, session)
+    sender.mx_router.classify.return_value = MXResult("OTHER", ["aspmx.l.google.com"], False)
+
+    first = sender._prepare_route(NormalizedRecipient.from_raw("one@example.com"))
+    second = sender._prepare_route(NormalizedRecipient.from_raw("two@Example.com"))
+
+    assert first.provider == second.provider == "gmail"
+    sender.mx_router.classify.assert_called_once_with("example.com")
+
+    reset_settings_cache()
+
+
+def test_message_ids_are_unique_and_use_channel_host(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = DummySession()
+    reset_settings_cache()
+    setup_yandex_env(monkeypatch)
+
+    sender = prepare_sender(monkeypatch, session)
+    ids = {sender._make_message_id(sender.yandex_settings) for _ in range(1000)}
+
+    assert len(ids) == 1000
+    assert all(value.startswith("<") and value.endswith("@smtp.yandex.test>") for value in ids)
 
     reset_settings_cache()
@@ -1,12 +1,14 @@
 """Тесты парсинга и сохранения результатов SERP."""
 
+import json
 from contextlib import contextmanager
+from dataclasses import replace
 from typing import Any, Dict, List, Tuple
 from unittest.mock import patch
 
 import pytest
 
-from app.modules.serp_ingest import SerpIngestService, SerpParseError, parse_serp_xml
+from app.modules.serp_ingest import SerpIngestService, SerpParseError, _content_hash, parse_serp_xml
 
 
 SAMPLE_XML = """
@@ -65,17 +67,41 @@ def test_parse_serp_xml_extracts_documents() -> None:
     assert documents[1].snippet.startswith("Агентство")
 
 
+def test_parse_serp_xml_keeps_positions_of_skipped_documents() -> None:
+    payload = SAMPLE_XML.replace(b"<url>https://example.com/products</url>", b"<url></url>")
+
+    documents = parse_serp_xml(payload)
+
+    assert [(document.domain, document.position) for document in documents] == [("beta.ru", 2)]
+    assert documents[0].language is None
+
+
+def test_parse_serp_xml_accepts_chunks() -> None:
+    chunks = (SAMPLE_XML[start : start + 7] for start in range(0, len(SAMPLE_XML), 7))
+
+    assert parse_serp_xml(chunks) == parse_serp_xml(SAMPLE_XML)
+    assert parse_serp_xml(iter(())) == []
+
+
+def test_content_hash_tracks_rewritten_fields() -> None:
+    document = parse_serp_xml(SAMPLE_XML)[0]
+
+    assert _content_hash(document) == _content_hash(replace(document))
+    assert _content_hash(document) != _content_hash(replace(document, position=5))
+    assert _content_hash(document) != _content_hash(replace(document, snippet="Новый сниппет"))
+
+
 def test_parse_serp_xml_invalid_payload() -> None:
     with pytest.raises(SerpParseError):
         parse_serp_xml(b"<broken>")
 
 
 class DummyResult:
-    def __init__(self, value: str) -> None:
-        self._value = value
+    def __init__(self, rows: List[Tuple[str, str]]) -> None:
+        self._rows = rows
 
-    def scalar_one(self) -> str:
-        return self._value
+    def all(self) -> List[Tuple[str, str]]:
+        return self._rows
 
 
 class DummySession:
@@ -86,7 +112,8 @@ class DummySession:
 
     def execute(self, statement: Any, params: Dict[str, Any]) -> DummyResult:
         self.calls.append((statement, params))
-        return DummyResult(f"id-{len(self.calls)}")
+        urls = params.get("urls", [])
+        return DummyResult([(f"id-{index}", url) for index, url in enumerate(urls, start=1)])
 
     def commit(self) -> None:
         self.committed = True
@@ -121,29 +148,55 @@ def test_serp_ingest_persists_results_and_companies() -> None:
             yandex_operation_id="op-123",
         )
 
-    assert len(inserted) == 2
-    assert inserted[0] == "id-1"
-    assert inserted[1] == "id-3"
+    assert inserted == ["id-1", "id-2"]
     assert session.committed is True
     assert session.closed is True
-    assert len(session.calls) == 4
+    assert len(session.calls) == 2
 
-    first_stmt_text = session.calls[0][0].text
-    second_stmt_text = session.calls[1][0].text
-    third_stmt_text = session.calls[2][0].text
-    assert "INSERT INTO serp_results" in first_stmt_text
-    assert "INSERT INTO companies" in second_stmt_text
-    assert "INSERT INTO serp_results" in third_stmt_text
+    assert "INSERT INTO serp_results" in session.calls[0][0].text
+    assert "INSERT INTO companies" in session.calls[1][0].text
 
     params_result = session.calls[0][1]
-    assert params_result["domain"] == "example.com"
+    assert params_result["domains"] == ["example.com", "beta.ru"]
     assert params_result["operation_id"] == "11111111-1111-1111-1111-111111111111"
-    assert params_result["metadata"].startswith("{")
-    assert '"yandex_operation_id": "op-123"' in params_result["metadata"]
+    assert params_result["metadata"][0].startswith("{")
+    assert json.loads(params_result["metadata"][0])["yandex_operation_id"] == "op-123"
+    assert "IS DISTINCT FROM EXCLUDED.content_hash" in session.calls[0][0].text
+    assert len(params_result["content_hashes"]) == 2
+    assert all(len(value) == 16 for value in params_result["content_hashes"])
+
+    params_company = session.calls[1][1]
+    assert params_company["domains"] == ["example.com", "beta.ru"]
+    assert params_company["website_urls"][0].startswith("https://example.com")
 
+
+def test_serp_ingest_collapses_repeated_urls_and_companies() -> None:
+    session = DummySession()
+
+    @contextmanager
+    def fake_scope(_factory):  # type: ignore[override]
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+    service = SerpIngestService(session_factory=lambda: session)
+    payload = SAMPLE_XML.replace(b"<url>beta.ru</url>", b"<url>https://example.com/products</url>")
+
+    with patch(
+        "app.modules.serp_ingest.session_scope",
+        side_effect=lambda factory: fake_scope(factory),
+    ):
+        inserted = service.ingest("11111111-1111-1111-1111-111111111111", payload)
+
+    assert inserted == ["id-1", "id-1"]
+    params_result = session.calls[0][1]
+    assert params_result["urls"] == ["https://example.com/products"]
+    assert params_result["positions"] == [2]
     params_company = session.calls[1][1]
-    assert params_company["domain"] == "example.com"
-    assert params_company["website_url"].startswith("https://example.com")
+    assert params_company["names"] == ["Example Company"]
+    assert json.loads(params_company["attributes"][0])["last_snippet"].startswith("Агентство")
 
 
 def test_serp_ingest_skips_excluded_domains() -> None:
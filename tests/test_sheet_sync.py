@@ -1,9 +1,14 @@
 """Тесты сервиса синхронизации листа."""
 
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from unittest.mock import MagicMock
 
-from app.modules.query_generator import NicheRow, QueryGenerator
+from app.modules.query_generator import GeneratedQuery, NicheRow, QueryGenerator
 from app.modules.sheet_sync import (
+    BatchLogEntry,
+    STATUS_COLUMNS,
+    GoogleSheetAdapter,
     QueryInsertResult,
     QueryRepository,
     SheetAdapter,
@@ -39,20 +44,53 @@ class FakeSheetAdapter(SheetAdapter):
             ),
         ]
         self.updated: list[SheetStatusUpdate] = []
+        self.update_calls = 0
 
     def fetch_rows(self):  # type: ignore[override]
         return self._rows
 
     def update_rows(self, updates):  # type: ignore[override]
+        self.update_calls += 1
         self.updated.extend(updates)
 
 
+class FakeSavepointSession:
+    def __init__(self) -> None:
+        self.savepoints = []
+
+    @contextmanager
+    def begin_nested(self):
+        try:
+            yield
+        except Exception:
+            self.savepoints.append("rollback")
+            raise
+        self.savepoints.append("release")
+
+
 class FakeRepository(QueryRepository):
     def __init__(self) -> None:
         self.inserted_batches = []
         self.logged = []
+        self.session = FakeSavepointSession()
+        self.transactions = 0
+        self.log_flushes = 0
+        self.group_calls = 0
+        self.fail_group_insert = False
+
+    @contextmanager
+    def transaction(self):  # type: ignore[override]
+        self.transactions += 1
+        yield self.session
 
-    def insert_queries(self, queries):  # type: ignore[override]
+    def insert_query_groups(self, groups, *, session=None):  # type: ignore[override]
+        self.group_calls += 1
+        if self.fail_group_insert:
+            raise RuntimeError("batch failed")
+        return [self.insert_queries(group, session=session) for group in groups]
+
+    def insert_queries(self, queries, *, session=None):  # type: ignore[override]
+        assert session is self.session
         self.inserted_batches.append(queries)
         first = queries[0].scheduled_for if queries else None
         last = queries[-1].scheduled_for if queries else None
@@ -64,8 +102,10 @@ class FakeRepository(QueryRepository):
             last_scheduled=last,
         )
 
-    def log_batch(self, row, result, status, error):  # type: ignore[override]
-        self.logged.append((row, result, status, error))
+    def log_batches(self, entries, *, session=None):  # type: ignore[override]
+        assert session is self.session
+        self.log_flushes += 1
+        self.logged.extend((entry.row, entry.result, entry.status, entry.error) for entry in entries)
 
 
 def test_sheet_sync_updates_statuses() -> None:
@@ -86,3 +126,239 @@ def test_sheet_sync_updates_statuses() -> None:
     assert update.generated_count == len(repository.inserted_batches[0])
     assert update.last_error is None
     assert repository.logged[0][2] == "done"
+    assert repository.transactions == 1
+    assert repository.session.savepoints == ["release"]
+
+
+class FailingGenerator(QueryGenerator):
+    def generate(self, row):  # type: ignore[override]
+        if row.niche == "логистика":
+            raise ValueError("bad row")
+        return super().generate(row)
+
+
+def test_sheet_sync_isolates_failed_row_in_savepoint() -> None:
+    adapter = FakeSheetAdapter()
+    adapter._rows[1].values["status"] = ""
+    repository = FakeRepository()
+    generator = FailingGenerator(now_func=lambda: datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+
+    summary = SheetSyncService(adapter, repository, generator).sync()
+
+    assert summary.processed_rows == 2
+    assert summary.errors == 1
+    assert repository.transactions == 1
+    # Ошибка генерации отсекается до БД: общая вставка порции проходит одним SAVEPOINT
+    assert repository.session.savepoints == ["release"]
+    assert repository.group_calls == 1
+    assert [entry[2] for entry in repository.logged] == ["done", "error"]
+    assert repository.log_flushes == 1
+    assert adapter.updated[1].last_error == "bad row"
+
+
+class DummyInsertResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+    def scalars(self):
+        return iter(self._rows)
+
+
+class DummyInsertSession:
+    """Повторяет агрегат INSERT_QUERIES_SQL: вставленные строки по group_id с min/max расписания."""
+
+    def __init__(self, existing_hashes):
+        self.existing = set(existing_hashes)
+        self.calls = []
+
+    def execute(self, stmt, params):
+        self.calls.append(params)
+        if "hashes" in params:
+            return DummyInsertResult([value for value in params["hashes"] if value in self.existing])
+        if "query_hashes" not in params:
+            return None
+        totals = {}
+        for query_hash, scheduled_for, group_id in zip(
+            params["query_hashes"], params["scheduled_fors"], params["group_ids"]
+        ):
+            if query_hash in self.existing:
+                continue
+            self.existing.add(query_hash)
+            count, first, last = totals.get(group_id, (0, scheduled_for, scheduled_for))
+            totals[group_id] = (count + 1, min(first, scheduled_for), max(last, scheduled_for))
+        return DummyInsertResult([(group_id, *values) for group_id, values in totals.items()])
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_insert_queries_batches_rows_and_counts_duplicates(monkeypatch) -> None:
+    monkeypatch.setattr("app.modules.sheet_sync.QUERY_INSERT_BATCH_SIZE", 2)
+    queries = [
+        GeneratedQuery(
+            query_text=f"стоматология {index}",
+            query_hash=f"hash-{index}",
+            region_code=213,
+            scheduled_for=datetime(2025, 1, 1, 21 + index, 0, tzinfo=timezone.utc),
+            trigger=None,
+            metadata={"niche": "стоматология"},
+        )
+        for index in range(3)
+    ]
+    session = DummyInsertSession({queries[0].query_hash})
+    repository = QueryRepository(session_factory=lambda: session)
+
+    result = repository.insert_queries(queries)
+
+    assert len(session.calls) == 2
+    assert session.calls[0]["query_hashes"] == [queries[0].query_hash, queries[1].query_hash]
+    assert result.attempted == 3
+    assert result.inserted == 2
+    assert result.duplicates == 1
+    expected = [query.scheduled_for for query in queries[1:]]
+    assert result.first_scheduled == min(expected)
+    assert result.last_scheduled == max(expected)
+
+
+def test_google_adapter_writes_statuses_in_one_raw_batch() -> None:
+    adapter = GoogleSheetAdapter.__new__(GoogleSheetAdapter)
+    adapter._worksheet = MagicMock()
+    adapter._header_map = {column: index for index, column in enumerate(STATUS_COLUMNS, start=26)}
+    scheduled = datetime(2025, 1, 1, 21, 0, tzinfo=timezone.utc)
+    updates = [
+        SheetStatusUpdate(2, "done", 3, 2, 1, scheduled, scheduled, None),
+        SheetStatusUpdate(5, "error", 0, 0, 0, None, None, "boom"),
+    ]
+
+    adapter.update_rows(updates)
+
+    adapter._worksheet.batch_update.assert_called_once()
+    requests = adapter._worksheet.batch_update.call_args.args[0]
+    assert adapter._worksheet.batch_update.call_args.kwargs == {"value_input_option": "RAW"}
+    assert [request["range"] for request in requests] == ["Z2:AF2", "Z5:AF5"]
+    assert requests[1]["values"] == [["error", "0", "0", "0", "", "", "boom"]]
+
+
+def test_google_adapter_fetch_rows_normalizes_headers_and_pads_short_rows() -> None:
+    adapter = GoogleSheetAdapter.__new__(GoogleSheetAdapter)
+    adapter._worksheet = MagicMock()
+    adapter._worksheet.get_all_values.return_value = [
+        [" Niche ", "City", "Status"],
+        [" стоматология ", "Москва"],
+        ["логистика", "", "done", "лишняя"],
+    ]
+
+    rows = list(adapter.fetch_rows())
+
+    assert adapter._header_map == {"niche": 1, "city": 2, "status": 3}
+    assert rows[0].row_index == 2
+    assert rows[0].values == {"niche": "стоматология", "city": "Москва", "status": ""}
+    assert rows[1].values == {"niche": "логистика", "city": "", "status": "done"}
+
+
+def test_log_batches_writes_all_entries_in_one_insert() -> None:
+    session = DummyInsertSession(set())
+    repository = QueryRepository(session_factory=lambda: session)
+    row = NicheRow(row_index=2, niche=" стоматология ", city="Москва", country=None, batch_tag=None)
+    ok = QueryInsertResult(3, 2, 1, None, None)
+    failed = QueryInsertResult(0, 0, 0, None, None)
+
+    repository.log_batches(
+        [BatchLogEntry(row, ok, "done", None), BatchLogEntry(row, failed, "error", "x" * 600)]
+    )
+
+    assert len(session.calls) == 1
+    params = session.calls[0]
+    assert params["niches"] == ["стоматология", "стоматология"]
+    assert params["countries"] == [None, None]
+    assert params["statuses"] == ["done", "error"]
+    assert params["errors"][0] is None
+    assert len(params["errors"][1]) == 500
+
+
+def test_sheet_sync_commits_and_updates_sheet_per_chunk(monkeypatch) -> None:
+    monkeypatch.setattr("app.modules.sheet_sync.SYNC_CHUNK_SIZE", 1)
+    adapter = FakeSheetAdapter()
+    adapter._rows[1].values["status"] = ""
+    repository = FakeRepository()
+    generator = QueryGenerator(now_func=lambda: datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+
+    summary = SheetSyncService(adapter, repository, generator).sync()
+
+    assert summary.total_rows == 2
+    assert summary.processed_rows == 2
+    assert repository.transactions == 2
+    assert repository.log_flushes == 2
+    assert adapter.update_calls == 2
+    assert [update.row_index for update in adapter.updated] == [2, 3]
+
+
+def test_sheet_sync_falls_back_to_per_row_inserts_when_batch_fails() -> None:
+    adapter = FakeSheetAdapter()
+    adapter._rows[1].values["status"] = ""
+    repository = FakeRepository()
+    repository.fail_group_insert = True
+    generator = QueryGenerator(now_func=lambda: datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+
+    summary = SheetSyncService(adapter, repository, generator).sync()
+
+    assert summary.errors == 0
+    assert repository.session.savepoints == ["rollback", "release", "release"]
+    assert len(repository.inserted_batches) == 2
+    assert [update.status for update in adapter.updated] == ["done", "done"]
+
+
+def test_insert_query_groups_credits_shared_hash_to_first_row() -> None:
+    queries = [
+        GeneratedQuery(
+            query_text=f"запрос {index}",
+            query_hash=f"hash-{index % 2}",
+            region_code=213,
+            scheduled_for=datetime(2025, 1, 1, 21, index, tzinfo=timezone.utc),
+            trigger=None,
+            metadata={},
+        )
+        for index in range(3)
+    ]
+    session = DummyInsertSession(set())
+    repository = QueryRepository(session_factory=lambda: session)
+
+    first, second = repository.insert_query_groups([queries[:2], [queries[2]]])
+
+    assert len(session.calls) == 1
+    assert (first.inserted, first.duplicates) == (2, 0)
+    assert (second.inserted, second.duplicates) == (0, 1)
+    assert second.first_scheduled is None
+
+
+def test_insert_query_groups_prechecks_existing_hashes_for_large_batches(monkeypatch) -> None:
+    monkeypatch.setattr("app.modules.sheet_sync.QUERY_PRECHECK_THRESHOLD", 2)
+    queries = [
+        GeneratedQuery(
+            query_text=f"запрос {index}",
+            query_hash=f"hash-{index}",
+            region_code=213,
+            scheduled_for=datetime(2025, 1, 1, 21, index, tzinfo=timezone.utc),
+            trigger=None,
+            metadata={},
+        )
+        for index in range(3)
+    ]
+    session = DummyInsertSession({"hash-0", "hash-2"})
+    repository = QueryRepository(session_factory=lambda: session)
+
+    (result,) = repository.insert_query_groups([queries])
+
+    assert sorted(session.calls[0]["hashes"]) == ["hash-0", "hash-1", "hash-2"]
+    assert session.calls[1]["query_hashes"] == ["hash-1"]
+    assert (result.attempted, result.inserted, result.duplicates) == (3, 1, 2)
+    assert result.first_scheduled == result.last_scheduled == queries[1].scheduled_for
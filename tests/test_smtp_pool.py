@@ -0,0 +1,227 @@
+"""Тесты пула SMTP-соединений."""
+
+from __future__ import annotations
+
+import smtplib
+from dataclasses import replace
+from email.message import EmailMessage
+from typing import List
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.config import SMTPChannelSettings
+from app.modules.smtp_pool import PipelinedSMTP, SMTPConnectionPool
+
+
+def make_channel(max_msgs_per_conn: int = 100) -> SMTPChannelSettings:
+    return SMTPChannelSettings(
+        host="smtp.test",
+        port=587,
+        username="user",
+        password="pass",
+        sender="leadgen@example.com",
+        sender_name=None,
+        use_tls=True,
+        use_ssl=False,
+        max_msgs_per_conn=max_msgs_per_conn,
+    )
+
+
+def make_pool(opened: List[MagicMock]) -> SMTPConnectionPool:
+    def factory(channel: SMTPChannelSettings) -> MagicMock:
+        smtp = MagicMock(spec=smtplib.SMTP)
+        opened.append(smtp)
+        return smtp
+
+    return SMTPConnectionPool(smtp_factory=factory)
+
+
+def test_pool_reuses_connection_between_messages() -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel()
+
+    for _ in range(3):
+        pool.send(channel, EmailMessage())
+
+    assert len(opened) == 1
+    assert opened[0].send_message.call_count == 3
+    opened[0].quit.assert_not_called()
+
+
+def test_pool_rotates_connection_after_limit() -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel(max_msgs_per_conn=2)
+
+    for _ in range(3):
+        pool.send(channel, EmailMessage())
+
+    assert len(opened) == 2
+    opened[0].quit.assert_called_once()
+    assert opened[1].send_message.call_count == 1
+
+
+def test_pool_reopens_connection_idle_past_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel()
+    clock = iter([0.0, 1.0, 100.0, 101.0])
+    monkeypatch.setattr("app.modules.smtp_pool.monotonic", lambda: next(clock))
+
+    pool.send(channel, EmailMessage())
+    pool.send(channel, EmailMessage())
+
+    assert len(opened) == 2
+    opened[0].quit.assert_called_once()
+
+
+def test_pool_retries_once_when_reused_session_dropped() -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel()
+
+    pool.send(channel, EmailMessage())
+    opened[0].send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+    pool.send(channel, EmailMessage())
+
+    assert len(opened) == 2
+    assert opened[1].send_message.call_count == 1
+
+
+def test_pool_does_not_resend_after_payload_was_sent() -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel()
+
+    pool.send(channel, EmailMessage())
+
+    def drop_after_payload(message: EmailMessage) -> None:
+        opened[0].payload_sent = True
+        raise smtplib.SMTPServerDisconnected("gone")
+
+    opened[0].send_message.side_effect = drop_after_payload
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send(channel, EmailMessage())
+
+    # Сервер мог уже принять письмо — повторная отправка дала бы дубль
+    assert len(opened) == 1
+
+
+def test_pool_discards_connection_after_smtp_error() -> None:
+    opened: List[MagicMock] = []
+    pool = make_pool(opened)
+    channel = make_channel()
+
+    pool.send(channel, EmailMessage())
+    opened[0].send_message.side_effect = smtplib.SMTPDataError(554, b"5.7.1 spam")
+    with pytest.raises(smtplib.SMTPDataError):
+        pool.send(channel, EmailMessage())
+    opened[0].send_message.side_effect = None
+    pool.send(channel, EmailMessage())
+
+    # Отказ сервера не повторяется, а испорченная сессия в пул не возвращается
+    assert len(opened) == 2
+    opened[0].quit.assert_called_once()
+
+
+def test_pool_shares_ssl_context_between_connections(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: List[object] = []
+    contexts: List[object] = []
+
+    def fake_context() -> object:
+        created.append(object())
+        return created[-1]
+
+    class FakeSSLClient:
+        def __init__(self, host: str, port: int, timeout: float, context: object) -> None:
+            contexts.append(context)
+
+        def login(self, username: str, password: str) -> None:
+            pass
+
+    monkeypatch.setattr("app.modules.smtp_pool.ssl.create_default_context", fake_context)
+    monkeypatch.setattr("app.modules.smtp_pool.PipelinedSMTP_SSL", FakeSSLClient)
+    pool = SMTPConnectionPool()
+    channel = replace(make_channel(), use_ssl=True)
+
+    pool._open(channel)
+    pool._open(channel)
+
+    assert len(created) == 1
+    assert contexts == [created[0], created[0]]
+
+
+class ScriptedSMTP(PipelinedSMTP):
+    """PipelinedSMTP без сети: пишет отправленное в буфер и отвечает заготовленными кодами."""
+
+    def __init__(self, replies: List[tuple], features: dict) -> None:
+        super().__init__()
+        self.ehlo_resp = b"ok"
+        self.does_esmtp = True
+        self.esmtp_features = features
+        self.replies = list(replies)
+        self.writes: List[object] = []
+
+    def send(self, s) -> None:  # type: ignore[override]
+        self.writes.append(s)
+
+    def getreply(self):  # type: ignore[override]
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def rset(self):  # type: ignore[override]
+        return (250, b"ok")
+
+
+def test_pipelined_smtp_batches_envelope_commands() -> None:
+    smtp = ScriptedSMTP(
+        [(250, b"ok"), (250, b"ok"), (354, b"go"), (250, b"queued")],
+        {"pipelining": "", "size": "0"},
+    )
+
+    refused = smtp.sendmail("from@example.com", ["to@example.com"], "Subject: hi\n\n.hello\n")
+
+    assert refused == {}
+    assert smtp.writes[0] == (
+        "MAIL FROM:<from@example.com> size=23\r\nRCPT TO:<to@example.com>\r\nDATA\r\n"
+    )
+    assert smtp.writes[1] == b"Subject: hi\r\n\r\n..hello\r\n.\r\n"
+    assert len(smtp.writes) == 2
+
+
+def test_pipelined_smtp_reports_rejected_recipients() -> None:
+    smtp = ScriptedSMTP(
+        [(250, b"ok"), (550, b"no such user"), (554, b"no valid recipients")],
+        {"pipelining": ""},
+    )
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused) as exc_info:
+        smtp.sendmail("from@example.com", ["to@example.com"], b"body\r\n")
+
+    assert exc_info.value.recipients == {"to@example.com": (550, b"no such user")}
+    assert len(smtp.writes) == 1
+
+
+def test_pipelined_smtp_marks_payload_sent_before_final_reply() -> None:
+    smtp = ScriptedSMTP(
+        [(250, b"ok"), (250, b"ok"), (354, b"go"), smtplib.SMTPServerDisconnected("gone")],
+        {"pipelining": ""},
+    )
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        smtp.sendmail("from@example.com", ["to@example.com"], b"body\r\n")
+
+    assert smtp.payload_sent is True
+
+
+def test_pipelined_smtp_keeps_payload_unsent_when_envelope_fails() -> None:
+    smtp = ScriptedSMTP([smtplib.SMTPServerDisconnected("gone")], {"pipelining": ""})
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        smtp.sendmail("from@example.com", ["to@example.com"], b"body\r\n")
+
+    assert smtp.payload_sent is False
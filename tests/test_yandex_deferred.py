@@ -2,6 +2,7 @@
 
 import base64
 import json
+import socket
 from datetime import datetime, timedelta
 
 import httpx
@@ -11,13 +12,16 @@ from zoneinfo import ZoneInfo
 
 from app.modules.yandex_deferred import (
     DeferredQueryParams,
+    HTTP_LIMITS,
     InvalidResponseError,
     NightWindowViolation,
     OperationTimeout,
     OperationResponse,
+    RateLimitConfig,
     YandexDeferredClient,
     OPERATIONS_URL,
     SEARCH_ASYNC_URL,
+    YandexAPIError,
 )
 
 
@@ -167,3 +171,224 @@ def test_create_uses_token_provider() -> None:
     assert route.called
     auth_header = route.calls[0].request.headers.get("authorization")
     assert auth_header == "Bearer dynamic-token"
+
+
+def test_client_reuses_http_client_for_create_and_poll() -> None:
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"id": "op-1", "done": True})
+
+    http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    client = YandexDeferredClient(
+        iam_token="token",
+        folder_id="folder",
+        enforce_night_window=False,
+        http_client=http_client,
+    )
+
+    client.create_deferred_search(DeferredQueryParams(query_text="keep-alive"))
+    client.get_operation("op-1")
+
+    assert [request.method for request in requests] == ["POST", "GET"]
+    assert all(request.headers["authorization"] == "Bearer token" for request in requests)
+    client.close()
+    # Переданный клиент принадлежит вызывающему коду и остаётся открытым
+    assert not http_client.is_closed
+    http_client.close()
+
+
+@respx.mock
+def test_get_operations_polls_in_order_and_returns_errors() -> None:
+    client = YandexDeferredClient(iam_token="token", folder_id="folder", enforce_night_window=False)
+    respx.get(f"{OPERATIONS_URL}/op-1").mock(
+        return_value=httpx.Response(200, json={"id": "op-1", "done": True})
+    )
+    respx.get(f"{OPERATIONS_URL}/op-2").mock(return_value=httpx.Response(500))
+    respx.get(f"{OPERATIONS_URL}/op-3").mock(
+        return_value=httpx.Response(200, json={"id": "op-3", "done": False})
+    )
+
+    results = client.get_operations(["op-1", "op-2", "op-3"])
+
+    assert isinstance(results[0], OperationResponse) and results[0].done
+    assert isinstance(results[1], YandexAPIError)
+    assert isinstance(results[2], OperationResponse) and results[2].id == "op-3"
+
+
+@respx.mock
+def test_create_deferred_searches_returns_results_in_order() -> None:
+    clock = FakeClock(datetime(2024, 1, 1, 2, 0, tzinfo=ZoneInfo("Europe/Moscow")))
+    client = YandexDeferredClient(
+        iam_token="token",
+        folder_id="folder",
+        sleep_func=clock.sleep,
+        now_func=clock.now,
+    )
+
+    def reply(request: httpx.Request) -> httpx.Response:
+        query_text = json.loads(request.content)["query"]["query_text"]
+        if query_text == "bad":
+            return httpx.Response(500)
+        return httpx.Response(200, json={"id": f"op-{query_text}", "done": False})
+
+    respx.post(SEARCH_ASYNC_URL).mock(side_effect=reply)
+
+    results = client.create_deferred_searches(
+        [DeferredQueryParams(query_text=text) for text in ("a", "bad", "c")]
+    )
+
+    assert [getattr(result, "id", None) for result in results] == ["op-a", None, "op-c"]
+    assert isinstance(results[1], YandexAPIError)
+
+
+def test_create_deferred_searches_checks_night_window_once() -> None:
+    clock = FakeClock(datetime(2024, 1, 1, 12, 0, tzinfo=ZoneInfo("Europe/Moscow")))
+    client = YandexDeferredClient(
+        iam_token="token",
+        folder_id="folder",
+        sleep_func=clock.sleep,
+        now_func=clock.now,
+    )
+
+    with pytest.raises(NightWindowViolation):
+        client.create_deferred_searches([DeferredQueryParams(query_text="day")])
+
+
+def test_decode_raw_data_falls_back_to_stdlib(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.modules.yandex_deferred.pybase64", None)
+    raw_xml = "<doc>выдача</doc>".encode()
+    response = OperationResponse.from_dict(
+        {"id": "op-1", "done": True, "response": {"rawData": base64.b64encode(raw_xml).decode()}}
+    )
+
+    assert response.decode_raw_data() == raw_xml
+
+
+def test_decode_raw_data_rejects_broken_padding() -> None:
+    response = OperationResponse.from_dict({"id": "op-1", "done": True, "response": {"rawData": "abc"}})
+    with pytest.raises(InvalidResponseError):
+        response.decode_raw_data()
+
+
+def test_iter_raw_data_decodes_in_chunks() -> None:
+    raw_xml = ("<doc>" + "выдача" * 50 + "</doc>").encode()
+    encoded = base64.b64encode(raw_xml).decode()
+    response = OperationResponse.from_dict({"id": "op-1", "done": True, "response": {"rawData": encoded}})
+
+    chunks = list(response.iter_raw_data(chunk_size=64))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == raw_xml
+
+
+def test_iter_raw_data_handles_line_breaks() -> None:
+    raw_xml = b"<doc>wrapped</doc>"
+    encoded = base64.encodebytes(raw_xml).decode()
+    response = OperationResponse.from_dict({"id": "op-1", "done": True, "response": {"rawData": encoded}})
+
+    chunks = list(response.iter_raw_data(chunk_size=8))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == raw_xml
+
+
+@respx.mock
+def test_status_limits_wait_for_window_with_monotonic_clock() -> None:
+    clock = FakeClock(datetime(2024, 1, 1, 1, 0, tzinfo=ZoneInfo("Europe/Moscow")))
+    sleeps: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock.sleep(seconds)
+
+    client = YandexDeferredClient(
+        iam_token="token",
+        folder_id="folder",
+        sleep_func=sleep,
+        now_func=clock.now,
+        status_limits=RateLimitConfig(2, 600, 35000),
+    )
+    respx.get(f"{OPERATIONS_URL}/op-1").mock(
+        return_value=httpx.Response(200, json={"id": "op-1", "done": False})
+    )
+
+    for _ in range(3):
+        client.get_operation("op-1")
+
+    assert sleeps == [1.0]
+    assert all(isinstance(event, float) for event in client._status_limits[0].events)
+
+
+def test_headers_are_rebuilt_only_when_token_changes() -> None:
+    tokens = iter(["first", "first", "second"])
+    client = YandexDeferredClient(token_provider=lambda: next(tokens), folder_id="folder")
+
+    first = client._headers()
+    assert client._headers() is first
+    second = client._headers()
+
+    assert second is not first
+    assert second["Authorization"] == "Bearer second"
+
+
+@respx.mock
+def test_wait_until_ready_backs_off_up_to_interval(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.modules.yandex_deferred.random.uniform", lambda low, high: 1.0)
+    clock = FakeClock(datetime(2024, 1, 1, 1, 0, tzinfo=ZoneInfo("Europe/Moscow")))
+    sleeps: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock.sleep(seconds)
+
+    client = YandexDeferredClient(
+        iam_token="token",
+        folder_id="folder",
+        sleep_func=sleep,
+        now_func=clock.now,
+        poll_interval_seconds=10,
+    )
+    respx.get(f"{OPERATIONS_URL}/op-1").mock(
+        side_effect=[httpx.Response(200, json={"id": "op-1", "done": False})] * 4
+        + [httpx.Response(200, json={"id": "op-1", "done": True})]
+    )
+
+    assert client.wait_until_ready("op-1").done is True
+    assert sleeps == [2.0, 4.0, 8.0, 10.0]
+
+
+@respx.mock
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_body_and_response_roundtrip(monkeypatch: pytest.MonkeyPatch, use_orjson: bool) -> None:
+    if not use_orjson:
+        monkeypatch.setattr("app.modules.yandex_deferred.orjson", None)
+    client = YandexDeferredClient(iam_token="token", folder_id="folder", enforce_night_window=False)
+    route = respx.post(SEARCH_ASYNC_URL).mock(
+        return_value=httpx.Response(200, json={"id": "op-json", "done": False})
+    )
+
+    operation = client.create_deferred_search(DeferredQueryParams(query_text="кириллица"))
+
+    assert operation.id == "op-json"
+    request = route.calls[0].request
+    assert request.headers["content-type"] == "application/json"
+    assert json.loads(request.content)["query"]["query_text"] == "кириллица"
+
+
+def test_default_http_client_disables_nagle(monkeypatch: pytest.MonkeyPatch) -> None:
+    captured: dict = {}
+    real_transport = httpx.HTTPTransport
+
+    def fake_transport(**kwargs):
+        captured.update(kwargs)
+        return real_transport()
+
+    monkeypatch.setattr("app.modules.yandex_deferred.httpx.HTTPTransport", fake_transport)
+    with YandexDeferredClient(iam_token="token", folder_id="folder") as client:
+        assert (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) in captured["socket_options"]
+        assert captured["limits"] is HTTP_LIMITS
+
+    # Собственный клиент закрывается при выходе из контекста
+    assert client._http.is_closed